@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Time `select_from_mempool` filling a MAX_BLOCK_SERIALIZED_SIZE block from
+mempools of increasing size, against the previous builder which serialized
+the whole candidate block after every txn it added.
+
+A tenth of the mempool spends from other mempool txns, in chains of up to
+five. Signatures are dummies: selection doesn't check them. Room is left for
+the coinbase as assemble_and_solve_block does, and the bytes column is the
+size of the block with the coinbase in.
+
+Usage: python -m benchmarks.bench_block_template [mempool_size ...]
+"""
+import sys
+import time
+
+from mini_core.block import Block
+from mini_core.mempool import find_utxo_in_mempool, mempool, select_from_mempool
+from mini_core.params import Params
+from mini_core.proof_of_work import _coinbase_reserve
+from mini_core.transaction import OutPoint, Transaction, TxIn, TxOut, SignatureScript, UnspentTxOut
+from mini_core.utils import serialize, sha256d
+from mini_core.utxo_set import utxo_set
+
+from benchmarks.fixtures import ADDR
+
+# the previous builder gets too slow to wait for past this
+NAIVE_MAX_MEMPOOL = 2000
+
+
+def make_txn(outpoint, value):
+    txin = TxIn(
+        outpoint=outpoint,
+        signature=SignatureScript(unlock_sig=bytes(64), unlock_pk=bytes(64)),
+        sequence=0)
+    return Transaction(txins=[txin], txouts=[TxOut(value=value - 1, pubkey=ADDR)] * 2, locktime=0)
+
+
+def fill_mempool(num_txns):
+    mempool.clear()
+    utxo_set.clear()
+
+    prev = None
+    for i in range(num_txns):
+        if prev and i % 10 and i % 50 < 5:
+            outpoint = OutPoint(prev.id, 0)
+        else:
+            outpoint = OutPoint(sha256d(str(i)), 0)
+            utxo_set[outpoint] = UnspentTxOut(
+                value=1000, pubkey=ADDR, txid=outpoint.txid, txout_idx=0,
+                is_coinbase=False, height=0)
+
+        prev = make_txn(outpoint, 1000)
+
+        # validation has already computed this for anything in the mempool
+        prev.serialized_size
+        mempool[prev.id] = prev
+
+
+def naive_select_from_mempool(block):
+    added_to_block = set()
+
+    def check_block_size(b) -> bool:
+        return len(serialize(b)) < Params.MAX_BLOCK_SERIALIZED_SIZE
+
+    def try_add_to_block(block, txid):
+        if txid in added_to_block:
+            return block
+
+        tx = mempool[txid]
+        for txin in tx.txins:
+            if txin.outpoint in utxo_set:
+                continue
+
+            in_mempool = find_utxo_in_mempool(txin)
+            if not in_mempool:
+                return None
+
+            block = try_add_to_block(block, in_mempool.txid)
+            if not block:
+                return None
+
+        newblock = block._replace(txns=[*block.txns, tx])
+        if check_block_size(newblock):
+            added_to_block.add(txid)
+            return newblock
+        return block
+
+    for txid in mempool:
+        newblock = try_add_to_block(block, txid)
+        if newblock and check_block_size(newblock):
+            block = newblock
+        else:
+            break
+
+    return block
+
+
+def timed(select, block):
+    start = time.perf_counter()
+    block = select(block)
+    return time.perf_counter() - start, block
+
+
+def main(sizes):
+    empty = Block(
+        version=0, prev_block_hash=sha256d('prev'), merkle_tree_hash='',
+        timestamp=1501827000, bits=24, nonce=0, txns=[])
+
+    reserve = _coinbase_reserve(empty, ADDR)
+
+    print(f'{"mempool":>8} {"txns":>6} {"bytes":>8} {"new ms":>8} {"old ms":>9}')
+    for size in sizes:
+        fill_mempool(size)
+        seconds, block = timed(lambda b: select_from_mempool(b, reserve), empty)
+        assert len(serialize(block)) + reserve <= Params.MAX_BLOCK_SERIALIZED_SIZE
+
+        old = '-'
+        if size <= NAIVE_MAX_MEMPOOL:
+            old = f'{timed(naive_select_from_mempool, empty)[0] * 1000:.1f}'
+
+        print(f'{size:>8} {len(block.txns):>6} {len(serialize(block)) + reserve:>8} '
+              f'{seconds * 1000:>8.1f} {old:>9}')
+
+    mempool.clear()
+    utxo_set.clear()
+
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or [1000, 2000, 10000, 50000, 100000])
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Resolve the inputs of a block made of one long chain of dependent txns, each
+spending the one before it, the way validate_block and calculate_fees used
+to (a scan of the block per input) and through a BlockUTXOView.
+
+Usage: python -m benchmarks.bench_block_view [txns_per_block ...]
+"""
+import sys
+import time
+
+from mini_core.transaction import OutPoint, SignatureScript, Transaction, TxIn, TxOut, UnspentTxOut
+from mini_core.utils import sha256d
+from mini_core.utxo_set import BlockUTXOView, find_utxo_in_list
+
+ADDR = '1Piq91dFUqSb7tdddCWvuGX5UgdzXeoAwA'
+
+
+def dependent_txns(num_txns):
+    outpoint = OutPoint(sha256d('funding'), 0)
+    base = {outpoint: UnspentTxOut(10 * num_txns, ADDR, outpoint.txid, 0, False, 0)}
+
+    txns = []
+    for i in range(num_txns):
+        txin = TxIn(outpoint=outpoint, signature=SignatureScript(b'', b''), sequence=0)
+        txn = Transaction(txins=[txin], txouts=[TxOut(10 * (num_txns - i - 1), ADDR)])
+        txns.append(txn)
+        outpoint = OutPoint(txn.id, 0)
+    return base, txns
+
+
+def scan(base, txns) -> int:
+    fees = 0
+    for txn in txns:
+        spent = sum((base.get(i.outpoint) or find_utxo_in_list(i, txns)).value for i in txn.txins)
+        fees += spent - sum(o.value for o in txn.txouts)
+    return fees
+
+
+def view(base, txns) -> int:
+    block_view = BlockUTXOView(base)
+    for txn in txns:
+        block_view.apply(txn)
+    return block_view.fees
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main(sizes):
+    for num_txns in sizes:
+        base, txns = dependent_txns(num_txns)
+        scan_fees, scan_time = timed(scan, base, txns)
+        view_fees, view_time = timed(view, base, txns)
+        assert scan_fees == view_fees
+
+        print(f'txns={num_txns:>6} scan={scan_time * 1e3:9.1f} ms  view={view_time * 1e3:7.1f} ms  '
+              f'x{scan_time / view_time:.0f}')
+
+
+if __name__ == '__main__':
+    main([int(n) for n in sys.argv[1:]] or [100, 1000, 3000, 6000])
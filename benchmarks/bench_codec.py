@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Compare the binary codec against JSON serialize/deserialize: encode and
+decode throughput and payload size, for a full block and a UTXO page.
+
+Usage: python -m benchmarks.bench_codec [txns_per_block]
+"""
+import sys
+import time
+
+from mini_core import codec
+from mini_core.block import Block
+from mini_core.transaction import OutPoint, Transaction, TxIn, TxOut, UnspentTxOut, SignatureScript
+from mini_core.utils import deserialize, serialize, sha256d
+
+
+def make_block(num_txns):
+    txns = []
+    for i in range(num_txns):
+        txin = TxIn(
+            outpoint=OutPoint(sha256d(str(i)), i % 4),
+            signature=SignatureScript(unlock_sig=bytes(64), unlock_pk=bytes(range(64))),
+            sequence=0)
+        txouts = [TxOut(value=1000 + i, pubkey='1Piq91dFUqSb7tdddCWvuGX5UgdzXeoAwA')] * 2
+        txns.append(Transaction(txins=[txin], txouts=txouts, locktime=0))
+
+    return Block(
+        version=0, prev_block_hash=sha256d('prev'), merkle_tree_hash=sha256d('merkle'),
+        timestamp=1501827000, bits=24, nonce=5473045, txns=txns)
+
+
+def make_utxos(num):
+    return [
+        UnspentTxOut(value=i, pubkey='1Piq91dFUqSb7tdddCWvuGX5UgdzXeoAwA', txid=sha256d(str(i)),
+                     txout_idx=0, is_coinbase=False, height=i)
+        for i in range(num)]
+
+
+def timeit(fnc, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fnc()
+    return (time.perf_counter() - start) / rounds
+
+
+def bench(name, obj, rounds=20):
+    as_json = serialize(obj).encode()
+    as_binary = codec.dumps(obj)
+    assert codec.loads(as_binary) == obj
+
+    print(f'{name}:')
+    print(f'  size    json={len(as_json):>9} B  binary={len(as_binary):>9} B  '
+          f'({len(as_binary) / len(as_json):.0%})')
+
+    for op, json_fnc, binary_fnc in (
+            ('encode', lambda: serialize(obj), lambda: codec.dumps(obj)),
+            ('decode', lambda: deserialize(as_json.decode()), lambda: codec.loads(as_binary))):
+        j, b = timeit(json_fnc, rounds), timeit(binary_fnc, rounds)
+        print(f'  {op}  json={j * 1e3:>9.2f} ms   binary={b * 1e3:>9.2f} ms   ({j / b:.1f}x)')
+
+
+if __name__ == '__main__':
+    num_txns = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    bench(f'block with {num_txns} txns', make_block(num_txns))
+    bench('1000 utxos', make_utxos(1000))
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Time connect_block at increasing chain heights.
+
+Builds a synthetic chain of low-difficulty blocks, then mines and connects a
+handful of real blocks on top of it. Connect latency should stay flat as the
+height grows.
+
+Usage: python -m benchmarks.bench_connect_block [height ...]
+"""
+import logging
+import sys
+import time
+
+from benchmarks.fixtures import build_chain
+from mini_core.chain import connect_block, set_active_chain, set_side_branches
+
+
+def bench(height, rounds=20):
+    chain = build_chain(height)
+    set_side_branches([])
+    set_active_chain(chain)
+
+    blocks = build_chain(rounds, chain[-1].id, height)
+
+    start = time.perf_counter()
+    for block in blocks:
+        assert connect_block(block) == 0
+    return (time.perf_counter() - start) / rounds
+
+
+def main(heights):
+    logging.disable(logging.INFO)
+    for height in heights:
+        print(f'height={height:>7} connect_block={bench(height) * 1e3:.3f} ms')
+
+
+if __name__ == '__main__':
+    main([int(h) for h in sys.argv[1:]] or [100, 1000, 10000, 50000])
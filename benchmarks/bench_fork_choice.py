@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Time connect_block on the active tip with a growing number of stale forks
+hanging off the chain. Every connect makes a fork-choice decision, which
+should cost the same however many forks there are.
+
+Usage: python -m benchmarks.bench_fork_choice [forks ...]
+"""
+import logging
+import sys
+import time
+
+from benchmarks.fixtures import build_chain, mine_block
+from mini_core.chain import connect_block, get_side_branches, set_active_chain, set_side_branches
+from mini_core.transaction import Transaction
+
+HEIGHT = 200
+
+
+def bench(num_forks, rounds=50):
+    chain = build_chain(HEIGHT)
+    set_side_branches([])
+    set_active_chain(chain[:1])
+    for block in chain[1:]:
+        connect_block(block)
+
+    # one-block forks at every height, timestamped ahead of the active chain so
+    # none is too old to accept
+    for i in range(num_forks):
+        height = 1 + i % (HEIGHT - 2)
+        coinbase = Transaction.create_coinbase('1Piq91dFUqSb7tdddCWvuGX5UgdzXeoAwA', 51 + i, height)
+        fork = mine_block(chain[height - 1].id, HEIGHT + i, coinbase=coinbase)
+        assert connect_block(fork) == len(get_side_branches())
+
+    blocks = build_chain(rounds, chain[-1].id, HEIGHT + num_forks)
+
+    start = time.perf_counter()
+    for block in blocks:
+        assert connect_block(block) == 0
+    return (time.perf_counter() - start) / rounds
+
+
+def main(fork_counts):
+    logging.disable(logging.INFO)
+    for num_forks in fork_counts:
+        print(f'stale forks={num_forks:>5} connect_block={bench(num_forks) * 1e3:.3f} ms')
+
+
+if __name__ == '__main__':
+    main([int(n) for n in sys.argv[1:]] or [0, 10, 100, 500])
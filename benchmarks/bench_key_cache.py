@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Per-input cost of validate_signature_for_spend for inputs all spending to the
+same address, with and without the address and verifying key caches. The
+signature cache is turned off so every input is really verified.
+
+Usage: python -m benchmarks.bench_key_cache [inputs]
+"""
+import sys
+import time
+
+import mini_core.validation as validation
+
+from benchmarks.fixtures import new_signing_key
+from mini_core import make_txin, sigcache, wallet
+from mini_core.transaction import OutPoint, Transaction, TxOut, UnspentTxOut
+from mini_core.utils import sha256d
+
+
+def signed_spends(num_inputs):
+    key = new_signing_key()
+    addr = wallet.pubkey_to_address.__wrapped__(key.get_verifying_key().to_string())
+    txout = TxOut(value=90, pubkey=addr)
+
+    spends = []
+    for i in range(num_inputs):
+        utxo = UnspentTxOut(
+            value=100, pubkey=addr, txid=sha256d(str(i)), txout_idx=0, is_coinbase=False, height=0)
+        txin = make_txin(key, OutPoint(utxo.txid, 0), txout)
+        spends.append((txin, utxo, Transaction(txins=[txin], txouts=[txout])))
+    return spends
+
+
+def per_input(spends) -> float:
+    start = time.perf_counter()
+    for txin, utxo, txn in spends:
+        validation.validate_signature_for_spend(txin, utxo, txn)
+    return (time.perf_counter() - start) / len(spends)
+
+
+def main(num_inputs):
+    sigcache.SIGCACHE_SIZE = 0
+    spends = signed_spends(num_inputs)
+
+    # what every input used to pay: a fresh address hash and point decode
+    validation.pubkey_to_address = wallet.pubkey_to_address.__wrapped__
+    validation.get_verifying_key = lambda pubkey: wallet._parse_verifying_key(pubkey, precompute=False)
+    uncached = per_input(spends)
+
+    validation.pubkey_to_address = wallet.pubkey_to_address
+    validation.get_verifying_key = wallet.get_verifying_key
+    wallet.clear_key_caches()
+    cached = per_input(spends)
+
+    print(f'inputs={num_inputs}')
+    print(f'uncached={uncached * 1e3:6.3f} ms/input')
+    print(f'cached  ={cached * 1e3:6.3f} ms/input  x{uncached / cached:.1f}  '
+          f'address cache: {wallet.pubkey_to_address.cache_info()}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Time adding txns to a full mempool: each add is followed by a trim that
+evicts the package with the lowest descendant fee rate, as
+add_txn_to_mempool does.
+
+Usage: python -m benchmarks.bench_mempool_trim [mempool_size ...]
+"""
+import sys
+import time
+
+from benchmarks.bench_block_template import fill_mempool, make_txn
+from mini_core.mempool import mempool
+from mini_core.transaction import OutPoint, UnspentTxOut
+from mini_core.utils import sha256d
+from mini_core.utxo_set import utxo_set
+
+from benchmarks.fixtures import ADDR
+
+ADDS = 500
+
+
+def bench(size):
+    fill_mempool(size)
+    max_bytes = mempool.total_size
+
+    txns = []
+    for i in range(ADDS):
+        outpoint = OutPoint(sha256d(f'new {i}'), 0)
+        utxo_set[outpoint] = UnspentTxOut(
+            value=1000 + i, pubkey=ADDR, txid=outpoint.txid, txout_idx=0,
+            is_coinbase=False, height=0)
+        txns.append(make_txn(outpoint, 1000 + i))
+
+    start = time.perf_counter()
+    for txn in txns:
+        mempool[txn.id] = txn
+        mempool.trim(max_bytes)
+    return (time.perf_counter() - start) / ADDS
+
+
+def main(sizes):
+    print(f'{"mempool":>8} {"add+trim ms":>12}')
+    for size in sizes:
+        print(f'{size:>8} {bench(size) * 1000:>12.3f}')
+
+    mempool.clear()
+    utxo_set.clear()
+
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or [1000, 10000, 50000])
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Compare the hashrate of the midstate nonce search in `proof_of_work` against
+the previous loop, which rebuilt and hex-decoded the whole header per nonce,
+then measure how the multi-process miner scales with the number of
+processes.
+
+Usage: python -m benchmarks.bench_mining [attempts] [max_processes]
+"""
+import os
+import sys
+import threading
+import time
+
+from mini_core import proof_of_work
+from mini_core.block import Block
+from mini_core.proof_of_work import mine_interrupt, search_nonce
+from mini_core.utils import sha256d
+
+
+def naive_search(block, start, count):
+    target = 1 << (256 - block.bits)
+    for nonce in range(start, start + count):
+        if int(sha256d(block.header(nonce)), 16) < target:
+            return nonce
+    return None
+
+
+def hashrate(search, block, attempts):
+    start = time.perf_counter()
+    search(block, 1, attempts)
+    return attempts / (time.perf_counter() - start)
+
+
+def process_hashrate(block, processes, seconds=2.):
+    """
+    Mine an unsolvable block on `processes` processes for `seconds`, then set
+    mine_interrupt. Returns the hashrate and how long the interrupt took.
+    """
+    result = {}
+
+    def run():
+        start = time.perf_counter()
+        result['nonce'], result['tried'] = proof_of_work._mine_in_processes(block, 0, processes)
+        result['elapsed'] = time.perf_counter() - start
+
+    mine_interrupt.clear()
+    t = threading.Thread(target=run)
+    t.start()
+    time.sleep(seconds)
+
+    interrupted_at = time.perf_counter()
+    mine_interrupt.set()
+    t.join()
+    stop_latency = time.perf_counter() - interrupted_at
+    mine_interrupt.clear()
+
+    return result['tried'] / result['elapsed'], stop_latency
+
+
+def main(attempts, max_processes):
+    # unsolvable in `attempts` tries so both loops do the same amount of work
+    block = Block(
+        version=0, prev_block_hash=sha256d('prev'), merkle_tree_hash=sha256d('merkle'),
+        timestamp=1501827000, bits=128, nonce=0, txns=[])
+
+    naive = hashrate(naive_search, block, attempts)
+    midstate = hashrate(search_nonce, block, attempts)
+
+    print(f'{"loop":>10} {"KH/s":>10}')
+    print(f'{"naive":>10} {naive / 1000:>10.1f}')
+    print(f'{"midstate":>10} {midstate / 1000:>10.1f}   x{midstate / naive:.2f}')
+    print()
+
+    print(f'{"processes":>10} {"KH/s":>10} {"scaling":>8} {"stop ms":>8}')
+    base = None
+    for processes in range(1, max_processes + 1):
+        rate, stop_latency = process_hashrate(block, processes)
+        base = base or rate
+        print(f'{processes:>10} {rate / 1000:>10.1f} {rate / base:>8.2f} {stop_latency * 1000:>8.1f}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count())
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Latency of read-only queries (locating the tip, an address's balance) while
+another thread connects blocks of signed txns.
+
+Run twice: with queries taking the chain lock shared and blocks validated
+under the upgradable lock, as the node does now, and with everything taking
+it exclusively, as it did before. Prints p50/p99/max query latency and the
+chain lock's wait stats for each.
+
+Usage: python -m benchmarks.bench_query_latency [blocks] [txns_per_block] [readers]
+"""
+import logging
+import sys
+import threading
+import time
+
+from benchmarks.fixtures import funded_chain, mine_block, new_signing_key, spend_txns
+from mini_core import sigcache
+from mini_core.chain import chain_lock, connect_block, get_active_chain, locate_block
+from mini_core.chain import set_active_chain, set_side_branches
+from mini_core.mempool import mempool
+from mini_core.utxo_set import add_to_utxo, balance_for_address, utxo_set
+from mini_core.wallet import pubkey_to_address
+
+
+def setup(num_blocks, txns_per_block):
+    """
+    Make a funded chain active and return the blocks to connect on top of it,
+    and the address they pay to.
+    """
+    key = new_signing_key()
+
+    chain = funded_chain(key, num_blocks * txns_per_block)
+    set_side_branches([])
+    set_active_chain(chain)
+    mempool.clear()
+    utxo_set.clear()
+    sigcache.clear()
+    for height, block in enumerate(chain):
+        for txn in block.txns:
+            for i, txout in enumerate(txn.txouts):
+                add_to_utxo(txout, txn, i, txn.is_coinbase, height)
+
+    blocks = []
+    prev = chain[-1]
+    for n in range(num_blocks):
+        txns = spend_txns(key, chain[0].txns[0], txns_per_block, start=n * txns_per_block)
+        prev = mine_block(prev.id, len(chain) + n, txns)
+        blocks.append(prev)
+
+    return blocks, pubkey_to_address(key.get_verifying_key().to_string())
+
+
+def run(blocks, addr, readers, exclusive):
+    query_lock = chain_lock if exclusive else chain_lock.shared
+    done = threading.Event()
+    latencies = []
+
+    def query():
+        while not done.is_set():
+            start = time.perf_counter()
+            with query_lock:
+                locate_block(get_active_chain()[-1].id)
+                balance_for_address(addr)
+            latencies.append(time.perf_counter() - start)
+            time.sleep(0.001)
+
+    threads = [threading.Thread(target=query) for _ in range(readers)]
+    for t in threads:
+        t.start()
+
+    chain_lock.reset_stats()
+    start = time.perf_counter()
+    for block in blocks:
+        if exclusive:
+            with chain_lock:
+                assert connect_block(block) == 0
+        else:
+            assert connect_block(block) == 0
+
+        # blocks arrive spaced out, not back to back
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - start
+
+    done.set()
+    for t in threads:
+        t.join()
+
+    return sorted(latencies), elapsed, chain_lock.stats()
+
+
+def pct(latencies, p):
+    return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1e3
+
+
+def main(num_blocks, txns_per_block, readers):
+    logging.disable(logging.INFO)
+    print(f'blocks={num_blocks} txns/block={txns_per_block} readers={readers}')
+
+    for name, exclusive in (('exclusive', True), ('rwlock', False)):
+        blocks, addr = setup(num_blocks, txns_per_block)
+        latencies, elapsed, stats = run(blocks, addr, readers, exclusive)
+
+        print(f'{name:>9}: queries={len(latencies)} p50={pct(latencies, .5):7.2f} ms  '
+              f'p99={pct(latencies, .99):7.2f} ms  max={latencies[-1] * 1e3:7.2f} ms  '
+              f'connect+gap={elapsed / num_blocks * 1e3:.1f} ms/block')
+        for mode, s in stats.items():
+            print(f'{"":>11}{mode:>10}: acquires={s.acquires} contended={s.contended} '
+                  f'mean_wait={s.mean_wait * 1e3:.3f} ms max_wait={s.max_wait * 1e3:.2f} ms')
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:]]
+    main(*(args + [10, 50, 4][len(args):]))
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Time validate_block for a block of signed txns, none of them seen before,
+with signature verification spread over increasing numbers of processes.
+
+Usage: python -m benchmarks.bench_sig_verify [txns_per_block] [max_processes]
+"""
+import logging
+import os
+import sys
+import time
+
+from benchmarks.bench_sigcache import signed_block
+from mini_core import sigcache, validation
+from mini_core.validation import validate_block
+
+
+def main(num_txns, max_processes):
+    logging.disable(logging.INFO)
+    block = signed_block(num_txns)
+
+    print(f'{"processes":>10} {"ms":>8} {"sigs/s":>8} {"speedup":>8}')
+    base = None
+    for processes in range(1, max_processes + 1):
+        if validation._sig_verify_pool is not None:
+            validation._sig_verify_pool.shutdown()
+            validation._sig_verify_pool = None
+        validation.SIG_VERIFY_PROCESSES = processes
+
+        # warm the pool up so process start-up isn't timed
+        sigcache.clear()
+        validate_block(block)
+
+        sigcache.clear()
+        start = time.perf_counter()
+        validate_block(block)
+        seconds = time.perf_counter() - start
+
+        base = base or seconds
+        print(f'{processes:>10} {seconds * 1e3:>8.1f} {num_txns / seconds:>8.0f} {base / seconds:>8.2f}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 400,
+         int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count())
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Time validate_block for a block of signed txns when its txns were already
+verified on their way into the mempool (warm signature cache) and when
+they're seen for the first time (cold).
+
+Usage: python -m benchmarks.bench_sigcache [txns_per_block]
+"""
+import logging
+import sys
+import time
+
+from benchmarks.fixtures import funded_chain, mine_block, new_signing_key, spend_txns
+from mini_core import sigcache
+from mini_core.chain import set_active_chain, set_side_branches
+from mini_core.mempool import mempool
+from mini_core.utxo_set import add_to_utxo, utxo_set
+from mini_core.validation import validate_block, validate_txn
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def signed_block(num_txns):
+    """
+    A block of `num_txns` signed spends on top of a funded chain, with the
+    chain made active and its UTXOs in place.
+    """
+    key = new_signing_key()
+
+    chain = funded_chain(key, num_txns)
+    set_side_branches([])
+    set_active_chain(chain)
+    mempool.clear()
+    utxo_set.clear()
+    for height, block in enumerate(chain):
+        for txn in block.txns:
+            for i, txout in enumerate(txn.txouts):
+                add_to_utxo(txout, txn, i, txn.is_coinbase, height)
+
+    txns = spend_txns(key, chain[0].txns[0], num_txns)
+    return mine_block(chain[-1].id, len(chain), txns)
+
+
+def main(num_txns):
+    logging.disable(logging.INFO)
+    block = signed_block(num_txns)
+    txns = block.txns[1:]
+
+    sigcache.clear()
+    cold = timed(validate_block, block)
+    cold_stats = sigcache.stats()
+
+    # as if each txn had been relayed to us before the block
+    sigcache.clear()
+    mempool_time = sum(timed(validate_txn, txn) for txn in txns)
+    before = sigcache.stats()
+    warm = timed(validate_block, block)
+    after = sigcache.stats()
+    warm_stats = after._replace(hits=after.hits - before.hits, misses=after.misses - before.misses)
+
+    print(f'txns={num_txns}')
+    print(f'cold validate_block={cold * 1e3:8.1f} ms  hits={cold_stats.hits} misses={cold_stats.misses}')
+    print(f'warm validate_block={warm * 1e3:8.1f} ms  hits={warm_stats.hits} misses={warm_stats.misses}  '
+          f'x{cold / warm:.1f}')
+    print(f'(mempool acceptance beforehand={mempool_time * 1e3:.1f} ms)')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,68 @@
+"""
+Chains and blocks for the benchmarks: real, connectable blocks mined at a
+trivial difficulty so building them is cheap.
+"""
+import ecdsa
+
+from mini_core import make_txin
+from mini_core.block import Block
+from mini_core.merkle_trees import get_merkle_root_of_txns
+from mini_core.params import Params
+from mini_core.transaction import OutPoint, Transaction, TxIn, TxOut, SignatureScript
+from mini_core.wallet import pubkey_to_address
+
+BITS = 1
+ADDR = '1Piq91dFUqSb7tdddCWvuGX5UgdzXeoAwA'
+START_TIME = 1500000000
+
+
+def mine_block(prev_block_hash, height, txns=(), coinbase=None, bits=BITS):
+    coinbase = coinbase or Transaction.create_coinbase(ADDR, 50, height)
+    txns = [coinbase, *txns]
+    block = Block(
+        version=0, prev_block_hash=prev_block_hash,
+        merkle_tree_hash=get_merkle_root_of_txns(txns).value,
+        timestamp=START_TIME + height, bits=bits, nonce=1, txns=txns)
+
+    while int(block.id, 16) > (1 << (256 - bits)):
+        block = block._replace(nonce=block.nonce + 1)
+    return block
+
+
+def build_chain(num_blocks, prev_block_hash=None, start_height=0):
+    chain = []
+    for height in range(start_height, start_height + num_blocks):
+        chain.append(mine_block(chain[-1].id if chain else prev_block_hash, height))
+    return chain
+
+
+def funded_chain(signing_key, num_outputs, value=1000):
+    """
+    A chain whose first coinbase pays `num_outputs` outputs to
+    `signing_key`, followed by enough blocks for them to mature.
+    """
+    addr = pubkey_to_address(signing_key.get_verifying_key().to_string())
+    coinbase = Transaction(
+        txins=[TxIn(outpoint=None, signature=SignatureScript(unlock_sig=b'0', unlock_pk=None), sequence=0)],
+        txouts=[TxOut(value=value, pubkey=addr)] * num_outputs)
+
+    chain = [mine_block(None, 0, coinbase=coinbase)]
+    return chain + build_chain(Params.COINBASE_MATURITY + 1, chain[-1].id, 1)
+
+
+def spend_txns(signing_key, utxo_txn, num_txns, fee=1, start=0):
+    """
+    One transaction per output of `utxo_txn`, each paying back to
+    `signing_key` minus a fee.
+    """
+    addr = pubkey_to_address(signing_key.get_verifying_key().to_string())
+    txns = []
+    for idx in range(start, start + num_txns):
+        txout = TxOut(value=utxo_txn.txouts[idx].value - fee, pubkey=addr)
+        txin = make_txin(signing_key, OutPoint(utxo_txn.id, idx), txout)
+        txns.append(Transaction(txins=[txin], txouts=[txout], locktime=0))
+    return txns
+
+
+def new_signing_key():
+    return ecdsa.SigningKey.generate(curve=ecdsa.SECP256k1)
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Count sha256d calls (txids, block ids, merkle nodes, spend messages) made
+while connecting one block full of signed transactions.
+
+Usage: python -m benchmarks.profile_hashing [txns_per_block]
+"""
+import cProfile
+import logging
+import pstats
+import sys
+
+from benchmarks.fixtures import funded_chain, mine_block, new_signing_key, spend_txns
+from mini_core.chain import connect_block, set_active_chain, set_side_branches
+from mini_core import codec
+from mini_core.mempool import mempool
+from mini_core.merkle_trees import get_merkle_root
+from mini_core.utils import sha256d
+from mini_core.utxo_set import add_to_utxo, utxo_set
+
+
+def main(num_txns):
+    logging.disable(logging.INFO)
+    key = new_signing_key()
+
+    chain = funded_chain(key, num_txns)
+    set_side_branches([])
+    set_active_chain(chain)
+    mempool.clear()
+    utxo_set.clear()
+    for height, block in enumerate(chain):
+        for txn in block.txns:
+            for i, txout in enumerate(txn.txouts):
+                add_to_utxo(txout, txn, i, txn.is_coinbase, height)
+
+    txns = spend_txns(key, chain[0].txns[0], num_txns)
+    block = mine_block(chain[-1].id, len(chain), txns)
+
+    # start from a block as it arrives off the wire: nothing memoized yet
+    block = codec.loads(codec.dumps(block))
+    get_merkle_root.cache_clear()
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    assert connect_block(block) == 0
+    profiler.disable()
+
+    stats = pstats.Stats(profiler).stats
+    calls = sum(
+        ncalls for (filename, _, name), (_, ncalls, *_) in stats.items()
+        if name == sha256d.__name__ and filename.endswith('utils.py'))
+    print(f'txns={num_txns + 1} sha256d calls={calls} '
+          f'({calls / (num_txns + 1):.1f} per txn)')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+What the active chain holds in memory as it grows, with a block store open
+(headers only, plus BLOCK_CACHE_SIZE bodies) and without (every block
+whole), measured as the serialized size of what's held. Also times reading
+a block back: the tip, from the block cache, and an old one, from disk.
+
+Usage: python -m benchmarks.report_chain_memory [blocks]
+"""
+import logging
+import random
+import sys
+import tempfile
+import time
+
+import mini_core.chain as chain
+
+from benchmarks.fixtures import ADDR, mine_block
+from mini_core.block_store import BlockStore
+from mini_core.chain import block_cache, connect_block, get_active_chain, set_active_chain, set_side_branches
+from mini_core.mempool import mempool
+from mini_core.transaction import SignatureScript, Transaction, TxIn, TxOut
+from mini_core.utxo_set import utxo_set
+
+# outputs per coinbase, to give the blocks some body
+OUTPUTS_PER_BLOCK = 20
+
+REPORT_EVERY = 1000
+
+
+def coinbase(height):
+    return Transaction(
+        txins=[TxIn(outpoint=None, signature=SignatureScript(unlock_sig=str(height).encode(), unlock_pk=None), sequence=0)],
+        txouts=[TxOut(value=50, pubkey=ADDR)] * OUTPUTS_PER_BLOCK)
+
+
+def chain_usage():
+    headers = get_active_chain().headers()
+    held = sum(b.serialized_size if b.txns else len(b.header()) for b in headers)
+    return held + sum(b.serialized_size for b in block_cache.values())
+
+
+def read_time(heights, rounds=200):
+    active = get_active_chain()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        active[random.choice(heights)]
+    return (time.perf_counter() - start) / rounds
+
+
+def simulate(num_blocks):
+    set_side_branches([])
+    set_active_chain([mine_block(None, 0, coinbase=coinbase(0))])
+    mempool.clear()
+    utxo_set.clear()
+    block_cache.clear()
+
+    report = []
+    for height in range(1, num_blocks + 1):
+        prev = get_active_chain().headers()[-1]
+        assert connect_block(mine_block(prev.id, height, coinbase=coinbase(height))) == 0
+
+        if height % REPORT_EVERY == 0:
+            report.append(chain_usage())
+
+    tip_read = read_time([-1])
+    old_read = read_time(range(1, num_blocks // 2))
+    return report, tip_read, old_read
+
+
+def main(num_blocks):
+    logging.disable(logging.INFO)
+    print(f'{OUTPUTS_PER_BLOCK} coinbase outputs/block, BLOCK_CACHE_SIZE={chain.BLOCK_CACHE_SIZE}')
+
+    results = {}
+    with tempfile.TemporaryDirectory() as path:
+        chain.block_store = BlockStore(path)
+        results['headers'] = simulate(num_blocks)
+        chain.block_store.close()
+        chain.block_store = None
+
+    results['whole'] = simulate(num_blocks)
+
+    print(f'{"height":>6} | {"headers + cache bytes":>21} | {"whole blocks bytes":>18}')
+    for i, (h, w) in enumerate(zip(results['headers'][0], results['whole'][0]), 1):
+        print(f'{i * REPORT_EVERY:>6} | {h:>21} | {w:>18}')
+
+    for label, (_, tip_read, old_read) in results.items():
+        print(f'{label:>7}: read tip={tip_read * 1e6:.1f} us  read old block={old_read * 1e6:.1f} us')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Side-branch memory over a simulated week: a block a minute
+(TIME_BETWEEN_BLOCKS_IN_SECS_TARGET), with a one-block stale fork every
+FORK_EVERY blocks. Reports, once a simulated day, how many side-branch
+blocks we hold, how many of them still have their bodies, and the serialized
+size of what's held, with stale fork pruning on and off.
+
+Usage: python -m benchmarks.report_fork_memory [days]
+"""
+import logging
+import sys
+import tempfile
+
+import mini_core.chain as chain
+
+from benchmarks.fixtures import ADDR, mine_block
+from mini_core.block_store import BlockStore
+from mini_core.chain import connect_block, get_side_branches, set_active_chain, set_side_branches
+from mini_core.params import Params
+from mini_core.transaction import SignatureScript, Transaction, TxIn, TxOut
+from mini_core.utxo_set import utxo_set
+
+FORK_EVERY = 20
+
+# outputs per coinbase, to give the blocks some body
+OUTPUTS_PER_BLOCK = 20
+
+BLOCKS_PER_DAY = 24 * 60 * 60 // Params.TIME_BETWEEN_BLOCKS_IN_SECS_TARGET
+
+
+def coinbase(height, tag=0):
+    return Transaction(
+        txins=[TxIn(outpoint=None, signature=SignatureScript(unlock_sig=str(height).encode(), unlock_pk=None), sequence=0)],
+        txouts=[TxOut(value=50 + tag, pubkey=ADDR)] * OUTPUTS_PER_BLOCK)
+
+
+def side_branch_usage():
+    blocks = [b for branch in get_side_branches() for b in branch]
+    with_bodies = [b for b in blocks if b.txns]
+    held = sum(b.serialized_size for b in with_bodies) + sum(len(b.header()) for b in blocks if not b.txns)
+    return len(blocks), len(with_bodies), held
+
+
+def simulate(days):
+    set_side_branches([])
+    set_active_chain([mine_block(None, 0, coinbase=coinbase(0))])
+    utxo_set.clear()
+
+    report = []
+    for height in range(1, days * BLOCKS_PER_DAY + 1):
+        prev = chain.get_active_chain()[-1]
+        if height % FORK_EVERY == 0:
+            assert connect_block(mine_block(chain.get_active_chain()[-2].id, height - 1, coinbase=coinbase(height - 1, 1))) > 0
+        assert connect_block(mine_block(prev.id, height, coinbase=coinbase(height))) == 0
+
+        if height % BLOCKS_PER_DAY == 0:
+            report.append(side_branch_usage())
+
+    return report
+
+
+def main(days):
+    logging.disable(logging.INFO)
+
+    print(f'{BLOCKS_PER_DAY} blocks/day, a stale fork every {FORK_EVERY} blocks, '
+          f'PRUNE_FORK_DEPTH={chain.PRUNE_FORK_DEPTH} DROP_FORK_DEPTH={chain.DROP_FORK_DEPTH}')
+
+    results = {}
+    for label, prune in (('pruned', True), ('unpruned', False)):
+        if not prune:
+            chain.PRUNE_FORK_DEPTH = chain.DROP_FORK_DEPTH = 1 << 62
+
+        with tempfile.TemporaryDirectory() as path:
+            chain.block_store = BlockStore(path)
+            results[label] = simulate(days)
+            chain.block_store.close()
+            chain.block_store = None
+
+    print(f'{"day":>3} | {"pruned: blocks  bodies      bytes":>34} | {"unpruned: blocks  bodies      bytes":>36}')
+    for day, (p, u) in enumerate(zip(results['pruned'], results['unpruned']), 1):
+        print(f'{day:>3} | {p[0]:>14} {p[1]:>7} {p[2]:>10} | {u[0]:>16} {u[1]:>7} {u[2]:>10}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 7)
@@ -23,8 +23,7 @@ from docopt import docopt
 
 from mini_core import make_txin
 from mini_core.wallet import init_wallet
-from mini_core.chain import txn_iterator
-from mini_core.networking import GetActiveChainMsg, GetMempoolMsg, encode_socket_data, read_all_from_socket, GetUTXOsMsg
+from mini_core.networking import GetAddressUTXOsMsg, GetBalanceMsg, GetTxStatusMsg, encode_socket_data, get_peer_protocol, read_all_from_socket
 from mini_core.transaction import Transaction, TxOut
 
 
@@ -56,8 +55,7 @@ def get_balance(args):
 	"""
 	Get the balance of a given address
 	"""
-	val = sum(i.value for i in find_utxos_for_address(args))
-	print(val)
+	print(send_msg(GetBalanceMsg(args['my_addr'])))
 
 
 def txn_status(args):
@@ -67,20 +65,14 @@ def txn_status(args):
 	Prints [status],[containing block_id],[height mined]
 	"""
 	txid = args['<txid>']
-	mempool = send_msg(GetMempoolMsg())
+	status = send_msg(GetTxStatusMsg(txid))
 
-	if txid in mempool:
+	if status.in_mempool:
 		print(f'{txid}:in mempool')
-		return
-
-	chain = send_msg(GetActiveChainMsg())
-
-	for tx, block, height in txn_iterator(chain):
-		if tx.id == txid:
-			print(f'Mined in {block.id} at height {height}')
-			return
-
-	print(f'Not found')
+	elif status.location:
+		print(f'Mined in {status.location.block_id} at height {status.location.height}')
+	else:
+		print(f'Not found')
 
 
 def send_value(args):
@@ -110,15 +102,24 @@ def send_msg(data: bytes, node_hostname=None, port=None):
 	node_hostname = getattr(send_msg, 'node_hostname', 'localhost')
 	port = getattr(send_msg, 'port', 8888)
 
+	binary = get_peer_protocol(node_hostname, port) >= 1
+
 	with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
 		s.connect((node_hostname, port))
-		s.sendall(encode_socket_data(data))
+		s.sendall(encode_socket_data(data, binary=binary))
 		return read_all_from_socket(s)
 
 
 def find_utxos_for_address(args: dict):
-	utxo_set = dict(send_msg(GetUTXOsMsg()))
-	return [u for u in utxo_set.values() if u.pubkey == args['my_addr']]
+	utxos = []
+	offset = 0
+
+	while offset is not None:
+		page = send_msg(GetAddressUTXOsMsg(args['my_addr'], offset))
+		utxos.extend(page.utxos)
+		offset = page.next_offset
+
+	return utxos
 
 
 if __name__ == '__main__':
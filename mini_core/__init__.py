@@ -1,14 +1,18 @@
 import logging
 import os
+import signal
 import threading
+import time
 import ecdsa
 
 from mini_core.block import Block
-from mini_core.chain import load_from_disk, get_active_chain
+from mini_core.chain import chain_lock, load_from_disk, get_active_chain, save_to_disk
+from mini_core.mempool import load_mempool, save_mempool, save_mempool_periodically
 from mini_core.transaction import OutPoint, Transaction, TxIn, TxOut, UnspentTxOut, SignatureScript
-from mini_core.networking import GetActiveChainMsg, GetMempoolMsg, GetUTXOsMsg, GetBlocksMsg, InvMsg, TCPHandler, ThreadedTCPServer, send_to_peer, get_ibd_done, get_peer_hostnames
-from mini_core.proof_of_work import mine_forever
-from mini_core.validation import build_spend_message
+from mini_core.networking import GetActiveChainMsg, GetAddressUTXOsMsg, GetBalanceMsg, GetMempoolMsg, GetUTXOsMsg, GetBlocksMsg, GetTxStatusMsg, InvMsg, UTXOPage, VersionMsg, TCPHandler, ThreadedTCPServer, send_to_peer, get_ibd_done, get_peer_hostnames
+from mini_core.txindex import TxLocation, TxStatus
+from mini_core.proof_of_work import mine_forever, mine_interrupt
+from mini_core.validation import build_spend_message, start_sig_verify_pool
 
 
 logging.basicConfig(
@@ -19,6 +23,9 @@ logger = logging.getLogger(__name__)
 
 PORT = os.environ.get('TC_PEER', 8888)
 
+# Seconds to wait for workers to stop, and then for the chain lock, on shutdown
+SHUTDOWN_TIMEOUT = float(os.environ.get('TC_SHUTDOWN_TIMEOUT', 10))
+
 
 def make_txin(signing_key, outpoint: OutPoint, txout: TxOut) -> TxIn:
     sequence = 0
@@ -28,26 +35,71 @@ def make_txin(signing_key, outpoint: OutPoint, txout: TxOut) -> TxIn:
     return TxIn(signature=SignatureScript(unlock_sig=signing_key.sign(spend_msg), unlock_pk=pk), outpoint=outpoint, sequence=sequence)
 
 
+def flush_on_exit():
+	"""
+	Flush the chainstate so the next start doesn't replay, and keep the
+	mempool so peers needn't relay it all again. A worker that didn't stop
+	may still hold the chain lock; don't wait on it forever.
+	"""
+	if not chain_lock.acquire(timeout=SHUTDOWN_TIMEOUT):
+		logger.error(
+			"couldn't take the chain lock to flush on shutdown, "
+			"the next start replays from the last flush")
+		return
+
+	try:
+		save_to_disk()
+		save_mempool()
+	finally:
+		chain_lock.release()
+
+
 def main():
+	start_sig_verify_pool()
 	load_from_disk()
+	load_mempool()
+
+	shutdown = threading.Event()
+	signal.signal(signal.SIGTERM, lambda *_: shutdown.set())
 
 	workers = []
 	server = ThreadedTCPServer(('0.0.0.0', PORT), TCPHandler)
 
-	def start_worker(fnc):
-		workers.append(threading.Thread(target=fnc, daemon=True))
+	def start_worker(fnc, *args):
+		workers.append(threading.Thread(target=fnc, args=args, daemon=True))
 		workers[-1].start()
 
 	logger.info(f'[p2p] listening on PORT {PORT}')
 	start_worker(server.serve_forever)
 
-	if get_peer_hostnames():
-		logger.info(f'start initial block download from {len(get_peer_hostnames())} peers')
-		send_to_peer(GetBlocksMsg(get_active_chain()[-1].id))
-		get_ibd_done().wait(60.)
+	try:
+		start_worker(save_mempool_periodically, shutdown)
+
+		if get_peer_hostnames():
+			logger.info(f'start initial block download from {len(get_peer_hostnames())} peers')
+			send_to_peer(GetBlocksMsg(get_active_chain().headers()[-1].id))
+			get_ibd_done().wait(60.)
+
+		start_worker(mine_forever, shutdown)
+
+		# wake up now and then, so the signal handler gets to run
+		while not shutdown.wait(1.):
+			pass
+	except KeyboardInterrupt:
+		pass
+
+	logger.info('shutting down')
+	shutdown.set()
+	server.shutdown()
+
+	deadline = time.time() + SHUTDOWN_TIMEOUT
+	for w in workers:
+		while w.is_alive() and time.time() < deadline:
+			# keep knocking the miner out of its nonce search
+			mine_interrupt.set()
+			w.join(0.1)
 
-	start_worker(mine_forever)
-	[w.join() for w in workers]
+	flush_on_exit()
 
 
 if __name__ == '__main__':
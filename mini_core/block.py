@@ -1,14 +1,9 @@
 from typing import NamedTuple, Iterable
 from mini_core.transaction import Transaction
-from mini_core.utils import sha256d
+from mini_core.utils import memoized_property, serialize, sha256d
 
 
-class Block(NamedTuple):
-    """
-    https://bitcoin.org/en/glossary/block
-
-    """
-
+class _Block(NamedTuple):
     # a version integer
     version: int
 
@@ -30,12 +25,31 @@ class Block(NamedTuple):
 
     txns: Iterable[Transaction]
 
-    def header(self, nonce=None) -> str:
+
+class Block(_Block):
+    """
+    https://bitcoin.org/en/glossary/block
+
+    `id` and `serialized_size` are computed once per instance; use `_replace`
+    to get a block with a different nonce or txns.
+    """
+
+    def header_prefix(self) -> str:
+        """
+        Everything in the header but the nonce, which always comes last.
+        """
         return (
             f"{self.version}{self.prev_block_hash}{self.merkle_tree_hash}"
-            f"{self.timestamp}{self.bits}{nonce or self.nonce}"
+            f"{self.timestamp}{self.bits}"
         )
 
-    @property
+    def header(self, nonce=None) -> str:
+        return f"{self.header_prefix()}{nonce or self.nonce}"
+
+    @memoized_property
     def id(self) -> str:
         return sha256d(self.header())
+
+    @memoized_property
+    def serialized_size(self) -> int:
+        return len(serialize(self))
@@ -0,0 +1,187 @@
+"""
+Append-only on-disk storage for blocks.
+
+Blocks are appended to numbered segment files (blk00000.dat, blk00001.dat,
+...), each record being a 4-byte big-endian length followed by the block in
+the binary codec, the same framing we use on the wire. Alongside the
+segments, index.dat holds one fixed-size record per block (block hash,
+segment, offset, length) so any block can be read back with a single seek.
+
+A block is written once, whatever happens to the chain afterwards. Writes are
+fsync'd in batches of FSYNC_EVERY blocks or when `flush` is called.
+"""
+import binascii
+import logging
+import os
+import struct
+import threading
+
+from typing import Dict, Iterable, List, NamedTuple
+from mini_core import codec
+from mini_core.block import Block
+
+
+logger = logging.getLogger(__name__)
+
+# Start a new segment file once the current one grows past this many bytes
+MAX_SEGMENT_SIZE = int(os.environ.get('TC_BLOCK_SEGMENT_SIZE', 128 * 1024 * 1024))
+
+# Number of blocks written between fsyncs
+FSYNC_EVERY = int(os.environ.get('TC_BLOCK_FSYNC_EVERY', 16))
+
+INDEX_RECORD = struct.Struct('>32sIII')
+LENGTH_PREFIX = struct.Struct('>I')
+
+
+class BlockLocation(NamedTuple):
+    segment: int
+    offset: int
+    size: int
+
+
+class BlockStore:
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._locations: Dict[str, BlockLocation] = {}
+        self._order: List[str] = []
+        self._unflushed = 0
+
+        os.makedirs(path, exist_ok=True)
+        self._load_index()
+
+        self._segment = max((l.segment for l in self._locations.values()), default=0)
+        self._segment_file = open(self._segment_path(self._segment), 'ab')
+        self._index_file = open(self._index_path(), 'ab')
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.path, f'blk{segment:05d}.dat')
+
+    def _index_path(self) -> str:
+        return os.path.join(self.path, 'index.dat')
+
+    def _load_index(self):
+        """
+        Read index.dat, dropping anything a crash may have left half written:
+        a partial trailing index record, index records pointing past the end of
+        their segment, and segment bytes no index record points to.
+        """
+        if not os.path.isfile(self._index_path()):
+            return
+
+        with open(self._index_path(), 'rb') as f:
+            data = f.read()
+
+        segment_sizes = {}
+        valid_len = 0
+
+        for offset in range(0, len(data) - INDEX_RECORD.size + 1, INDEX_RECORD.size):
+            raw_hash, segment, block_offset, size = INDEX_RECORD.unpack_from(data, offset)
+
+            if segment not in segment_sizes:
+                path = self._segment_path(segment)
+                segment_sizes[segment] = os.path.getsize(path) if os.path.isfile(path) else 0
+
+            if block_offset + size > segment_sizes[segment]:
+                break
+
+            block_hash = binascii.hexlify(raw_hash).decode()
+            self._locations[block_hash] = BlockLocation(segment, block_offset, size)
+            self._order.append(block_hash)
+            valid_len = offset + INDEX_RECORD.size
+
+        if valid_len != len(data):
+            logger.warning(f'truncating {len(data) - valid_len} bytes of index.dat')
+            with open(self._index_path(), 'r+b') as f:
+                f.truncate(valid_len)
+
+        ends = {}
+        for loc in self._locations.values():
+            ends[loc.segment] = max(ends.get(loc.segment, 0), loc.offset + loc.size)
+
+        for segment, end in ends.items():
+            if segment_sizes[segment] > end:
+                logger.warning(f'truncating unindexed tail of segment {segment}')
+                with open(self._segment_path(segment), 'r+b') as f:
+                    f.truncate(end)
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def __contains__(self, block_hash: str) -> bool:
+        return block_hash in self._locations
+
+    def write_block(self, block: Block) -> BlockLocation:
+        """
+        Append a block unless we already have it. Returns where it lives.
+        """
+        with self._lock:
+            block_hash = block.id
+            if block_hash in self._locations:
+                return self._locations[block_hash]
+
+            payload = codec.dumps(block)
+            record = LENGTH_PREFIX.pack(len(payload)) + payload
+
+            if self._segment_file.tell() and self._segment_file.tell() + len(record) > MAX_SEGMENT_SIZE:
+                self.flush()
+                self._segment_file.close()
+                self._segment += 1
+                self._segment_file = open(self._segment_path(self._segment), 'ab')
+
+            loc = BlockLocation(
+                segment=self._segment,
+                offset=self._segment_file.tell() + LENGTH_PREFIX.size,
+                size=len(payload))
+
+            self._segment_file.write(record)
+            self._segment_file.flush()
+            self._index_file.write(INDEX_RECORD.pack(
+                binascii.unhexlify(block_hash), loc.segment, loc.offset, loc.size))
+            self._index_file.flush()
+
+            self._locations[block_hash] = loc
+            self._order.append(block_hash)
+
+            self._unflushed += 1
+            if self._unflushed >= FSYNC_EVERY:
+                self.flush()
+
+            return loc
+
+    def read_block(self, block_hash: str) -> Block:
+        loc = self._locations.get(block_hash)
+        if not loc:
+            return None
+
+        with open(self._segment_path(loc.segment), 'rb') as f:
+            f.seek(loc.offset)
+            return codec.loads(f.read(loc.size))
+
+    def block_hashes(self) -> List[str]:
+        """
+        Hashes of the stored blocks, in the order they were written.
+        """
+        return list(self._order)
+
+    def iter_blocks(self, start: int = 0) -> Iterable[Block]:
+        """
+        Yield stored blocks in the order they were written, starting with the
+        `start`-th one.
+        """
+        for block_hash in self._order[start:]:
+            yield self.read_block(block_hash)
+
+    def flush(self):
+        with self._lock:
+            for f in (self._segment_file, self._index_file):
+                f.flush()
+                os.fsync(f.fileno())
+            self._unflushed = 0
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            self._segment_file.close()
+            self._index_file.close()
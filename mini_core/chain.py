@@ -1,20 +1,45 @@
+import heapq
 import logging
 import os
 import binascii
+import threading
 
-from typing import Iterable, Union
-from threading import RLock
+from collections import OrderedDict
+from typing import Dict, Iterable, List, NamedTuple, Sequence, Set, Tuple, Union
 from mini_core.block import Block
+from mini_core.block_store import BlockStore
+from mini_core.chainstate import Chainstate
 from mini_core.exceptions import BlockValidationError
-from mini_core.mempool import mempool
-from mini_core.transaction import Transaction, SignatureScript, TxIn, TxOut
+from mini_core.mempool import mempool, reprocess_orphans
+from mini_core.orphans import orphan_blocks
+from mini_core.rwlock import RWLock
+from mini_core.transaction import OutPoint, Transaction, SignatureScript, TxIn, TxOut, UnspentTxOut
+from mini_core.txindex import TXINDEX_ENABLED, index_block_txns, txindex, unindex_block_txns
 from mini_core.utils import deserialize
-from mini_core.utxo_set import add_to_utxo, rm_from_utxo
+from mini_core.utxo_set import UTXOOverlay, add_to_utxo, rebuild_address_index, restore_utxo, rm_from_utxo, utxo_set
 from functools import wraps
 
 
+# Single-file chain format used before the block store; migrated on startup
 CHAIN_PATH = os.environ.get('TC_CHAIN_PATH', 'chain.dat')
 
+BLOCKS_PATH = os.environ.get('TC_BLOCKS_PATH', 'blocks')
+
+CHAINSTATE_PATH = os.environ.get('TC_CHAINSTATE_PATH', 'chainstate.sqlite')
+
+# Flush the chainstate after this many blocks are added to the active chain
+CHAINSTATE_FLUSH_EVERY = int(os.environ.get('TC_CHAINSTATE_FLUSH_EVERY', 100))
+
+# Side branches forking off more than this many blocks below the tip are cut
+# down to their headers; the block store keeps the bodies
+PRUNE_FORK_DEPTH = int(os.environ.get('TC_PRUNE_FORK_DEPTH', 100))
+
+# and ones forking off more than this many blocks below are forgotten
+DROP_FORK_DEPTH = int(os.environ.get('TC_DROP_FORK_DEPTH', 1000))
+
+# Bodies of active-chain blocks kept in memory, on top of the headers
+BLOCK_CACHE_SIZE = int(os.environ.get('TC_BLOCK_CACHE_SIZE', 100))
+
 logger = logging.getLogger(__name__)
 
 genesis_block = Block(**{
@@ -37,18 +62,182 @@ genesis_block = Block(**{
     ]
 })
 
+# Opened by load_from_disk; every block we accept is appended to it
+block_store: BlockStore = None
+
+# Opened by load_from_disk; the UTXO set as of the last flush
+chainstate: Chainstate = None
+
+# Block hash -> block, for the active-chain blocks whose bodies were last
+# used; the least recently used are dropped first
+block_cache: 'OrderedDict[str, Block]' = OrderedDict()
+
+_block_cache_lock = threading.Lock()
+
+
+def _header(block: Block) -> Block:
+    """
+    What we hold on to for a block: just its header, as a block with no
+    txns, once the block store has the body to reload it from.
+    """
+    if not block.txns or block_store is None or block.id not in block_store:
+        return block
+
+    return block._replace(txns=[])
+
+
+def _full_block(block: Block) -> Block:
+    """
+    `block` with its txns, reloading them from the block store if only the
+    header was kept. None if the store doesn't have them.
+    """
+    if block.txns or block_store is None:
+        return block
+
+    with _block_cache_lock:
+        cached = block_cache.get(block.id)
+        if cached is not None:
+            block_cache.move_to_end(block.id)
+            return cached
+
+    full = block_store.read_block(block.id)
+    if full is not None:
+        _cache_block(full)
+    return full
+
+
+def _cache_block(block: Block):
+    if BLOCK_CACHE_SIZE <= 0:
+        return
+
+    with _block_cache_lock:
+        block_cache[block.id] = block
+        block_cache.move_to_end(block.id)
+        while len(block_cache) > BLOCK_CACHE_SIZE:
+            block_cache.popitem(last=False)
+
+
+class ActiveChain(Sequence):
+    """
+    The active chain, as a sequence of blocks. Only headers are held, bodies
+    are read back from the block store through `block_cache` when a block is
+    indexed or iterated over; without a block store blocks are held whole.
+    Use `headers` for what only needs header fields.
+
+    Compares equal to a list of the same blocks.
+    """
+
+    def __init__(self, blocks: Iterable[Block] = ()):
+        self._headers: List[Block] = [_header(block) for block in blocks]
+
+    def __len__(self) -> int:
+        return len(self._headers)
+
+    def __getitem__(self, i) -> Union[Block, List[Block]]:
+        if isinstance(i, slice):
+            return [_full_block(block) for block in self._headers[i]]
+        return _full_block(self._headers[i])
+
+    def __iter__(self) -> Iterable[Block]:
+        return (_full_block(block) for block in list(self._headers))
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, (list, ActiveChain)) or len(self) != len(other):
+            return False
+        return all(a == b for a, b in zip(self, other))
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f'ActiveChain({len(self)} blocks)'
+
+    def headers(self) -> List[Block]:
+        return self._headers
+
+    def append(self, block: Block):
+        header = _header(block)
+        if header is not block:
+            # likely wanted again soon, by miners and peers catching up
+            _cache_block(block)
+        self._headers.append(header)
+
+    def extend(self, blocks: Iterable[Block]):
+        for block in blocks:
+            self.append(block)
+
+    def pop(self) -> Block:
+        return _full_block(self._headers.pop())
+
+    def __delitem__(self, i):
+        del self._headers[i]
+
+
 # highest proof of work
-active_chain: Iterable[Block] = [genesis_block]
+active_chain: ActiveChain = ActiveChain([genesis_block])
 
-# side branches
-side_branches: Iterable[Iterable[Block]] = []
+# Undo data for active blocks that hasn't been flushed to the chainstate yet:
+# block hash -> the UTXOs the block spent, in the order of its txins
+block_undo: Dict[str, Iterable[UnspentTxOut]] = {}
 
-orphan_blocks: Iterable[Block] = []
+# Side branch blocks dropped since the last flush. The chainstate keeps them
+# so a restart doesn't replay them from the block store.
+dropped_blocks: Set[str] = set()
 
 ACTIVE_CHAIN_IDX = 0
 
-# Synchronize access to the active chain and side branches
-chain_lock = RLock()
+
+class BlockIndexEntry(NamedTuple):
+    """
+    Where a block we've seen lives, so that lookups by hash don't have to
+    walk every chain.
+    """
+
+    block: Block
+
+    # absolute height of the block, counting the genesis block as 0
+    height: int
+
+    # ACTIVE_CHAIN_IDX, or the 1-based index of the block's side branch
+    chain_idx: int
+
+    # hash of the parent block
+    prev_block_hash: str
+
+    # total work of the chain ending with this block
+    chainwork: int
+
+    # failed validation, or builds on a block that did; never reorged onto
+    invalid: bool = False
+
+
+class SideBranch(NamedTuple):
+    """
+    A run of blocks off the active chain, or off another side branch, each
+    building on the one before.
+    """
+
+    # hash of the first block; its parent is on another chain
+    root: str
+
+    # hash of the last block
+    tip: str
+
+
+# The block tree: block hash -> BlockIndexEntry for every block we've
+# connected, on the active chain or not. Each entry points at its parent.
+block_index: Dict[str, BlockIndexEntry] = {}
+
+# Side branches, in the order they were created; chain_idx n is entry n - 1
+side_branches: List[SideBranch] = []
+
+# (-chainwork, block hash) for every side-branch block, so the one with the
+# most work is on top. Blocks since made active or dropped are skipped when
+# they come up.
+best_side_tips: List[Tuple[int, str]] = []
+
+# Synchronize access to the active chain, side branches and UTXO set: shared
+# to read them, upgradable to validate a block, exclusive to change them
+chain_lock = RWLock()
 
 
 def set_active_chain(val: Iterable[Block]):
@@ -56,20 +245,38 @@ def set_active_chain(val: Iterable[Block]):
     Should not be called outside of testing purpose
     """
     global active_chain
-    active_chain = val
+    with chain_lock:
+        branches = get_side_branches()
+        active_chain = ActiveChain(val)
+        _rebuild_block_index(branches)
 
 
 def set_side_branches(val: Iterable[Iterable[Block]]):
-    global side_branches
-    side_branches = val
+    with chain_lock:
+        _rebuild_block_index(val)
 
 
-def get_active_chain() -> Iterable[Block]:
+def get_active_chain() -> ActiveChain:
     return active_chain
 
 
-def get_side_branches() -> Iterable[Block]:
-    return side_branches
+def get_side_branches() -> List[List[Block]]:
+    """
+    The blocks of each side branch, read off the block tree.
+    """
+    with chain_lock.shared:
+        return [_branch_blocks(branch) for branch in side_branches]
+
+
+def _branch_blocks(branch: SideBranch) -> List[Block]:
+    blocks = []
+    block_hash = branch.tip
+    while True:
+        entry = block_index[block_hash]
+        blocks.append(entry.block)
+        if block_hash == branch.root:
+            return blocks[::-1]
+        block_hash = entry.prev_block_hash
 
 
 def with_lock(lock):
@@ -82,12 +289,103 @@ def with_lock(lock):
     return decorate
 
 
+def block_work(bits: int) -> int:
+    """
+    Expected number of hashes needed to find a block with the given bits.
+    """
+    return 1 << bits
+
+
+def index_block(block: Block, chain_idx: int, height: int = None) -> BlockIndexEntry:
+    parent = block_index.get(block.prev_block_hash)
+    previous = block_index.get(block.id)
+
+    if height is None:
+        height = parent.height + 1 if parent else 0
+
+    entry = BlockIndexEntry(
+        block=block,
+        height=height,
+        chain_idx=chain_idx,
+        prev_block_hash=block.prev_block_hash,
+        chainwork=(parent.chainwork if parent else 0) + block_work(block.bits),
+        invalid=chain_idx != ACTIVE_CHAIN_IDX and any(
+            e is not None and e.invalid for e in (parent, previous)),
+    )
+    block_index[block.id] = entry
+
+    if chain_idx != ACTIVE_CHAIN_IDX and not entry.invalid:
+        heapq.heappush(best_side_tips, (-entry.chainwork, block.id))
+
+    return entry
+
+
+def _rebuild_block_index(branches: Iterable[Iterable[Block]]):
+    block_index.clear()
+    side_branches.clear()
+    best_side_tips.clear()
+
+    for height, block in enumerate(active_chain.headers()):
+        index_block(block, ACTIVE_CHAIN_IDX, height)
+
+    _index_side_branches(branches)
+
+
+def _index_side_branches(branches: Iterable[Iterable[Block]]):
+    for chain in branches:
+        if not chain:
+            continue
+        side_branches.append(SideBranch(root=chain[0].id, tip=chain[-1].id))
+        for block in chain:
+            index_block(block, len(side_branches))
+
+
 @with_lock(chain_lock)
+def rebuild_block_index():
+    _rebuild_block_index(get_side_branches())
+
+
+rebuild_block_index()
+
+
+def _position_in_chain(entry: BlockIndexEntry) -> int:
+    """
+    locate_block reports heights relative to the start of the chain the block
+    lives in; side branches start right after their fork point.
+    """
+    if entry.chain_idx == ACTIVE_CHAIN_IDX:
+        return entry.height
+
+    first = block_index[side_branches[entry.chain_idx - 1].root]
+    return entry.height - first.height
+
+
+def _side_branch_for(block: Block) -> int:
+    """
+    The side branch a block off the active chain goes on: its parent's, if
+    the parent is that branch's tip, otherwise a new one.
+    """
+    parent = block_index[block.prev_block_hash]
+
+    if parent.chain_idx != ACTIVE_CHAIN_IDX:
+        branch = side_branches[parent.chain_idx - 1]
+        if branch.tip == block.prev_block_hash:
+            side_branches[parent.chain_idx - 1] = branch._replace(tip=block.id)
+            return parent.chain_idx
+
+    side_branches.append(SideBranch(root=block.id, tip=block.id))
+    logger.info(
+        f'creating a new side branch (idx {len(side_branches)}) '
+        f'for block {block.id}')
+    return len(side_branches)
+
+
+@with_lock(chain_lock.shared)
 def get_current_height():
     return len(active_chain)
 
 
-@with_lock(chain_lock)
+@with_lock(chain_lock.shared)
 def txn_iterator(chain):
     return (
         (txn, block, height)
@@ -95,26 +393,63 @@ def txn_iterator(chain):
     )
 
 
-@with_lock(chain_lock)
+@with_lock(chain_lock.shared)
 def locate_block(block_hash: str, chain=None) -> (Block, int, int):
-    chains = [chain] if chain else [active_chain, *side_branches]
-    for chain_idx, chain in enumerate(chains):
+    if chain is not None and chain is not active_chain:
+        # not a chain we index, fall back to scanning it
         for height, block in enumerate(chain):
             if block.id == block_hash:
-                return (block, height, chain_idx)
-    return (None, None, None)
+                return (block, height, 0)
+        return (None, None, None)
 
+    entry = block_index.get(block_hash)
 
-@with_lock(chain_lock)
-def connect_block(block: Union[str, Block], doing_reorg=False) -> Union[None, Block]:
+    if not entry or (chain is not None and entry.chain_idx != ACTIVE_CHAIN_IDX):
+        return (None, None, None)
+
+    return (entry.block, _position_in_chain(entry), entry.chain_idx)
+
+
+@with_lock(chain_lock.upgradable)
+def connect_block(block: Union[str, Block]) -> Union[None, Block]:
     """
     Accept a block and return the chain index we append it to.
+
+    Any orphan blocks waiting on it are connected right after, then the ones
+    waiting on those, and so on.
     """
-    from mini_core.validation import validate_block
+    chain_idx = _connect_block(block)
+
+    if chain_idx is not None and len(orphan_blocks):
+        connect_orphan_blocks(block.id)
+
+    return chain_idx
+
 
-    search_chain = active_chain if doing_reorg else None
+@with_lock(chain_lock.upgradable)
+def connect_orphan_blocks(block_hash: str):
+    """
+    Connect the orphan blocks that were waiting on `block_hash`, and the
+    orphans waiting on those, without recursing.
+    """
+    parents = [block_hash]
+
+    while parents:
+        for orphan in orphan_blocks.pop_children(parents.pop()):
+            logger.info(f'connecting orphan block {orphan.id}')
+            if _connect_block(orphan) is not None:
+                parents.append(orphan.id)
+
+    stats = orphan_blocks.stats()
+    logger.debug(
+        f'orphan blocks: {stats.count} held, {stats.size} bytes, '
+        f'hit rate {stats.hit_rate:.2f}')
+
+
+def _connect_block(block: Union[str, Block]) -> Union[None, Block]:
+    from mini_core.validation import validate_block
 
-    if locate_block(block.id, chain=search_chain)[0]:
+    if locate_block(block.id)[0]:
         logger.debug(f'ignore block already seen: {block.id}')
         return None
 
@@ -124,34 +459,66 @@ def connect_block(block: Union[str, Block], doing_reorg=False) -> Union[None, Bl
         logger.exception(f'block {block.id} failed validation')
         if e.to_orphan:
             logger.info(f'saw orphan block {block.id}')
-            orphan_blocks.append(e.to_orphan)
+            orphan_blocks.add(e.to_orphan)
         return None
 
-    # If validate_block returned a non-existent chain index, we're creating
-    # a new side branch
-    if chain_idx != ACTIVE_CHAIN_IDX and len(side_branches) < chain_idx:
-        logger.info(
-            f'creating a new side branch (idx {chain_idx}) '
-            f'for block {block.id}')
-        side_branches.append([])
-
-    logger.info(f'connecting block {block.id} to chain {chain_idx}')
-    chain = (active_chain if chain_idx ==
-             ACTIVE_CHAIN_IDX else side_branches[chain_idx-1])
-    chain.append(block)
+    # Builds on a block that failed validation: indexed, so that its own
+    # children are known to be invalid too, but not stored or relayed.
+    parent = block_index.get(block.prev_block_hash)
+    if parent is not None and parent.invalid:
+        logger.info(f'block {block.id} builds on invalid block {parent.block.id}')
+        with chain_lock:
+            index_block(block, _side_branch_for(block))
+        return None
 
-    # If we added to the active chain, perform upkeep on utxo_set and mempool
+    if block_store is not None:
+        block_store.write_block(block)
+
+    # Validation only needed the upgradable lock, readers could carry on;
+    # changing the chain needs it to ourselves.
+    with chain_lock:
+        if chain_idx != ACTIVE_CHAIN_IDX:
+            chain_idx = _side_branch_for(block)
+
+        logger.info(f'connecting block {block.id} to chain {chain_idx}')
+        if chain_idx == ACTIVE_CHAIN_IDX:
+            active_chain.append(block)
+            index_block(active_chain.headers()[-1], chain_idx, len(active_chain) - 1)
+        else:
+            index_block(block, chain_idx)
+
+        # If we added to the active chain, perform upkeep on utxo_set and mempool
+        if chain_idx == ACTIVE_CHAIN_IDX:
+            spent = []
+
+            for txn in block.txns:
+                mempool.pop(txn.id, None)
+
+                evicted = mempool.remove_conflicts(txn)
+                if evicted:
+                    logger.info(f'evicted {len(evicted)} mempool txns conflicting with {txn.id}')
+
+                if not txn.is_coinbase:
+                    for txin in txn.txins:
+                        spent.append(utxo_set[txin.outpoint])
+                        rm_from_utxo(*txin.outpoint)
+                for i, txout in enumerate(txn.txouts):
+                    add_to_utxo(txout, txn, i, txn.is_coinbase, len(active_chain))
+
+            block_undo[block.id] = spent
+            index_block_txns(block, len(active_chain) - 1)
+
+    # The rest doesn't need readers kept out: orphan txns are validated under
+    # the upgradable lock we still hold, and each step takes the lock
+    # exclusively only for as long as it changes something.
     if chain_idx == ACTIVE_CHAIN_IDX:
-        for txn in block.txns:
-            mempool.pop(txn.id, None)
+        reprocess_orphans(block)
+        prune_stale_forks()
 
-            if not txn.is_coinbase:
-                for txin in txn.txins:
-                    rm_from_utxo(*txin.outpoint)
-            for i, txout in enumerate(txn.txouts):
-                add_to_utxo(txout, txn, i, txn.is_coinbase, len(chain))
+        if len(active_chain) % CHAINSTATE_FLUSH_EVERY == 0:
+            save_to_disk()
 
-    if (not doing_reorg and reorg_if_necessary()) or chain_idx == ACTIVE_CHAIN_IDX:
+    if reorg_if_necessary() or chain_idx == ACTIVE_CHAIN_IDX:
         from mini_core.proof_of_work import mine_interrupt
         mine_interrupt.set()
         logger.info(
@@ -171,106 +538,420 @@ def disconnect_block(block, chain=None):
     chain = chain or active_chain
     assert block == chain[-1], "Block being disconnected must be tip."
 
-    for txn in block.txns:
-        mempool[txn.id] = txn
-
-        # Restore UTXO set to what it was before this block.
-        for txin in txn.txins:
-            if txin.outpoint: # account for degenerate coinbase txins.
-                add_to_utxo(*find_txout_for_txin(txin, chain))
+    spent = get_block_undo(block.id)
+    if spent is None:
+        logger.warning(f'no undo data for block {block.id}, searching the chain')
+        spent = [
+            find_txout_for_txin(txin, chain)
+            for txn in block.txns for txin in txn.txins if txin.outpoint
+        ]
+
+    # Restore the UTXO set to what it was before this block. Walk it backwards
+    # so outputs spent within the block are restored before they're removed.
+    spent = iter(spent[::-1])
+    for txn in block.txns[::-1]:
         for i in range(len(txn.txouts)):
             rm_from_utxo(txn.id, i)
+        for txin in txn.txins[::-1]:
+            if txin.outpoint: # account for degenerate coinbase txins.
+                restore_utxo(next(spent))
+
+    # Back into the mempool now that what they spend is unspent again, so
+    # their fees can be worked out.
+    for txn in block.txns:
+        if not txn.is_coinbase:
+            mempool[txn.id] = txn
 
     logger.info(f'block {block.id} disconnected')
+    unindex_block_txns(block)
+    block_undo.pop(block.id, None)
+    block_index.pop(block.id, None)
     return chain.pop()
 
 
-def find_txout_for_txin(txin, chain):
+def get_block_undo(block_hash: str) -> Iterable[UnspentTxOut]:
+    if block_hash in block_undo:
+        return block_undo[block_hash]
+
+    if chainstate is not None:
+        return chainstate.load_undo(block_hash)
+
+    return None
+
+
+def find_txout_for_txin(txin, chain) -> UnspentTxOut:
+    """
+    Slow path for blocks connected before we kept undo data.
+    """
     txid, txout_idx = txin.outpoint
 
     for txn, block, height in txn_iterator(chain):
         if txn.id == txid:
-            txout = txn.txouts[txout_idx]
-            return (txout, txn, txout_idx, txn.is_coinbase, height)
+            return UnspentTxOut(
+                *txn.txouts[txout_idx], txid=txid, txout_idx=txout_idx,
+                is_coinbase=txn.is_coinbase, height=height)
 
 
-@with_lock(chain_lock)
+@with_lock(chain_lock.upgradable)
 def reorg_if_necessary() -> bool:
+    """
+    Switch to the side branch with the most work, if it has more than the
+    active chain.
+    """
     reorged = False
-    frozen_side_branches = list(side_branches)
+    active_work = block_index[active_chain.headers()[-1].id].chainwork if active_chain else 0
 
-    # TODO should probably be using `chainwork` for the basis of comparison here.
-    for branch_idx, chain in enumerate(frozen_side_branches, 1):
-        fork_block, fork_idx, _ = locate_block(
-            chain[0].prev_block_hash, active_chain)
-        active_height = len(active_chain)
-        branch_height = len(chain) + fork_idx
+    while best_side_tips and -best_side_tips[0][0] > active_work:
+        tip_hash = best_side_tips[0][1]
+        entry = block_index.get(tip_hash)
 
-        if branch_height > active_height:
+        if entry and entry.chain_idx != ACTIVE_CHAIN_IDX and not entry.invalid:
+            fork_idx, branch = _branch_from_active_chain(tip_hash)
             logger.info(
-                f"attempting reorg of idx {branch_idx} to active_chain: "
-                f"new height of {branch_height} (vs. {active_height})"
-            )
-            reorged |= try_reorg(chain, branch_idx, fork_idx)
+                f'attempting reorg to {tip_hash}: chainwork of {entry.chainwork} '
+                f'(vs. {active_work})')
+
+            if fork_idx is not None and try_reorg(branch, fork_idx):
+                reorged = True
+                active_work = entry.chainwork
+                continue
+
+        # stale, invalid, or not a branch we can switch to
+        while best_side_tips and best_side_tips[0][1] == tip_hash:
+            heapq.heappop(best_side_tips)
 
     return reorged
 
 
-@with_lock(chain_lock)
-def try_reorg(branch, branch_idx, fork_idx) -> bool:
-    global side_branches
+def _mark_invalid(block_hash: str):
+    """
+    Mark a side-branch block that failed validation, and every block built on
+    it, invalid, so none of them is reorged onto again.
+    """
+    children = {}
+    for h, entry in block_index.items():
+        if entry.chain_idx != ACTIVE_CHAIN_IDX:
+            children.setdefault(entry.prev_block_hash, []).append(h)
 
-    fork_block = active_chain[fork_idx]
+    marked = [block_hash]
+    while marked:
+        h = marked.pop()
+        block_index[h] = block_index[h]._replace(invalid=True)
+        marked.extend(children.get(h, []))
 
-    def disconnect_to_fork():
-        while active_chain[-1].id != fork_block.id:
-            yield disconnect_block(active_chain[-1])
+    logger.info(f'marked block {block_hash} and its descendants invalid')
 
-    old_active = list(disconnect_to_fork())[::-1]
 
-    assert branch[0].prev_block_hash == active_chain[-1].id
+def _branch_from_active_chain(block_hash: str) -> (int, List[Block]):
+    """
+    Walk back from a side-branch block to the active chain. Returns the
+    height of the fork point and the blocks from there up to `block_hash`.
+    """
+    branch = []
+    entry = block_index.get(block_hash)
 
-    def rollback_reorg():
-        logger.info(f'reorg of idx {branch_idx} to active_chain failed')
-        list(disconnect_to_fork()) # force the generate to eval
+    while entry and entry.chain_idx != ACTIVE_CHAIN_IDX:
+        branch.append(entry.block)
+        entry = block_index.get(entry.prev_block_hash)
 
-        for block in old_active:
-            assert connect_block(block, doing_reorg=True) == ACTIVE_CHAIN_IDX
+    if not entry:
+        return None, None
 
-    for block in branch:
-        connected_idx = connect_block(block, doing_reorg=True)
-        if connected_idx != ACTIVE_CHAIN_IDX:
-            rollback_reorg()
+    return entry.height, branch[::-1]
+
+
+def _undo_block_utxos(block: Block, spent: Iterable[UnspentTxOut], view: UTXOOverlay):
+    spent = iter(spent[::-1])
+    for txn in block.txns[::-1]:
+        for i in range(len(txn.txouts)):
+            view.remove(OutPoint(txn.id, i))
+        for txin in txn.txins[::-1]:
+            if txin.outpoint:
+                view.add(next(spent))
+
+
+def _apply_block_utxos(block: Block, height: int, view: UTXOOverlay) -> List[UnspentTxOut]:
+    """
+    Returns the UTXOs the block spent, as undo data.
+    """
+    spent = []
+    for txn in block.txns:
+        if not txn.is_coinbase:
+            for txin in txn.txins:
+                spent.append(view.remove(txin.outpoint))
+        for i, txout in enumerate(txn.txouts):
+            view.add(UnspentTxOut(
+                *txout, txid=txn.id, txout_idx=i, is_coinbase=txn.is_coinbase, height=height))
+    return spent
+
+
+@with_lock(chain_lock.upgradable)
+def try_reorg(branch, fork_idx) -> bool:
+    """
+    Make `branch` the active chain from `fork_idx` on, if all of it is valid.
+
+    The UTXO set the branch would leave us with is built up in an overlay
+    while each of its blocks is validated against it; nothing global changes
+    until the whole branch has passed, and a bad branch leaves no trace.
+    """
+    from mini_core.validation import validate_branch_block
+
+    fork_block = active_chain.headers()[fork_idx]
+    old_active = active_chain[fork_idx + 1:]
+    tip_hash = branch[-1].id
+    branch = [_full_block(block) for block in branch]
+
+    if not all(block and block.txns for block in branch):
+        logger.warning(f'bodies missing for the branch to {tip_hash}, not reorging')
+        return False
+
+    assert branch[0].prev_block_hash == fork_block.id
+
+    overlay = UTXOOverlay()
+
+    for block in old_active[::-1]:
+        spent = get_block_undo(block.id)
+        if spent is None:
+            logger.warning(f'no undo data for block {block.id}, searching the chain')
+            spent = [
+                find_txout_for_txin(txin, active_chain)
+                for txn in block.txns for txin in txn.txins if txin.outpoint
+            ]
+        _undo_block_utxos(block, spent, overlay)
+
+    recent_blocks = active_chain.headers()[max(fork_idx - 10, 0):fork_idx + 1]
+    branch_undo = {}
+
+    for height, block in enumerate(branch, fork_idx + 1):
+        try:
+            validate_branch_block(block, height, recent_blocks, overlay)
+        except BlockValidationError:
+            logger.exception(f'block {block.id} failed validation')
+            logger.info(f'reorg to {branch[-1].id} failed')
+            with chain_lock:
+                _mark_invalid(block.id)
             return False
 
-    # Fix up side branches: remove new active, add old active.
-    side_branches.pop(branch_idx - 1)
-    side_branches.append(old_active)
+        # connect_block records UTXOs at the chain length after the block
+        branch_undo[block.id] = _apply_block_utxos(block, height + 1, overlay)
+        recent_blocks.append(block)
+
+    # The whole branch is good, switch over.
+    with chain_lock:
+        overlay.commit()
+
+        del active_chain[fork_idx + 1:]
+        active_chain.extend(branch)
+
+        for block in old_active:
+            unindex_block_txns(block)
+            block_undo.pop(block.id, None)
+
+        for height, block in enumerate(branch, fork_idx + 1):
+            index_block(active_chain.headers()[height], ACTIVE_CHAIN_IDX, height)
+            block_undo[block.id] = branch_undo[block.id]
+            index_block_txns(block, height)
+
+        # Back into the mempool now that what they spend is unspent again, less
+        # whatever the branch confirmed or double spent.
+        for block in old_active:
+            for txn in block.txns:
+                if not txn.is_coinbase:
+                    mempool[txn.id] = txn
+
+        for block in branch:
+            for txn in block.txns:
+                mempool.pop(txn.id, None)
+                mempool.remove_conflicts(txn)
+
+        _reindex_side_branches(old_active)
 
-    logger.info(f'chain reorg! New height: {len(active_chain)}, tip: {active_chain[-1].id}')
+    logger.info(f'chain reorg! New height: {len(active_chain)}, tip: {active_chain.headers()[-1].id}')
     return True
 
 
+def _reindex_side_branches(old_active: List[Block]):
+    """
+    After a reorg: drop what became active from the side branches, and add
+    the blocks that are no longer active as a new one.
+    """
+    branches = []
+    for chain_idx, branch in enumerate(side_branches, 1):
+        blocks = []
+        entry = block_index[branch.tip]
+        while entry and entry.chain_idx == chain_idx:
+            blocks.append(entry.block)
+            entry = block_index.get(entry.prev_block_hash)
+
+        branches.append(blocks[::-1])
+
+    branches.append(old_active)
+
+    side_branches.clear()
+    best_side_tips.clear()
+    _index_side_branches(branches)
+
+
 @with_lock(chain_lock)
+def prune_stale_forks():
+    """
+    Bound the memory side branches take: those forking off more than
+    PRUNE_FORK_DEPTH blocks below the tip keep only their headers, and those
+    forking off more than DROP_FORK_DEPTH below are dropped, along with any
+    branches off them. Without a block store to reload bodies from, nothing
+    is cut down to headers.
+    """
+    tip_height = len(active_chain) - 1
+    kept = []
+
+    for branch in side_branches:
+        root = block_index[branch.root]
+        fork_depth = tip_height - (root.height - 1)
+
+        if fork_depth > DROP_FORK_DEPTH or root.prev_block_hash not in block_index:
+            for block in _branch_blocks(branch):
+                del block_index[block.id]
+                dropped_blocks.add(block.id)
+            logger.info(f'dropped stale side branch {branch.root}')
+            continue
+
+        kept.append(branch)
+
+        if fork_depth <= PRUNE_FORK_DEPTH or block_store is None:
+            continue
+
+        # blocks are pruned from the root up, so only the tip end can still
+        # have bodies
+        block_hash = branch.tip
+        while block_hash:
+            entry = block_index[block_hash]
+            if not entry.block.txns:
+                break
+            block_store.write_block(entry.block)
+            block_index[block_hash] = entry._replace(block=_header(entry.block))
+            block_hash = entry.prev_block_hash if block_hash != branch.root else None
+
+    if len(kept) != len(side_branches):
+        branches = [_branch_blocks(branch) for branch in kept]
+        side_branches.clear()
+        best_side_tips.clear()
+        _index_side_branches(branches)
+
+
+@with_lock(chain_lock.upgradable)
 def save_to_disk():
-    from mini_core.networking import encode_socket_data
-    with open(CHAIN_PATH, 'wb') as f:
-        logger.info(f'saving chain with {len(active_chain)} blocks')
-        f.write(encode_socket_data(list(active_chain)))
+    """
+    Make every block written to the block store so far durable, then flush
+    the chainstate as of the current tip.
+
+    Only what the upgradable lock's holder changes is read or cleared here,
+    so readers carry on while it writes.
+    """
+    if block_store is not None:
+        block_store.flush()
+
+    if chainstate is not None:
+        # block_undo holds exactly the blocks made active since the last flush
+        headers = [
+            (block_index[h].block, block_index[h].height) for h in block_undo if h in block_index]
+        chainstate.flush(
+            active_chain.headers()[-1].id, block_undo, with_txindex=TXINDEX_ENABLED, headers=headers,
+            dropped=dropped_blocks)
+        block_undo.clear()
+        dropped_blocks.clear()
+
+
+def migrate_chain_file(path: str):
+    """
+    Copy the blocks of a legacy single-file chain into the block store.
+    """
+    with open(path, 'rb') as f:
+        msg_len = int(binascii.hexlify(f.read(4) or b'\x00'), 16)
+        blocks = deserialize(f.read(msg_len))
+
+    logger.info(f'migrating {len(blocks)} blocks from {path} to the block store')
+    for block in blocks:
+        block_store.write_block(block)
+    block_store.flush()
+
+    os.rename(path, f'{path}.migrated')
+
+
+def load_chainstate() -> bool:
+    """
+    Restore the active chain and UTXO set from the last chainstate flush
+    without revalidating anything. Returns False if there's nothing usable.
+
+    The chain is walked back from the best block through the headers the
+    chainstate keeps; block bodies are only read for blocks it has no header
+    for, or whose body the block store doesn't have.
+    """
+    best_block_hash = chainstate.best_block_hash
+    if not best_block_hash:
+        return False
+
+    headers = chainstate.load_headers()
+
+    chain = []
+    block_hash = best_block_hash
+    while block_hash:
+        if block_hash in headers and block_hash in block_store:
+            block = headers[block_hash][0]
+        else:
+            block = block_store.read_block(block_hash) or (
+                genesis_block if block_hash == genesis_block.id else None)
+
+        if not block:
+            logger.warning(
+                f'chainstate block {block_hash} missing from the block store')
+            return False
+
+        chain.append(_header(block))
+        block_hash = block.prev_block_hash
+
+    set_active_chain(chain[::-1])
+
+    utxo_set.clear()
+    utxo_set.update((u.outpoint, u) for u in chainstate.load_utxos())
+    rebuild_address_index()
+
+    txindex.clear()
+    if TXINDEX_ENABLED and chainstate.has_txindex:
+        txindex.update(chainstate.load_txindex())
+    elif TXINDEX_ENABLED:
+        logger.info('building txindex from the active chain')
+        for height, block in enumerate(active_chain):
+            index_block_txns(block, height)
+
+    logger.info(
+        f'loaded chainstate at height {len(active_chain) - 1} '
+        f'with {len(utxo_set)} utxos')
+    return True
 
 
 @with_lock(chain_lock)
 def load_from_disk():
-    if not os.path.isfile(CHAIN_PATH):
-        return
+    global block_store, chainstate
+    block_store = BlockStore(BLOCKS_PATH)
+    chainstate = Chainstate(CHAINSTATE_PATH)
+    block_cache.clear()
 
     try:
-        with open(CHAIN_PATH, 'rb') as f:
-            msg_len = int(binascii.hexlify(f.read(4) or b'\x00'), 16)
-            new_blocks = deserialize(f.read(msg_len))
-            logger.info(
-                r'loading chain from disk with {len(new_blocks)} block')
-            for block in new_blocks:
-                connect_block(block)
+        if not len(block_store) and os.path.isfile(CHAIN_PATH):
+            migrate_chain_file(CHAIN_PATH)
+
+        if not load_chainstate():
+            chainstate.reset()
+
+        # Whatever the chainstate doesn't already cover: blocks connected
+        # after the last flush, and side branches that weren't dropped.
+        dropped = chainstate.load_dropped()
+        to_replay = [
+            h for h in block_store.block_hashes() if h not in block_index and h not in dropped]
+        logger.info(
+            f'replaying {len(to_replay)} of {len(block_store)} blocks from disk')
+
+        for block_hash in to_replay:
+            connect_block(block_store.read_block(block_hash))
     except Exception as e:
         logger.exception('load chain failed, starting from genesis')
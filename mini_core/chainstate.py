@@ -0,0 +1,198 @@
+"""
+The chainstate is the UTXO set as of some block (the best block), kept in an
+sqlite database so a restarting node can pick up where it left off instead
+of replaying and revalidating the whole chain. It also keeps the undo data
+of connected blocks (the outputs each block spent), the txindex, and the
+headers of active blocks, so the active chain can be rebuilt without reading
+every block body back from the block store.
+
+Only outpoints that changed since the last flush are written, and each flush
+is a single transaction, so the database always describes the UTXO set at
+exactly one block.
+"""
+import logging
+import sqlite3
+import threading
+
+from typing import Dict, Iterable, List, Mapping, Set, Tuple
+from mini_core.block import Block
+from mini_core.transaction import UnspentTxOut
+from mini_core.txindex import TxLocation, dirty_txids, txindex
+from mini_core import codec
+from mini_core.utxo_set import dirty_outpoints, utxo_set
+
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS utxo (
+    txid TEXT NOT NULL,
+    txout_idx INTEGER NOT NULL,
+    value INTEGER NOT NULL,
+    pubkey TEXT NOT NULL,
+    is_coinbase INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    PRIMARY KEY (txid, txout_idx)
+);
+CREATE TABLE IF NOT EXISTS undo (
+    block_hash TEXT PRIMARY KEY,
+    spent BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS txindex (
+    txid TEXT PRIMARY KEY,
+    block_id TEXT NOT NULL,
+    height INTEGER NOT NULL,
+    txn_idx INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS header (
+    block_hash TEXT PRIMARY KEY,
+    prev_block_hash TEXT,
+    height INTEGER NOT NULL,
+    header BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS dropped (
+    block_hash TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class Chainstate:
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+
+    def _get_meta(self, key: str) -> str:
+        row = self._db.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    @property
+    def best_block_hash(self) -> str:
+        with self._lock:
+            return self._get_meta('best_block_hash')
+
+    @property
+    def has_txindex(self) -> bool:
+        """
+        Whether the txindex table was maintained up to the best block.
+        """
+        with self._lock:
+            return self._get_meta('txindex') == '1'
+
+    def load_utxos(self) -> Iterable[UnspentTxOut]:
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT value, pubkey, txid, txout_idx, is_coinbase, height FROM utxo').fetchall()
+
+        return (
+            UnspentTxOut(value, pubkey, txid, txout_idx, bool(is_coinbase), height)
+            for value, pubkey, txid, txout_idx, is_coinbase, height in rows
+        )
+
+    def load_txindex(self) -> Iterable[TxLocation]:
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT txid, block_id, height, txn_idx FROM txindex').fetchall()
+
+        return ((txid, TxLocation(*loc)) for txid, *loc in rows)
+
+    def load_headers(self) -> Dict[str, Tuple[Block, int]]:
+        """
+        Block hash -> (header, height) for every header flushed, as blocks with
+        no txns.
+        """
+        with self._lock:
+            rows = self._db.execute('SELECT block_hash, height, header FROM header').fetchall()
+
+        return {block_hash: (codec.loads(header), height) for block_hash, height, header in rows}
+
+    def load_dropped(self) -> Set[str]:
+        """
+        Hashes of side branch blocks dropped as stale.
+        """
+        with self._lock:
+            rows = self._db.execute('SELECT block_hash FROM dropped').fetchall()
+
+        return {block_hash for block_hash, in rows}
+
+    def load_undo(self, block_hash: str) -> List[UnspentTxOut]:
+        with self._lock:
+            row = self._db.execute(
+                'SELECT spent FROM undo WHERE block_hash = ?', (block_hash,)).fetchone()
+
+        return codec.loads(row[0]) if row else None
+
+    def flush(self, best_block_hash: str, block_undo: Mapping[str, List[UnspentTxOut]] = None,
+              with_txindex: bool = False, headers: Iterable[Tuple[Block, int]] = (),
+              dropped: Iterable[str] = ()):
+        """
+        Write every outpoint changed since the last flush, along with the block
+        the UTXO set is now current as of, any new undo data, the (header,
+        height) of blocks made active since, the hashes of blocks dropped since
+        and, if we keep one, txindex changes.
+        """
+        headers = list(headers)
+
+        with self._lock, self._db:
+            self._db.executemany(
+                'INSERT OR REPLACE INTO header VALUES (?, ?, ?, ?)',
+                [(h.id, h.prev_block_hash, height, codec.dumps(h._replace(txns=[])))
+                 for h, height in headers])
+
+            # a block dropped once may have come back and been made active
+            self._db.executemany(
+                'INSERT OR IGNORE INTO dropped VALUES (?)', [(h,) for h in dropped])
+            self._db.executemany(
+                'DELETE FROM dropped WHERE block_hash = ?', [(h.id,) for h, _ in headers])
+
+            self._db.executemany(
+                'INSERT OR REPLACE INTO undo VALUES (?, ?)',
+                [(h, codec.dumps(spent)) for h, spent in (block_undo or {}).items()])
+
+            changed = list(dirty_outpoints)
+
+            self._db.executemany(
+                'DELETE FROM utxo WHERE txid = ? AND txout_idx = ?',
+                [tuple(op) for op in changed if op not in utxo_set])
+            self._db.executemany(
+                'INSERT OR REPLACE INTO utxo VALUES (?, ?, ?, ?, ?, ?)',
+                [(u.txid, u.txout_idx, u.value, u.pubkey, u.is_coinbase, u.height)
+                 for u in (utxo_set.get(op) for op in changed) if u])
+            self._db.execute(
+                'INSERT OR REPLACE INTO meta VALUES (?, ?)',
+                ('best_block_hash', best_block_hash))
+
+            changed_txids = list(dirty_txids) if with_txindex else []
+            self._db.executemany(
+                'DELETE FROM txindex WHERE txid = ?',
+                [(txid,) for txid in changed_txids if txid not in txindex])
+            self._db.executemany(
+                'INSERT OR REPLACE INTO txindex VALUES (?, ?, ?, ?)',
+                [(txid, *txindex[txid]) for txid in changed_txids if txid in txindex])
+            self._db.execute(
+                'INSERT OR REPLACE INTO meta VALUES (?, ?)',
+                ('txindex', '1' if with_txindex else '0'))
+
+            dirty_outpoints.difference_update(changed)
+            dirty_txids.difference_update(changed_txids)
+
+        logger.info(f'flushed {len(changed)} utxo changes at {best_block_hash}')
+
+    def reset(self):
+        # dropped blocks stay dropped: that doesn't depend on the UTXO set
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM utxo')
+            self._db.execute('DELETE FROM undo')
+            self._db.execute('DELETE FROM txindex')
+            self._db.execute('DELETE FROM header')
+            self._db.execute('DELETE FROM meta')
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,206 @@
+"""
+Compact binary codec for NamedTuples, used on the wire and on disk in place
+of the JSON `serialize`/`deserialize` pair.
+
+An encoded payload is MAGIC, a version byte, then one tagged value. Values
+are a tag byte followed by:
+
+- ints: a zigzag varint
+- strs: a varint length and utf-8; lowercase hex strings (txids, block
+  hashes, ...) are packed as raw bytes under their own tag
+- bytes: a varint length and the bytes
+- lists/tuples: a varint count and the items
+- NamedTuples: the type's id from TYPES (or its name, for types not in
+  TYPES), a varint field count and the fields in declaration order
+
+JSON payloads never start with MAGIC, so `loads` can tell the two apart and
+anything we wrote or received before the codec existed still decodes.
+
+Txids, block ids, spend messages and the block size limit are still computed
+over `serialize`, they're part of consensus.
+"""
+import re
+
+from typing import Union
+from mini_core.utils import deserialize
+
+
+MAGIC = b'\xb1'
+VERSION = 1
+
+# NamedTuple types with a compact id; append only, ids go on the wire
+TYPES = [
+    'Block', 'Transaction', 'TxIn', 'TxOut', 'OutPoint', 'SignatureScript',
+    'UnspentTxOut', 'GetBlocksMsg', 'InvMsg', 'GetUTXOsMsg', 'GetMempoolMsg',
+    'GetActiveChainMsg', 'AddPeerMsg', 'GetTxStatusMsg', 'TxStatus',
+    'TxLocation', 'GetAddressUTXOsMsg', 'GetBalanceMsg', 'UTXOPage',
+    'VersionMsg',
+]
+TYPE_IDS = {name: i for i, name in enumerate(TYPES)}
+
+T_NONE, T_FALSE, T_TRUE, T_INT, T_STR, T_HEX, T_BYTES, T_LIST, T_TYPE, T_NAMED = range(10)
+
+_HEX = re.compile('(?:[0-9a-f]{2})+')
+
+
+class CodecError(ValueError):
+    pass
+
+
+def _varint(n: int, out: bytearray):
+    while n >= 0x80:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _encode(o, out: bytearray):
+    if o is None:
+        out.append(T_NONE)
+    elif o is True or o is False:
+        out.append(T_TRUE if o else T_FALSE)
+    elif isinstance(o, int):
+        out.append(T_INT)
+        _varint((o << 1) if o >= 0 else ((-o << 1) - 1), out)
+    elif isinstance(o, str):
+        if _HEX.fullmatch(o):
+            raw = bytes.fromhex(o)
+            out.append(T_HEX)
+        else:
+            raw = o.encode()
+            out.append(T_STR)
+        _varint(len(raw), out)
+        out += raw
+    elif isinstance(o, bytes):
+        out.append(T_BYTES)
+        _varint(len(o), out)
+        out += o
+    elif hasattr(o, '_fields'):
+        name = type(o).__name__
+        type_id = TYPE_IDS.get(name)
+        if type_id is None:
+            raw = name.encode()
+            out.append(T_NAMED)
+            _varint(len(raw), out)
+            out += raw
+        else:
+            out.append(T_TYPE)
+            _varint(type_id, out)
+        _varint(len(o), out)
+        for field in o:
+            _encode(field, out)
+    elif isinstance(o, (list, tuple)):
+        out.append(T_LIST)
+        _varint(len(o), out)
+        for item in o:
+            _encode(item, out)
+    else:
+        raise CodecError(f"Can't encode {o}")
+
+
+def dumps(obj) -> bytes:
+    out = bytearray(MAGIC)
+    out.append(VERSION)
+    _encode(obj, out)
+    return bytes(out)
+
+
+_types = {}
+
+
+def _lookup_type(name: str):
+    if name not in _types:
+        import mini_core
+        _type = vars(mini_core).get(name)
+        if not hasattr(_type, '_fields'):
+            raise CodecError(f'unknown type {name}')
+        _types[name] = _type
+    return _types[name]
+
+
+class _Decoder:
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.pos = 0
+
+    def varint(self) -> int:
+        data, pos = self.data, self.pos
+        n = shift = 0
+        while True:
+            b = data[pos]
+            pos += 1
+            n |= (b & 0x7f) << shift
+            if b < 0x80:
+                break
+            shift += 7
+        self.pos = pos
+        return n
+
+    def raw(self) -> bytes:
+        n = self.varint()
+        start = self.pos
+        self.pos += n
+        if self.pos > len(self.data):
+            raise CodecError('truncated payload')
+        return self.data[start:self.pos]
+
+    def value(self):
+        tag = self.data[self.pos]
+        self.pos += 1
+
+        if tag == T_NONE:
+            return None
+        elif tag == T_FALSE:
+            return False
+        elif tag == T_TRUE:
+            return True
+        elif tag == T_INT:
+            n = self.varint()
+            return (n >> 1) if not n & 1 else -((n + 1) >> 1)
+        elif tag == T_STR:
+            return self.raw().decode()
+        elif tag == T_HEX:
+            return self.raw().hex()
+        elif tag == T_BYTES:
+            return self.raw()
+        elif tag == T_LIST:
+            return [self.value() for _ in range(self.varint())]
+        elif tag in (T_TYPE, T_NAMED):
+            if tag == T_TYPE:
+                type_id = self.varint()
+                if type_id >= len(TYPES):
+                    raise CodecError(f'unknown type id {type_id}')
+                _type = _lookup_type(TYPES[type_id])
+            else:
+                _type = _lookup_type(self.raw().decode())
+            fields = [self.value() for _ in range(self.varint())]
+
+            # fields a newer peer appended that we don't know about are dropped,
+            # ones it doesn't send yet take their defaults
+            return _type(*fields[:len(_type._fields)])
+
+        raise CodecError(f'unknown tag {tag}')
+
+
+def is_binary(data: bytes) -> bool:
+    return data[:1] == MAGIC
+
+
+def loads(data: Union[bytes, str]) -> object:
+    """
+    Decode a binary payload, or a JSON one from `serialize`.
+    """
+    if isinstance(data, str):
+        return deserialize(data)
+
+    if not is_binary(data):
+        return deserialize(data.decode())
+
+    if len(data) < 2 or data[1] > VERSION:
+        raise CodecError(f'unsupported codec version {data[1:2]}')
+
+    try:
+        return _Decoder(data[2:]).value()
+    except IndexError:
+        raise CodecError('truncated payload')
@@ -1,26 +1,436 @@
 """
 Mempool is the set of yet-unimed transactions.
 """
+import bisect
+import heapq
 import logging
+import os
+import threading
+import time
 
-from typing import Dict, Iterable
+from collections.abc import MutableMapping
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Set, Tuple
+from mini_core import codec
 from mini_core.exceptions import TxnValidationError
-from mini_core.transaction import Transaction, UnspentTxOut
+from mini_core.transaction import OutPoint, Transaction, UnspentTxOut
 from mini_core.block import Block
 from mini_core.params import Params
 from mini_core.exceptions import BlockValidationError
-from mini_core.utils import serialize
+from mini_core.orphans import orphan_pool
+from mini_core.utils import serialize, _chunks
 from mini_core.utxo_set import utxo_set
 
 
 logger = logging.getLogger(__name__)
 
-mempool: Dict[str, Transaction] = {}
+# Upper bound on the summed serialized size of the txns in the mempool; past
+# it the packages with the lowest fee rate are evicted
+MEMPOOL_MAX_BYTES = int(os.environ.get('TC_MEMPOOL_MAX_BYTES', 300 * 1000 * 1000))
 
-# Set of orphaned (e.g. hash inputs referencing yet non-existent UTXOs)
-# https://bitcoin.org/en/glossary/unspent-transaction-output
-orphaned_txns: Iterable[Transaction] = []
+# Txns that haven't been mined this many seconds after we first saw them
+# are dropped
+MEMPOOL_EXPIRY_SECS = int(os.environ.get('TC_MEMPOOL_EXPIRY_SECS', 14 * 24 * 60 * 60))
 
+# Where the mempool is saved on shutdown and every MEMPOOL_SAVE_INTERVAL_SECS
+MEMPOOL_PATH = os.environ.get('TC_MEMPOOL_PATH', 'mempool.dat')
+MEMPOOL_SAVE_INTERVAL_SECS = int(os.environ.get('TC_MEMPOOL_SAVE_INTERVAL_SECS', 10 * 60))
+
+# Txns revalidated per hold of the chain lock when loading the mempool
+MEMPOOL_LOAD_BATCH_SIZE = 500
+
+
+class MempoolEntry(NamedTuple):
+    txn: Transaction
+
+    # inputs minus outputs, 0 if an input couldn't be found when it was added
+    fee: int
+
+    size: int
+
+    # when we first saw the txn
+    time: float
+
+    @property
+    def feerate(self) -> float:
+        return self.fee / self.size
+
+
+class Mempool(MutableMapping):
+    """
+    The unconfirmed txns keyed by txid, along with the fee each pays and how
+    they depend on one another.
+
+    A txn's ancestors are the mempool txns it spends from, directly or not;
+    its descendants are the ones spending from it. Blocks are filled by the
+    fee rate of a txn together with its ancestors, so a child can pay for its
+    parent, and the mempool is kept under MEMPOOL_MAX_BYTES by evicting txns
+    together with their descendants, lowest fee rate first.
+
+    Each txn's ancestor and descendant package totals are kept up to date as
+    txns come and go, in two sorted indexes: by ancestor fee rate for
+    filling blocks and by descendant fee rate for eviction.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, MempoolEntry] = {}
+
+        # key -> txids of the outputs the txn spends
+        self._inputs: Dict[str, FrozenSet[str]] = {}
+
+        # txid -> keys of the mempool txns spending its outputs
+        self._spenders: Dict[str, Set[str]] = {}
+
+        # outpoint -> key of the mempool txn spending it
+        self._spent: Dict[OutPoint, str] = {}
+
+        # key -> [ancestor fee, ancestor size, ancestor count, descendant fee,
+        # descendant size], each package counting the txn itself
+        self._packages: Dict[str, List[int]] = {}
+
+        # (-ancestor fee rate, seq, key), best first: the order blocks are
+        # filled in
+        self._by_ancestor_score: List[Tuple[float, int, str]] = []
+
+        # (descendant fee rate, -seq, key), worst and then newest first: the
+        # order txns are evicted in
+        self._by_descendant_score: List[Tuple[float, int, str]] = []
+
+        # key -> its keys in the two indexes above
+        self._score_keys: Dict[str, Tuple[tuple, tuple]] = {}
+
+        # key -> when it was added, relative to the other txns
+        self._seqs: Dict[str, int] = {}
+        self._next_seq = 0
+
+        self.total_size = 0
+
+    def __getitem__(self, txid: str) -> Transaction:
+        return self._entries[txid].txn
+
+    def __setitem__(self, txid: str, txn: Transaction):
+        self.add(txn, txid=txid)
+
+    def __delitem__(self, txid: str):
+        ancestors = self.ancestors(txid)
+        descendants = self.descendants(txid)
+
+        entry = self._entries.pop(txid)
+        self.total_size -= entry.size
+
+        for txin in entry.txn.txins:
+            if self._spent.get(txin.outpoint) == txid:
+                del self._spent[txin.outpoint]
+
+        for parent in self._inputs.pop(txid):
+            spenders = self._spenders[parent]
+            spenders.discard(txid)
+            if not spenders:
+                del self._spenders[parent]
+
+        self._unindex(txid)
+        del self._packages[txid]
+        del self._seqs[txid]
+
+        self._update_packages(entry, -1, ancestors, descendants)
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, txid) -> bool:
+        return txid in self._entries
+
+    def clear(self):
+        self._entries.clear()
+        self._inputs.clear()
+        self._spenders.clear()
+        self._spent.clear()
+        self._packages.clear()
+        self._by_ancestor_score.clear()
+        self._by_descendant_score.clear()
+        self._score_keys.clear()
+        self._seqs.clear()
+        self.total_size = 0
+
+    def add(self, txn: Transaction, fee: int = None, added_at: float = None, txid: str = None):
+        """
+        Add or replace a txn. The fee is worked out from the UTXO set and the
+        mempool unless given.
+        """
+        txid = txid or txn.id
+        if txid in self._entries:
+            del self[txid]
+
+        entry = MempoolEntry(
+            txn=txn,
+            fee=self._fee(txn) if fee is None else fee,
+            size=txn.serialized_size,
+            time=time.time() if added_at is None else added_at)
+
+        self._entries[txid] = entry
+        self._inputs[txid] = frozenset(txin.outpoint.txid for txin in txn.txins if txin.outpoint)
+        self.total_size += entry.size
+
+        for parent in self._inputs[txid]:
+            self._spenders.setdefault(parent, set()).add(txid)
+
+        for txin in txn.txins:
+            if txin.outpoint:
+                self._spent[txin.outpoint] = txid
+
+        ancestors = self.ancestors(txid)
+        descendants = self.descendants(txid)
+        entries = self._entries
+
+        self._seqs[txid] = self._next_seq
+        self._next_seq += 1
+        self._packages[txid] = [
+            entry.fee + sum(entries[a].fee for a in ancestors),
+            entry.size + sum(entries[a].size for a in ancestors),
+            1 + len(ancestors),
+            entry.fee + sum(entries[d].fee for d in descendants),
+            entry.size + sum(entries[d].size for d in descendants),
+        ]
+        self._index(txid)
+
+        self._update_packages(entry, 1, ancestors, descendants, txid)
+
+    def _update_packages(self, entry: MempoolEntry, sign: int, ancestors: Set[str],
+                         descendants: Set[str], txid: str = None):
+        """
+        Add (sign 1) or take away (-1) a txn from the packages of its
+        ancestors and descendants.
+
+        Normally the txn's ancestors gain or lose exactly it and its
+        descendants, and its descendants exactly it and its ancestors. That
+        only fails to hold when an ancestor also reaches a descendant some
+        other way; those packages are recounted from scratch. A txn added
+        with no descendants in the pool, or removed leaves first, never
+        needs to look.
+        """
+        entries = self._entries
+
+        if not descendants:
+            for a in ancestors:
+                self._adjust(a, desc_fee=sign * entry.fee, desc_size=sign * entry.size)
+            return
+
+        # descendants the ancestors reach without going through the txn
+        exclude = {txid} if txid else frozenset()
+        reached = set().union(*(self.descendants(a, exclude) for a in ancestors))
+
+        anc = [entry.fee + sum(entries[a].fee for a in ancestors),
+               entry.size + sum(entries[a].size for a in ancestors),
+               1 + len(ancestors)]
+        for d in descendants:
+            if d in reached:
+                self._recount(d)
+            else:
+                self._adjust(d, anc_fee=sign * anc[0], anc_size=sign * anc[1], anc_count=sign * anc[2])
+
+        desc = [entry.fee + sum(entries[d].fee for d in descendants),
+                entry.size + sum(entries[d].size for d in descendants)]
+        for a in ancestors:
+            if reached & descendants:
+                self._recount(a)
+            else:
+                self._adjust(a, desc_fee=sign * desc[0], desc_size=sign * desc[1])
+
+    def _index(self, txid: str):
+        anc_fee, anc_size, _, desc_fee, desc_size = self._packages[txid]
+        seq = self._seqs[txid]
+        keys = ((-anc_fee / anc_size, seq, txid), (desc_fee / desc_size, -seq, txid))
+
+        bisect.insort(self._by_ancestor_score, keys[0])
+        bisect.insort(self._by_descendant_score, keys[1])
+        self._score_keys[txid] = keys
+
+    def _unindex(self, txid: str):
+        keys = self._score_keys.pop(txid)
+        for index, key in zip((self._by_ancestor_score, self._by_descendant_score), keys):
+            del index[bisect.bisect_left(index, key)]
+
+    def _adjust(self, txid: str, anc_fee=0, anc_size=0, anc_count=0, desc_fee=0, desc_size=0):
+        self._unindex(txid)
+        package = self._packages[txid]
+        package[0] += anc_fee
+        package[1] += anc_size
+        package[2] += anc_count
+        package[3] += desc_fee
+        package[4] += desc_size
+        self._index(txid)
+
+    def _recount(self, txid: str):
+        entries = self._entries
+        ancestors = [txid, *self.ancestors(txid)]
+        descendants = [txid, *self.descendants(txid)]
+
+        self._unindex(txid)
+        self._packages[txid] = [
+            sum(entries[a].fee for a in ancestors),
+            sum(entries[a].size for a in ancestors),
+            len(ancestors),
+            sum(entries[d].fee for d in descendants),
+            sum(entries[d].size for d in descendants),
+        ]
+        self._index(txid)
+
+    def ancestor_scores(self) -> List[Tuple[float, int, str]]:
+        """
+        (-ancestor fee rate, seq, txid) for every txn, best first. Being
+        sorted, it's also a heap.
+        """
+        return list(self._by_ancestor_score)
+
+    def entry(self, txid: str) -> MempoolEntry:
+        return self._entries[txid]
+
+    def entries(self) -> Iterable[MempoolEntry]:
+        return self._entries.values()
+
+    def _fee(self, txn: Transaction) -> int:
+        spent = 0
+        for txin in txn.txins:
+            utxo = txin.outpoint and (utxo_set.get(txin.outpoint) or find_utxo_in_mempool(txin))
+            if not utxo:
+                return 0
+            spent += utxo.value
+
+        return max(spent - sum(o.value for o in txn.txouts), 0)
+
+    def spender(self, outpoint: OutPoint) -> str:
+        """
+        The mempool txn spending `outpoint`, if any.
+        """
+        return self._spent.get(outpoint)
+
+    def conflicts(self, txn: Transaction) -> Set[str]:
+        """
+        Mempool txns, other than `txn` itself, spending any of the same outputs.
+        """
+        spenders = {self._spent.get(txin.outpoint) for txin in txn.txins if txin.outpoint}
+        spenders.discard(None)
+        spenders.discard(txn.id)
+        return spenders
+
+    def remove_conflicts(self, txn: Transaction) -> List[str]:
+        """
+        Evict the txns double spending `txn`'s inputs, and their descendants.
+        """
+        removed = []
+        for txid in self.conflicts(txn):
+            if txid in self._entries:
+                removed.extend(self.remove_with_descendants(txid))
+
+        return removed
+
+    def ancestors(self, txid: str, exclude: Set[str] = frozenset()) -> Set[str]:
+        """
+        The mempool txns `txid` spends from, directly or not, leaving out
+        `exclude` (and whatever is only reachable through it).
+        """
+        entries = self._entries
+        found = set()
+        stack = [txid]
+
+        while stack:
+            for parent in self._inputs[stack.pop()]:
+                if parent in entries and parent not in found and parent not in exclude:
+                    found.add(parent)
+                    stack.append(parent)
+
+        return found
+
+    def descendants(self, txid: str, exclude: Set[str] = frozenset()) -> Set[str]:
+        """
+        The mempool txns spending from `txid`, directly or not, leaving out
+        `exclude` (and whatever is only reachable through it).
+        """
+        found = set()
+        stack = [txid]
+
+        while stack:
+            for child in self._spenders.get(stack.pop(), ()):
+                if child not in found and child not in exclude:
+                    found.add(child)
+                    stack.append(child)
+
+        return found
+
+    def package_feerate(self, txids: Iterable[str]) -> float:
+        entries = [self._entries[txid] for txid in txids]
+        return sum(e.fee for e in entries) / sum(e.size for e in entries)
+
+    def ancestor_feerate(self, txid: str, exclude: Set[str] = frozenset()) -> float:
+        """
+        Fee rate of `txid` together with the ancestors it would need to bring
+        into a block that already has `exclude`.
+        """
+        if exclude:
+            return self.package_feerate([txid, *self.ancestors(txid, exclude)])
+
+        package = self._packages[txid]
+        return package[0] / package[1]
+
+    def descendant_feerate(self, txid: str) -> float:
+        package = self._packages[txid]
+        return package[3] / package[4]
+
+    def remove_with_descendants(self, txid: str) -> List[str]:
+        removed = [txid, *self.descendants(txid)]
+
+        # leaves first, so none has descendants left when it goes; a txn has
+        # more ancestors than any of its own
+        for key in sorted(removed, key=lambda t: -self._packages[t][2]):
+            del self[key]
+
+        return removed
+
+    def expire(self, now: float = None) -> List[str]:
+        """
+        Drop txns that have been in the mempool longer than
+        MEMPOOL_EXPIRY_SECS, along with their descendants.
+        """
+        cutoff = (time.time() if now is None else now) - MEMPOOL_EXPIRY_SECS
+
+        # entries are kept in the order they arrived, oldest first
+        expired = []
+        for txid, entry in self._entries.items():
+            if entry.time >= cutoff:
+                break
+            expired.append(txid)
+
+        removed = []
+        for txid in expired:
+            if txid in self._entries:
+                removed.extend(self.remove_with_descendants(txid))
+
+        if removed:
+            logger.info(f'expired {len(removed)} txns from the mempool')
+
+        return removed
+
+    def trim(self, max_bytes: int = None) -> List[str]:
+        """
+        Evict txns, each with its descendants, until the mempool fits in
+        `max_bytes` (MEMPOOL_MAX_BYTES by default). The package with the lowest
+        fee rate goes first and, among equals, the newest.
+        """
+        max_bytes = MEMPOOL_MAX_BYTES if max_bytes is None else max_bytes
+        if self.total_size <= max_bytes:
+            return []
+
+        evicted = []
+        while self.total_size > max_bytes:
+            evicted.extend(self.remove_with_descendants(self._by_descendant_score[0][2]))
+
+        logger.info(f'evicted {len(evicted)} txns to keep the mempool under {max_bytes} bytes')
+        return evicted
+
+
+mempool = Mempool()
 
 def find_utxo_in_mempool(txin) -> UnspentTxOut:
     txid, idx = txin.outpoint
@@ -34,24 +444,37 @@ def find_utxo_in_mempool(txin) -> UnspentTxOut:
     return UnspentTxOut(*txout, txid=txid, is_coinbase=False, height=-1, txout_idx=idx)
 
 
-def select_from_mempool(block: Block) -> Block:
+def _with_unconfirmed_parents(txid, in_block) -> List[str]:
     """
-    Fill a Block with transactions from the mempool.
+    The mempool txn `txid` preceded by any mempool ancestors it needs that
+    aren't in `in_block` yet, parents before children. Returns None if an input
+    can't be found in the UTXO set or the mempool.
+
+    Walks the mempool with an explicit stack so long chains of unconfirmed
+    txns can't hit the recursion limit.
     """
-    added_to_block = set()
+    package = []
+    added = set()
+    stack = [(txid, False)]
+
+    while stack:
+        txid, parents_done = stack.pop()
 
-    def check_block_size(b) -> bool:
-        return len(serialize(block)) < Params.MAX_BLOCK_SERIALIZED_SIZE
+        # already reached through another path; a txn only goes in once all
+        # of its parents have, so it's marked when it's added, not when found
+        if txid in added:
+            continue
 
-    def try_add_to_block(block, txid) -> Block:
-        if txid in added_to_block:
-            return block
+        if parents_done:
+            package.append(txid)
+            added.add(txid)
+            continue
 
-        tx = mempool[txid]
+        stack.append((txid, True))
 
         # For any txin that can't be found in the main chain, find its
-        # transaction in the mempool (if it exists) and add it to the block.
-        for txin in tx.txins:
+        # transaction in the mempool (if it exists) and add it first.
+        for txin in mempool[txid].txins:
             if txin.outpoint in utxo_set:
                 continue
 
@@ -61,34 +484,98 @@ def select_from_mempool(block: Block) -> Block:
                 logger.debug(f"Couldn't find UTXO for {txin}")
                 return None
 
-            block = try_add_to_block(block, in_mempool.txid)
-            if not block:
-                logger.debug(f"Couldn't add parent")
-                return None
+            if in_mempool.txid not in in_block and in_mempool.txid not in added:
+                stack.append((in_mempool.txid, False))
 
-        newblock = block._replace(txns=[*block.txns, tx])
+    return package
 
-        if check_block_size(newblock):
-            logger.debug(f'added tx {tx.id} to block')
-            added_to_block.add(txid)
-            return newblock
-        else:
-            return block
 
-    for txid in mempool:
-        newblock = try_add_to_block(block, txid)
-        if check_block_size(newblock):
-            block = newblock
-        else:
-            break
+def select_from_mempool(block: Block, reserve: int = 0) -> Block:
+    """
+    Fill a Block with transactions from the mempool, best fee rate first,
+    leaving `reserve` bytes free for whatever goes in after (the coinbase).
 
-    return block
+    Txns are ranked by the fee rate of the package they'd bring in: the txn
+    plus any unconfirmed ancestors not in the block yet. A package goes in
+    whole or not at all, parents before children. Ranks are kept in a heap;
+    once a package is in, its descendants are re-ranked without it.
+
+    The serialized size is kept as a running total: a txn takes up its own
+    serialized size in the block, plus a comma after the first. Call with the
+    chain lock held, shared at least, so the mempool and UTXO set hold still.
+    """
+    txns = list(block.txns)
+    in_block = {tx.id for tx in txns}
+    size = len(serialize(block)) + reserve
+
+    if not mempool:
+        return block
+
+    smallest = min(e.size for e in mempool.entries())
+
+    heap = mempool.ancestor_scores()
+    seq = len(heap)
+
+    while heap and size + smallest < Params.MAX_BLOCK_SERIALIZED_SIZE:
+        neg_feerate, _, txid = heapq.heappop(heap)
+        if txid in in_block:
+            continue
+
+        # a package is at least as big as the txn itself
+        if size + mempool.entry(txid).size >= Params.MAX_BLOCK_SERIALIZED_SIZE:
+            continue
+
+        package = _with_unconfirmed_parents(txid, in_block)
+        if not package:
+            logger.debug(f"Couldn't add {txid} or its parents")
+            continue
+
+        # ranked before some of its ancestors made it in on their own
+        feerate = mempool.package_feerate(package)
+        if feerate < -neg_feerate:
+            heapq.heappush(heap, (-feerate, seq, txid))
+            seq += 1
+            continue
+
+        package_size = sum(mempool.entry(t).size for t in package) + len(package)
+        if not txns:
+            package_size -= 1
+
+        if size + package_size >= Params.MAX_BLOCK_SERIALIZED_SIZE:
+            continue
+
+        for added in package:
+            logger.debug(f'added tx {added} to block')
+            txns.append(mempool[added])
+            in_block.add(added)
+
+        size += package_size
+
+        rerank = set().union(*(mempool.descendants(added) for added in package)) - in_block
+        for child in rerank:
+            heapq.heappush(heap, (-mempool.ancestor_feerate(child, in_block), seq, child))
+            seq += 1
+
+    return block._replace(txns=txns)
+
+
+def _accept_txn(txn: Transaction, added_at: float = None, orphaned_at: float = None) -> bool:
+    """
+    Validate `txn` and add it to the mempool, orphaning it if an input is
+    missing (as of `orphaned_at`, if it's been orphaned before). Returns
+    whether it made it in. Call with the chain lock held upgradable: it's only
+    taken exclusively to add the txn.
+    """
+    from mini_core.chain import chain_lock
 
-def add_txn_to_mempool(txn: Transaction):
-    global mempool
     if txn.id in mempool:
         logger.info(f'txn {txn.id} already seen')
-        return
+        return False
+
+    conflicts = mempool.conflicts(txn)
+    if conflicts:
+        logger.info(f'txn {txn.id} rejected, it double spends mempool txns {conflicts}')
+        return False
 
     try:
         from mini_core.validation import validate_txn
@@ -96,13 +583,174 @@ def add_txn_to_mempool(txn: Transaction):
     except TxnValidationError as e:
         if e.to_orphan:
             logger.info(f"txn {e.to_orphan.id} submitted as orphan")
-            orphaned_txns.append(e.to_orphan)
+            with chain_lock:
+                orphan_pool.add(e.to_orphan, added_at=orphaned_at)
         else:
             logger.exception(f'txn rejected')
-    else:
-        logger.info(f"txn {txn.id} added to mempool")
-        mempool[txn.id] = txn
+        return False
+
+    with chain_lock:
+        mempool.add(txn, added_at=added_at)
+    return True
+
+
+def _accept_orphans(parents: Iterable[Transaction]) -> List[Transaction]:
+    """
+    Retry the orphans spending outputs of `parents`, then the orphans of
+    whichever of those make it in, and so on. Returns the txns accepted.
+    Call with the chain lock held upgradable.
+    """
+    from mini_core.chain import chain_lock
+
+    accepted = []
+    work = list(parents)
+
+    while work:
+        for orphan in orphan_pool.spending(work.pop()):
+            orphaned_at = orphan_pool.entry(orphan.id).time
+            with chain_lock:
+                orphan_pool.remove(orphan.id)
+
+            # goes straight back into the orphan pool if it's still missing
+            # another parent, expiring when it would have anyway
+            if _accept_txn(orphan, orphaned_at=orphaned_at):
+                logger.info(f'orphan txn {orphan.id} added to mempool')
+                accepted.append(orphan)
+                work.append(orphan)
+
+    return accepted
 
-        import mini_core.networking as n
+
+def _relay(txns: Iterable[Transaction]):
+    import mini_core.networking as n
+    for txn in txns:
         for peer in n.peer_hostnames:
             n.send_to_peer(txn, peer)
+
+
+def add_txn_to_mempool(txn: Transaction):
+    from mini_core.chain import chain_lock
+
+    # Validating only needs the chain and mempool not to change under us;
+    # readers can carry on until something is actually added.
+    with chain_lock.upgradable:
+        with chain_lock:
+            mempool.expire()
+
+        if not _accept_txn(txn):
+            return
+
+        accepted = [txn, *_accept_orphans([txn])]
+        with chain_lock:
+            evicted = mempool.trim()
+
+        if txn.id in evicted:
+            logger.info(f"txn {txn.id} not added, its fee rate is too low for a full mempool")
+            return
+
+    logger.info(f"txn {txn.id} added to mempool")
+    _relay(t for t in accepted if t.id not in evicted)
+
+
+def reprocess_orphans(block: Block):
+    """
+    Retry the orphans spending outputs of a newly connected block's txns.
+    Call with the chain lock held upgradable.
+    """
+    from mini_core.chain import chain_lock
+
+    if not len(orphan_pool):
+        return
+
+    accepted = _accept_orphans(block.txns)
+    if accepted:
+        with chain_lock:
+            evicted = mempool.trim()
+        _relay(t for t in accepted if t.id not in evicted)
+
+
+def save_mempool(path: str = None) -> int:
+    """
+    Write the mempool, with when we first saw each txn, and the orphaned txns
+    to `path` (MEMPOOL_PATH by default). Returns the number of mempool txns
+    written.
+    """
+    from mini_core.chain import chain_lock
+
+    path = path or MEMPOOL_PATH
+    with chain_lock.shared:
+        records = [[e.txn, int(e.time)] for e in mempool.entries()]
+        orphans = list(orphan_pool)
+
+    # write to the side and rename, so a crash mid-write can't leave a
+    # truncated mempool.dat behind
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(codec.dumps([records, orphans]))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+    logger.info(f'saved {len(records)} mempool txns to {path}')
+    return len(records)
+
+
+def load_mempool(path: str = None) -> int:
+    """
+    Reload what `save_mempool` wrote, revalidating each txn against the
+    current UTXO set. Returns the number of txns that made it back in.
+
+    Txns are validated in batches of MEMPOOL_LOAD_BATCH_SIZE, each under one
+    hold of the chain lock, in the order they originally arrived so parents
+    are back before their children. Each batch's signatures are verified in
+    parallel beforehand. They aren't relayed; peers already have
+    them.
+    """
+    from mini_core.chain import chain_lock
+
+    path = path or MEMPOOL_PATH
+    if not os.path.isfile(path):
+        return 0
+
+    try:
+        with open(path, 'rb') as f:
+            records, orphans = codec.loads(f.read())
+    except Exception:
+        logger.exception(f"couldn't read {path}, starting with an empty mempool")
+        return 0
+
+    from mini_core.validation import signature_checks, verify_signatures
+
+    cutoff = time.time() - MEMPOOL_EXPIRY_SECS
+    loaded = 0
+
+    for batch in _chunks(records, MEMPOOL_LOAD_BATCH_SIZE):
+        # Signatures don't depend on the UTXO set: verify the batch's in
+        # parallel, outside the lock, and let validation find them cached.
+        verify_signatures(c for txn, _ in batch for c in signature_checks(txn))
+
+        with chain_lock.upgradable:
+            for txn, added_at in batch:
+                if added_at >= cutoff and _accept_txn(txn, added_at=added_at):
+                    loaded += 1
+
+    with chain_lock.upgradable:
+        # their parents may well be back by now
+        for orphan in orphans:
+            if _accept_txn(orphan):
+                _accept_orphans([orphan])
+
+        with chain_lock:
+            mempool.trim()
+
+    logger.info(f'loaded {loaded} of {len(records)} txns from {path}')
+    return loaded
+
+
+def save_mempool_periodically(stop: threading.Event = None):
+    stop = stop or threading.Event()
+    while not stop.wait(MEMPOOL_SAVE_INTERVAL_SECS):
+        try:
+            save_mempool()
+        except Exception:
+            logger.exception('saving the mempool failed')
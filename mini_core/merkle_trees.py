@@ -17,10 +17,11 @@ def get_merkle_root(*leaves: Tuple[str]) -> MerkleNode:
     """
     Builds a Merkle Tree and returns the root given some leaf values.
     """
-    if len(leaves) % 2 == 1:
-        leaves = leaves + (leaves[-1],)
-
     def find_root(nodes):
+        # pair up the last node with itself on every odd-sized level
+        if len(nodes) % 2 == 1:
+            nodes = nodes + [nodes[-1]]
+
         newlevel = [
             MerkleNode(value=sha256d(i1.value + i2.value), children=[i1, i2])
             for [i1, i2] in _chunks(nodes, 2)
@@ -9,16 +9,19 @@ import threading
 import time
 
 import mini_core.block as block
+import mini_core.codec as codec
 
 from mini_core.chain import get_active_chain, chain_lock, connect_block, locate_block
 
-from typing import Iterable, NamedTuple, Callable
+from typing import Dict, Iterable, NamedTuple, Callable, Union
 
-from mini_core.transaction import Transaction
+from mini_core.transaction import Transaction, UnspentTxOut
 
-from mini_core.utxo_set import utxo_set
+from mini_core.txindex import TxStatus, find_txn_location
 
-from mini_core.utils import deserialize, serialize
+from mini_core.utxo_set import balance_for_address, utxo_set, utxos_for_address
+
+from mini_core.utils import serialize
 
 logger = logging.getLogger(__name__)
 
@@ -28,6 +31,12 @@ ibd_done = threading.Event()
 
 PORT = os.environ.get('TC_PORT', 8888)
 
+# Highest protocol version we speak: 0 is JSON only, 1 adds the binary codec
+PROTOCOL_VERSION = codec.VERSION
+
+# peer hostname -> protocol version agreed with that peer
+peer_protocols: Dict[str, int] = {}
+
 
 def get_ibd_done():
     return ibd_done
@@ -41,15 +50,36 @@ def int_to_8bytes(a: int) -> bytes:
     return binascii.unhexlify(f'{a:0{8}x}')
 
 
-def encode_socket_data(data: object) -> bytes:
+def encode_socket_data(data: object, binary: bool = False) -> bytes:
     """
-    Our protocol is: first 4 bytes signify msg length
+    Our protocol is: first 4 bytes signify msg length, then the message in
+    JSON or, for peers that negotiated it, the binary codec
     """
 
-    to_send = serialize(data).encode()
+    to_send = codec.dumps(data) if binary else serialize(data).encode()
     return int_to_8bytes(len(to_send)) + to_send
 
 
+def reply(sock, data: object):
+    """
+    Answer a request in the codec it was made in.
+    """
+    sock.sendall(encode_socket_data(data, binary=getattr(sock, 'binary', False)))
+
+
+class PeerConnection:
+    """
+    The socket of an incoming request, plus which codec the peer spoke.
+    """
+
+    def __init__(self, sock, binary: bool):
+        self.sock = sock
+        self.binary = binary
+
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
+
+
 class GetBlocksMsg(NamedTuple):
     """
     See https://bitcoin.org/en/developer-guide#blocks-first
@@ -67,7 +97,7 @@ class GetBlocksMsg(NamedTuple):
 
         height = height or 1
 
-        with chain_lock:
+        with chain_lock.shared:
             blocks = get_active_chain()[height:(height + self.CHUNK_SIZE)]
 
         logger.debug(f'[p2p] sending {len(blocks)} to {peer_hostname}')
@@ -90,18 +120,63 @@ class InvMsg(NamedTuple):
         for block in new_blocks:
             connect_block(block)
 
-        new_tip_id = get_active_chain()[-1].id
+        new_tip_id = get_active_chain().headers()[-1].id
         logger.info(f'[p2p] continuing initial block download at {new_tip_id}')
 
-        with chain_lock:
-            # Recursive call to continue the initial block sync
-            send_to_peer(GetBlocksMsg(new_tip_id))
+        # Recursive call to continue the initial block sync
+        send_to_peer(GetBlocksMsg(new_tip_id))
 
 
 class GetUTXOsMsg(NamedTuple):
 
     def handle(self, sock, peer_hostname):
-        sock.sendall(encode_socket_data(list(utxo_set.items())))
+        with chain_lock.shared:
+            utxos = list(utxo_set.items())
+
+        reply(sock, utxos)
+
+
+class UTXOPage(NamedTuple):
+    utxos: Iterable[UnspentTxOut]
+
+    # offset of the next page, None if this is the last one
+    next_offset: Union[int, None]
+
+
+class GetAddressUTXOsMsg(NamedTuple):
+    """
+    One page of the UTXOs paying to an address
+    """
+
+    address: str
+    offset: int = 0
+    limit: int = 500
+
+    MAX_LIMIT = 1000
+
+    def handle(self, sock, peer_hostname):
+        limit = max(1, min(self.limit, self.MAX_LIMIT))
+
+        with chain_lock.shared:
+            utxos = utxos_for_address(self.address)
+
+        page = utxos[self.offset:self.offset + limit]
+        next_offset = self.offset + limit if self.offset + limit < len(utxos) else None
+        reply(sock, UTXOPage(page, next_offset))
+
+
+class GetBalanceMsg(NamedTuple):
+    """
+    Sum of the UTXOs paying to an address
+    """
+
+    address: str
+
+    def handle(self, sock, peer_hostname):
+        with chain_lock.shared:
+            balance = balance_for_address(self.address)
+
+        reply(sock, balance)
 
 
 class GetMempoolMsg(NamedTuple):
@@ -110,7 +185,10 @@ class GetMempoolMsg(NamedTuple):
     """
 
     def handle(self, sock, peer_hostname):
-        sock.sendall(encode_socket_data(list(mempool.mempool.keys())))
+        with chain_lock.shared:
+            txids = list(mempool.mempool.keys())
+
+        reply(sock, txids)
 
 
 class GetActiveChainMsg(NamedTuple):
@@ -119,7 +197,25 @@ class GetActiveChainMsg(NamedTuple):
     """
 
     def handle(self, sock, peer_hostname):
-        sock.sendall(encode_socket_data(list(get_active_chain())))
+        with chain_lock.shared:
+            blocks = list(get_active_chain())
+
+        reply(sock, blocks)
+
+
+class GetTxStatusMsg(NamedTuple):
+    """
+    Look up a single transaction: in the mempool, mined (and where) or unknown
+    """
+
+    txid: str
+
+    def handle(self, sock, peer_hostname):
+        with chain_lock.shared:
+            in_mempool = self.txid in mempool.mempool
+            location = None if in_mempool else find_txn_location(self.txid)
+
+        reply(sock, TxStatus(self.txid, in_mempool, location))
 
 
 class AddPeerMsg(NamedTuple):
@@ -129,7 +225,53 @@ class AddPeerMsg(NamedTuple):
         peer_hostnames.add(self.peer_hostname)
 
 
-def read_all_from_socket(req) -> object:
+class VersionMsg(NamedTuple):
+    """
+    Protocol handshake, answered with our own VersionMsg. Peers from before
+    the handshake can't decode it and hang up, which keeps them on JSON.
+    """
+
+    protocol_version: int
+
+    def handle(self, sock, peer_hostname):
+        reply(sock, VersionMsg(PROTOCOL_VERSION))
+
+
+def negotiate_protocol(peer, port=None) -> Union[int, None]:
+    """
+    Agree on a protocol version with a peer. None if it can't be reached.
+    """
+    try:
+        s = socket.create_connection((peer, port or PORT), timeout=1)
+    except Exception:
+        logger.debug(f'[p2p] {peer} unreachable for version handshake')
+        return None
+
+    with s:
+        try:
+            s.sendall(encode_socket_data(VersionMsg(PROTOCOL_VERSION)))
+            theirs = read_all_from_socket(s)
+        except Exception:
+            theirs = None
+
+    if not isinstance(theirs, VersionMsg):
+        logger.info(f'[p2p] {peer} predates the version handshake, using JSON')
+        return 0
+
+    return min(theirs.protocol_version, PROTOCOL_VERSION)
+
+
+def get_peer_protocol(peer, port=None) -> int:
+    if peer not in peer_protocols:
+        version = negotiate_protocol(peer, port)
+        if version is None:
+            return 0
+        peer_protocols[peer] = version
+
+    return peer_protocols[peer]
+
+
+def read_frame(req) -> bytes:
     """
     First 4 bytes signify message length
     """
@@ -140,10 +282,17 @@ def read_all_from_socket(req) -> object:
 
     while msg_len > 0:
         tdat = req.recv(1024)
+        if not tdat:
+            break
         data += tdat
         msg_len -= len(tdat)
 
-    return deserialize(data.decode()) if data else None
+    return data
+
+
+def read_all_from_socket(req) -> object:
+    data = read_frame(req)
+    return codec.loads(data) if data else None
 
 
 def send_to_peer(data, peer=None):
@@ -157,8 +306,9 @@ def send_to_peer(data, peer=None):
 
     while tries_left > 0:
         try:
+            binary = get_peer_protocol(peer) >= 1
             with socket.create_connection((peer, PORT), timeout=1) as s:
-                s.sendall(encode_socket_data(data))
+                s.sendall(encode_socket_data(data, binary=binary))
                 logger.info(f'sending this {data} to {peer} {PORT}')
         except Exception:
             logger.exception(f'failed to send to peer {peer}')
@@ -172,18 +322,20 @@ def send_to_peer(data, peer=None):
 
 
 class ThreadedTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
-    pass
+    # a peer connection in flight mustn't keep the node from exiting
+    daemon_threads = True
 
 
 class TCPHandler(socketserver.BaseRequestHandler):
 
     def handle(self):
-        data = read_all_from_socket(self.request)
+        frame = read_frame(self.request)
+        data = codec.loads(frame) if frame else None
         peer_hostname = self.request.getpeername()[0]
         peer_hostnames.add(peer_hostname)
 
         if hasattr(data, 'handle') and isinstance(data.handle, Callable):
-            data.handle(self.request, peer_hostname)
+            data.handle(PeerConnection(self.request, codec.is_binary(frame)), peer_hostname)
         elif isinstance(data, Transaction):
             logger.info(f'received txn {data.id} for peer {peer_hostname}')
             mempool.add_txn_to_mempool(data)
@@ -0,0 +1,234 @@
+"""
+Orphans: txns spending outputs we haven't seen yet, and blocks building on a
+block we haven't seen yet, held until their parents turn up.
+
+Orphan txns are indexed by the outpoints they spend, orphan blocks by their
+prev_block_hash, so when a parent arrives only the orphans waiting on it need
+another look. Both pools are bounded by count and by size, evicting at random
+so an attacker can't choose what gets pushed out; orphan txns whose parents
+never arrive also expire.
+"""
+import logging
+import os
+import random
+import time
+
+from typing import Dict, Iterable, List, NamedTuple, Set
+from mini_core.block import Block
+from mini_core.transaction import OutPoint, Transaction
+
+
+logger = logging.getLogger(__name__)
+
+MAX_ORPHAN_TXNS = int(os.environ.get('TC_MAX_ORPHAN_TXNS', 100))
+
+MAX_ORPHAN_BYTES = int(os.environ.get('TC_MAX_ORPHAN_BYTES', 5 * 1000 * 1000))
+
+# Larger orphans aren't worth holding on to; they're refetched if need be
+MAX_ORPHAN_TXN_SIZE = 100 * 1000
+
+ORPHAN_EXPIRY_SECS = int(os.environ.get('TC_ORPHAN_EXPIRY_SECS', 20 * 60))
+
+MAX_ORPHAN_BLOCKS = int(os.environ.get('TC_MAX_ORPHAN_BLOCKS', 750))
+
+MAX_ORPHAN_BLOCK_BYTES = int(os.environ.get('TC_MAX_ORPHAN_BLOCK_BYTES', 64 * 1000 * 1000))
+
+
+class OrphanEntry(NamedTuple):
+    txn: Transaction
+
+    size: int
+
+    # when the txn was orphaned
+    time: float
+
+
+class OrphanPool:
+
+    def __init__(self):
+        self._entries: Dict[str, OrphanEntry] = {}
+
+        # outpoint -> ids of the orphans spending it
+        self._by_outpoint: Dict[OutPoint, Set[str]] = {}
+
+        self.total_size = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, txid: str) -> bool:
+        return txid in self._entries
+
+    def __iter__(self) -> Iterable[Transaction]:
+        return (e.txn for e in list(self._entries.values()))
+
+    def entry(self, txid: str) -> OrphanEntry:
+        return self._entries[txid]
+
+    def clear(self):
+        self._entries.clear()
+        self._by_outpoint.clear()
+        self.total_size = 0
+
+    def add(self, txn: Transaction, added_at: float = None) -> bool:
+        """
+        Hold on to `txn` until its parents arrive. Returns whether it's in the
+        pool afterwards.
+        """
+        if txn.id in self._entries:
+            return True
+
+        if txn.serialized_size > MAX_ORPHAN_TXN_SIZE:
+            logger.info(f'not keeping orphan {txn.id}, it is too large')
+            return False
+
+        now = time.time()
+        self.expire(now)
+
+        entry = OrphanEntry(txn, txn.serialized_size, now if added_at is None else added_at)
+        self._entries[txn.id] = entry
+        self.total_size += entry.size
+
+        for txin in txn.txins:
+            if txin.outpoint:
+                self._by_outpoint.setdefault(txin.outpoint, set()).add(txn.id)
+
+        while len(self._entries) > MAX_ORPHAN_TXNS or self.total_size > MAX_ORPHAN_BYTES:
+            evicted = random.choice(list(self._entries))
+            logger.debug(f'orphan pool full, evicting {evicted}')
+            self.remove(evicted)
+
+        return txn.id in self._entries
+
+    def remove(self, txid: str) -> Transaction:
+        entry = self._entries.pop(txid, None)
+        if not entry:
+            return None
+
+        self.total_size -= entry.size
+
+        for txin in entry.txn.txins:
+            spenders = self._by_outpoint.get(txin.outpoint)
+            if spenders is not None:
+                spenders.discard(txid)
+                if not spenders:
+                    del self._by_outpoint[txin.outpoint]
+
+        return entry.txn
+
+    def spending(self, txn: Transaction) -> List[Transaction]:
+        """
+        The orphans spending any of `txn`'s outputs.
+        """
+        txids = set()
+        for i in range(len(txn.txouts)):
+            txids |= self._by_outpoint.get(OutPoint(txn.id, i), set())
+
+        return [self._entries[txid].txn for txid in txids]
+
+    def expire(self, now: float = None) -> List[str]:
+        cutoff = (time.time() if now is None else now) - ORPHAN_EXPIRY_SECS
+
+        # an orphan retried and orphaned again goes back in with its original
+        # time, so entries aren't in time order; there are few enough to scan
+        expired = [txid for txid, entry in self._entries.items() if entry.time < cutoff]
+
+        for txid in expired:
+            self.remove(txid)
+
+        if expired:
+            logger.info(f'expired {len(expired)} orphan txns')
+
+        return expired
+
+
+orphan_pool = OrphanPool()
+
+
+class OrphanBlockStats(NamedTuple):
+    count: int
+    size: int
+
+    # blocks orphaned, and how many of those saw their parent arrive while
+    # still in the pool rather than being evicted first
+    added: int
+    connected: int
+    evicted: int
+
+    @property
+    def hit_rate(self) -> float:
+        return self.connected / self.added if self.added else 0.
+
+
+class OrphanBlockPool:
+
+    def __init__(self):
+        self._blocks: Dict[str, Block] = {}
+
+        # prev_block_hash -> ids of the orphans building on it
+        self._by_prev: Dict[str, Set[str]] = {}
+
+        self.total_size = 0
+        self.added = self.connected = self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._blocks)
+
+    def __contains__(self, block_hash: str) -> bool:
+        return block_hash in self._blocks
+
+    def clear(self):
+        self._blocks.clear()
+        self._by_prev.clear()
+        self.total_size = 0
+        self.added = self.connected = self.evicted = 0
+
+    def add(self, block: Block) -> bool:
+        """
+        Hold on to `block` until its parent arrives. Returns whether it's in
+        the pool afterwards.
+        """
+        if block.id in self._blocks:
+            return True
+
+        self._blocks[block.id] = block
+        self._by_prev.setdefault(block.prev_block_hash, set()).add(block.id)
+        self.total_size += block.serialized_size
+        self.added += 1
+
+        while len(self._blocks) > MAX_ORPHAN_BLOCKS or self.total_size > MAX_ORPHAN_BLOCK_BYTES:
+            evicted = random.choice(list(self._blocks))
+            logger.debug(f'orphan block pool full, evicting {evicted}')
+            self.remove(evicted)
+            self.evicted += 1
+
+        return block.id in self._blocks
+
+    def remove(self, block_hash: str) -> Block:
+        block = self._blocks.pop(block_hash, None)
+        if not block:
+            return None
+
+        self.total_size -= block.serialized_size
+
+        children = self._by_prev[block.prev_block_hash]
+        children.discard(block_hash)
+        if not children:
+            del self._by_prev[block.prev_block_hash]
+
+        return block
+
+    def pop_children(self, block_hash: str) -> List[Block]:
+        """
+        Take the orphans building on `block_hash` out of the pool.
+        """
+        children = [self.remove(h) for h in list(self._by_prev.get(block_hash, ()))]
+        self.connected += len(children)
+        return children
+
+    def stats(self) -> OrphanBlockStats:
+        return OrphanBlockStats(
+            len(self._blocks), self.total_size, self.added, self.connected, self.evicted)
+
+
+orphan_blocks = OrphanBlockPool()
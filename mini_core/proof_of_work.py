@@ -1,6 +1,10 @@
+import os
 import time
+import queue
+import hashlib
 import logging
 import threading
+import multiprocessing
 
 from mini_core.block import Block
 
@@ -14,15 +18,26 @@ from mini_core.merkle_trees import get_merkle_root_of_txns
 
 from mini_core.params import Params
 
-from mini_core.utxo_set import utxo_set
+from mini_core.utxo_set import BlockUTXOView
 
-from mini_core.utils import serialize, sha256d
+from mini_core.utils import serialize
 
 from mini_core.wallet import init_wallet
 
 logger = logging.getLogger(__name__)
 mine_interrupt = threading.Event()
 
+# Nonces tried between checks of mine_interrupt
+MINE_CHUNK_SIZE = 10000
+
+# Number of processes searching for a nonce; 0 means one per core. With 1 we
+# mine on the calling thread.
+MINER_PROCESSES = int(os.environ.get('TC_MINER_PROCESSES', 1)) or os.cpu_count()
+
+# How often, in seconds, the mining thread checks mine_interrupt while the
+# miner processes work
+MINE_POLL_INTERVAL = 0.05
+
 
 def get_next_work_required(prev_block_hash: str) -> int:
     """
@@ -37,8 +52,8 @@ def get_next_work_required(prev_block_hash: str) -> int:
     if (prev_height + 1) % Params.DIFFICULTY_PERIOD_IN_BLOCKS != 0:
         return prev_block.bits
 
-    with chain_lock:
-        period_start_block = get_active_chain()[
+    with chain_lock.shared:
+        period_start_block = get_active_chain().headers()[
             max(prev_height - (Params.DIFFICULTY_PERIOD_IN_BLOCKS) - 1), 0]
 
     actual_time_taken = prev_block.timestamp - period_start_block.timestamp
@@ -55,27 +70,29 @@ def assemble_and_solve_block(pay_coinbase_to_addr, txns=None):
     """
     Construct a Block by pulling transactions from the mempool, the mine it
     """
-    with chain_lock:
-        prev_block_hash = get_active_chain()[-1].id if get_active_chain() else None
-
-    block = Block(
-        version=0,
-        prev_block_hash=prev_block_hash,
-        merkle_tree_hash='',
-        timestamp=int(time.time()),
-        bits=get_next_work_required(prev_block_hash),
-        nonce=0,
-        txns=txns or []
-    )
-
-    if not block.txns:
-        block = select_from_mempool(block)
-
-    fees = calculate_fees(block)
-    coinbase_txn = Transaction.create_coinbase(
-        pay_coinbase_to_addr,
-        (get_block_subsidy() + fees), len(get_active_chain())
-    )
+    # The template is built from one view of the chain, UTXO set and
+    # mempool; only the mining itself happens without the lock.
+    with chain_lock.shared:
+        prev_block_hash = get_active_chain().headers()[-1].id if get_active_chain() else None
+
+        block = Block(
+            version=0,
+            prev_block_hash=prev_block_hash,
+            merkle_tree_hash='',
+            timestamp=int(time.time()),
+            bits=get_next_work_required(prev_block_hash),
+            nonce=0,
+            txns=txns or []
+        )
+
+        if not block.txns:
+            block = select_from_mempool(block, _coinbase_reserve(block, pay_coinbase_to_addr))
+
+        fees = calculate_fees(block)
+        coinbase_txn = Transaction.create_coinbase(
+            pay_coinbase_to_addr,
+            (get_block_subsidy() + fees), len(get_active_chain())
+        )
 
     block = block._replace(txns=[coinbase_txn, *block.txns])
 
@@ -88,27 +105,29 @@ def assemble_and_solve_block(pay_coinbase_to_addr, txns=None):
     return mine(block)
 
 
-def calculate_fees(block) -> int:
+def _coinbase_reserve(block, pay_coinbase_to_addr) -> int:
     """
-    Given the txns in the block, subtract the amount of coin output from the inputs
-    This is kept as a reward for the miner
+    Room a template needs for what's added after its txns are selected: a
+    coinbase paying as much as one ever could, the comma after it, and the
+    merkle root.
     """
+    coinbase_txn = Transaction.create_coinbase(
+        pay_coinbase_to_addr, Params.TOTAL_COINS * Params.MINIS_PER_COIN, len(get_active_chain()))
+    filled = block._replace(merkle_tree_hash='0' * 64, txns=[coinbase_txn])
 
-    fee = 0
-
-    def utxo_from_block(txin):
-        tx = [t.txouts for t in block.txns if t.id == txin.outpoint.txid]
-        return tx[0][txin.outpoint.txout_idx] if tx else None
+    return len(serialize(filled)) - len(serialize(block)) + 1
 
-    def find_utxo(txin):
-        return utxo_set.get(txin.outpoint) or utxo_from_block(txin)
 
+def calculate_fees(block) -> int:
+    """
+    Given the txns in the block, subtract the amount of coin output from the inputs
+    This is kept as a reward for the miner
+    """
+    view = BlockUTXOView()
     for txn in block.txns:
-        spent = sum(find_utxo(i).value for i in txn.txins)
-        sent = sum(o.value for o in txn.txouts)
-        fee += (spent - sent)
+        view.apply(txn)
 
-    return fee
+    return view.fees
 
 
 def get_block_subsidy() -> int:
@@ -120,33 +139,150 @@ def get_block_subsidy() -> int:
     return 50 * Params.MINIS_PER_COIN // (2 ** halvings)
 
 
-def mine(block):
+def target_digest(bits: int) -> bytes:
+    """
+    The target as a 32-byte big-endian digest; a header hash solves the block
+    when its raw digest sorts below it.
+    """
+    if bits <= 0:
+        return b'\xff' * 32 + b'\x00'
+
+    return (1 << (256 - bits)).to_bytes(32, 'big')
+
+
+def search_nonce(block, start: int, count: int):
+    """
+    Try nonces start, start + 1, ... start + count - 1 and return the first one
+    that solves `block`, or None.
+
+    Everything in the header before the nonce is fixed, so it's hashed once
+    and the sha256 state copied for each attempt; the result is compared as raw
+    bytes rather than going through hex and int.
+    """
+    midstate = hashlib.sha256(block.header_prefix().encode())
+    target = target_digest(block.bits)
+    sha256 = hashlib.sha256
+
+    for nonce in range(start, start + count):
+        h = midstate.copy()
+        h.update(str(nonce or block.nonce).encode())
+
+        if sha256(h.digest()).digest() < target:
+            return nonce
+
+    return None
+
+
+def _mine_in_thread(block, first_nonce: int):
+    nonce = first_nonce
+
+    while not mine_interrupt.is_set():
+        found = search_nonce(block, nonce, MINE_CHUNK_SIZE)
+        if found is not None:
+            return found, found - first_nonce + 1
+
+        nonce += MINE_CHUNK_SIZE
+
+    return None, nonce - first_nonce
+
+
+def _mine_worker(header, first_nonce, worker_idx, num_workers, stop, found, tried):
+    """
+    Runs in a miner process. Worker i searches chunks i, i + num_workers,
+    i + 2 * num_workers, ... from first_nonce until someone finds a nonce or
+    `stop` is set.
+    """
+    nonce = first_nonce + worker_idx * MINE_CHUNK_SIZE
+
+    while not stop.is_set():
+        solution = search_nonce(header, nonce, MINE_CHUNK_SIZE)
+
+        with tried.get_lock():
+            tried.value += MINE_CHUNK_SIZE
+
+        if solution is not None:
+            found.put(solution)
+            stop.set()
+            return
+
+        nonce += num_workers * MINE_CHUNK_SIZE
+
+
+def _mine_in_processes(block, first_nonce: int, processes: int):
+    stop = multiprocessing.Event()
+    found = multiprocessing.Queue()
+    tried = multiprocessing.Value('Q', 0)
+
+    # the txns don't go into the header, no need to ship them to each worker
+    header = block._replace(txns=[])
+
+    workers = [
+        multiprocessing.Process(
+            target=_mine_worker,
+            args=(header, first_nonce, i, processes, stop, found, tried),
+            daemon=True)
+        for i in range(processes)]
+
+    for w in workers:
+        w.start()
+
+    nonce = None
+    try:
+        while nonce is None:
+            try:
+                nonce = found.get(timeout=MINE_POLL_INTERVAL)
+            except queue.Empty:
+                if mine_interrupt.is_set():
+                    break
+
+                if not any(w.is_alive() for w in workers) and found.empty():
+                    logger.error('[mining] all miner processes exited')
+                    break
+    finally:
+        stop.set()
+        for w in workers:
+            w.join(timeout=1)
+            if w.is_alive():
+                w.terminate()
+
+    return nonce, tried.value
+
+
+def mine(block, processes: int = None):
+    """
+    Search for a nonce that solves `block`, on `processes` processes
+    (MINER_PROCESSES by default). Returns the solved block, or None if
+    mine_interrupt was set first.
+    """
+    processes = processes or MINER_PROCESSES
     start = time.time()
 
     from random import randint
-    nonce = randint(0, 99999999999999)
+    first_nonce = randint(0, 99999999999999)
 
-    target = (1 << (256 - block.bits))
     mine_interrupt.clear()
 
-    while int(sha256d(block.header(nonce)), 16) >= target:
-        nonce += 1
+    if processes > 1:
+        nonce, tried = _mine_in_processes(block, first_nonce, processes)
+    else:
+        nonce, tried = _mine_in_thread(block, first_nonce)
 
-        if nonce % 10000 == 0 and mine_interrupt.is_set():
-            logger.info('[mining] interrupted')
-            mine_interrupt.clear()
-            return None
+    if nonce is None:
+        logger.info('[mining] interrupted')
+        mine_interrupt.clear()
+        return None
 
     block = block._replace(nonce=nonce)
-    duration = int(time.time() - start) or 0.001
-    khs = (block.nonce // duration) // 1000
-    logger.info(f'[mining] block found! {duration} s - {khs} KH/s - {block.id}')
+    duration = time.time() - start or 0.001
+    khs = int(tried / duration) // 1000
+    logger.info(f'[mining] block found! {duration:.2f} s - {khs} KH/s - {block.id}')
 
     return block
 
 
-def mine_forever():
-    while True:
+def mine_forever(stop: threading.Event = None):
+    stop = stop or threading.Event()
+    while not stop.is_set():
         my_address = init_wallet()[2]
         block = assemble_and_solve_block(my_address)
 
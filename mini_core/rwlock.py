@@ -0,0 +1,199 @@
+"""
+A reader/writer lock for the chain state.
+
+Three ways to hold it:
+
+- shared (`lock.shared`): any number of readers at once, e.g. RPC queries
+  and getblocks.
+- upgradable (`lock.upgradable`): one thread at a time, alongside readers.
+  Taken to validate a block, which only reads, before upgrading to exclusive
+  to connect it. Nothing else can change the chain in between, so what was
+  validated still holds.
+- exclusive (`with lock:`): no one else, for changing the chain.
+
+All three are reentrant, and a thread holding the lock exclusively or
+upgradably can also take it shared. A thread holding only a shared lock
+can't upgrade it: two readers waiting on each other to upgrade would never
+get anywhere. Waiting writers keep new readers out so they aren't starved.
+
+Time spent waiting for the lock is recorded per mode, see `stats`.
+"""
+import threading
+import time
+
+from typing import Dict, NamedTuple
+
+
+class LockWaitStats(NamedTuple):
+    acquires: int
+
+    # acquisitions that had to wait for another thread
+    contended: int
+
+    total_wait: float
+    max_wait: float
+
+    @property
+    def mean_wait(self) -> float:
+        return self.total_wait / self.acquires if self.acquires else 0.
+
+
+class _Mode:
+    """
+    One way of holding an RWLock, usable as a context manager and so with
+    `with_lock`.
+    """
+
+    def __init__(self, acquire, release):
+        self.acquire = acquire
+        self.release = release
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class RWLock:
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+
+        # thread id -> times it has taken the lock in that mode
+        self._readers: Dict[int, int] = {}
+        self._writer = None
+        self._writer_depth = 0
+        self._updater = None
+        self._updater_depth = 0
+
+        self._writers_waiting = 0
+
+        # mode -> [acquires, contended, total wait, max wait]
+        self._stats = {mode: [0, 0, 0., 0.] for mode in ('shared', 'upgradable', 'exclusive')}
+
+        self.shared = _Mode(self.acquire_shared, self.release_shared)
+        self.upgradable = _Mode(self.acquire_upgradable, self.release_upgradable)
+
+    def _record(self, mode: str, start: float, waited: bool):
+        wait = time.perf_counter() - start
+        stats = self._stats[mode]
+        stats[0] += 1
+        stats[1] += waited
+        stats[2] += wait
+        stats[3] = max(stats[3], wait)
+
+    def acquire_shared(self):
+        me = threading.get_ident()
+        start = time.perf_counter()
+
+        with self._cond:
+            held = me in self._readers or me in (self._writer, self._updater)
+            waited = False
+            while not held and (self._writer is not None or self._writers_waiting):
+                waited = True
+                self._cond.wait()
+
+            self._readers[me] = self._readers.get(me, 0) + 1
+            self._record('shared', start, waited)
+
+    def release_shared(self):
+        me = threading.get_ident()
+
+        with self._cond:
+            self._readers[me] -= 1
+            if not self._readers[me]:
+                del self._readers[me]
+                self._cond.notify_all()
+
+    def acquire_upgradable(self):
+        me = threading.get_ident()
+        start = time.perf_counter()
+
+        with self._cond:
+            if me in (self._updater, self._writer):
+                self._updater_depth += 1
+                self._updater = me
+                self._record('upgradable', start, False)
+                return
+
+            if me in self._readers:
+                raise RuntimeError("can't upgrade a shared lock")
+
+            waited = False
+            while self._writer is not None or self._updater is not None:
+                waited = True
+                self._cond.wait()
+
+            self._updater = me
+            self._updater_depth = 1
+            self._record('upgradable', start, waited)
+
+    def release_upgradable(self):
+        with self._cond:
+            self._updater_depth -= 1
+            if not self._updater_depth:
+                self._updater = None
+                self._cond.notify_all()
+
+    def acquire(self, timeout: float = None) -> bool:
+        """
+        Take the lock exclusively. With a `timeout`, give up after that many
+        seconds and return False.
+        """
+        me = threading.get_ident()
+        start = time.perf_counter()
+        deadline = None if timeout is None else start + timeout
+
+        with self._cond:
+            if self._writer == me:
+                self._writer_depth += 1
+                self._record('exclusive', start, False)
+                return True
+
+            if me in self._readers and self._updater != me:
+                raise RuntimeError("can't upgrade a shared lock")
+
+            waited = False
+            self._writers_waiting += 1
+            try:
+                while (self._writer is not None or self._updater not in (None, me) or
+                       any(reader != me for reader in self._readers)):
+                    waited = True
+                    if deadline is None:
+                        self._cond.wait()
+                    elif not self._cond.wait(deadline - time.perf_counter()):
+                        # readers held back for us can go ahead
+                        self._cond.notify_all()
+                        return False
+            finally:
+                self._writers_waiting -= 1
+
+            self._writer = me
+            self._writer_depth = 1
+            self._record('exclusive', start, waited)
+            return True
+
+    def release(self):
+        with self._cond:
+            self._writer_depth -= 1
+            if not self._writer_depth:
+                self._writer = None
+                self._cond.notify_all()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def stats(self) -> Dict[str, LockWaitStats]:
+        with self._cond:
+            return {mode: LockWaitStats(*s) for mode, s in self._stats.items()}
+
+    def reset_stats(self):
+        with self._cond:
+            for stats in self._stats.values():
+                stats[:] = [0, 0, 0., 0.]
@@ -0,0 +1,71 @@
+"""
+Signatures we've already verified, keyed by (spend message, pubkey,
+signature), so a txn checked on its way into the mempool isn't checked again
+when it shows up in a block. Only successful verifications are cached.
+
+The cache holds at most SIGCACHE_SIZE entries, dropping the least recently
+used first. Set TC_SIGCACHE_SIZE=0 to turn it off.
+"""
+import os
+import threading
+
+from collections import OrderedDict
+from typing import NamedTuple, Tuple
+
+
+SIGCACHE_SIZE = int(os.environ.get('TC_SIGCACHE_SIZE', 50000))
+
+
+class SigCacheStats(NamedTuple):
+    size: int
+    hits: int
+    misses: int
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.
+
+
+sigcache: 'OrderedDict[Tuple[bytes, bytes, bytes], bool]' = OrderedDict()
+
+_lock = threading.Lock()
+_hits = 0
+_misses = 0
+
+
+def is_verified(spend_msg: bytes, pubkey: bytes, signature: bytes) -> bool:
+    global _hits, _misses
+
+    key = (spend_msg, pubkey, signature)
+    with _lock:
+        if key in sigcache:
+            sigcache.move_to_end(key)
+            _hits += 1
+            return True
+
+        _misses += 1
+        return False
+
+
+def add_verified(spend_msg: bytes, pubkey: bytes, signature: bytes):
+    if SIGCACHE_SIZE <= 0:
+        return
+
+    with _lock:
+        sigcache[(spend_msg, pubkey, signature)] = True
+        while len(sigcache) > SIGCACHE_SIZE:
+            sigcache.popitem(last=False)
+
+
+def stats() -> SigCacheStats:
+    with _lock:
+        return SigCacheStats(len(sigcache), _hits, _misses)
+
+
+def clear():
+    global _hits, _misses
+
+    with _lock:
+        sigcache.clear()
+        _hits = _misses = 0
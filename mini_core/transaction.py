@@ -1,5 +1,5 @@
 from mini_core.params import Params
-from mini_core.utils import sha256d, serialize
+from mini_core.utils import memoized_property, sha256d, serialize
 from typing import Mapping, NamedTuple, Union, Iterable
 
 
@@ -76,11 +76,7 @@ class UnspentTxOut(NamedTuple):
         return OutPoint(self.txid, self.txout_idx)
 
 
-class Transaction(NamedTuple):
-    """
-    A NamedTuple to represent a transaction
-    """
-
+class _Transaction(NamedTuple):
     txins: Iterable[TxIn]
     txouts: Iterable[TxOut]
 
@@ -89,6 +85,16 @@ class Transaction(NamedTuple):
     # >= 500000000: UNIX timestamp at which this transaction is unlocked.
     locktime: int = None
 
+
+class Transaction(_Transaction):
+    """
+    A NamedTuple to represent a transaction
+
+    `id` and `serialized_size` are computed once per instance, so treat
+    transactions as immutable: build a new one with `_replace` rather than
+    mutating txins/txouts after they've been read.
+    """
+
     @property
     def is_coinbase(self) -> bool:
         """
@@ -113,15 +119,27 @@ class Transaction(NamedTuple):
 
         return cls(txins=[first_txin], txouts=[first_txout])
 
-    @property
+    def _serialize_once(self):
+        serialized = serialize(self)
+        self.__dict__.update(id=sha256d(serialized), serialized_size=len(serialized))
+
+    @memoized_property
     def id(self) -> str:
-        return sha256d(serialize(self))
+        self._serialize_once()
+        return self.__dict__['id']
+
+    @memoized_property
+    def serialized_size(self) -> int:
+        self._serialize_once()
+        return self.__dict__['serialized_size']
 
     def validate_basics(self, as_coinbase=False):
+        from mini_core.exceptions import TxnValidationError
+
         if not self.txouts or (not self.txins and not as_coinbase):
             raise TxnValidationError('Missing txouts or txins')
 
-        txn_len = len(serialize(self))
+        txn_len = self.serialized_size
         if txn_len > Params.MAX_BLOCK_SERIALIZED_SIZE:
             raise TxnValidationError('Too Large: {txn_len}')
 
@@ -0,0 +1,75 @@
+"""
+Optional transaction index: txid -> where in the active chain the txn was
+mined. Kept in step with the active chain by connect_block/disconnect_block
+and persisted with the chainstate. Set TC_TXINDEX=0 to turn it off.
+"""
+import logging
+import os
+
+from typing import Dict, NamedTuple, Set
+from mini_core.block import Block
+
+
+logger = logging.getLogger(__name__)
+
+TXINDEX_ENABLED = os.environ.get('TC_TXINDEX', '1') != '0'
+
+
+class TxLocation(NamedTuple):
+    block_id: str
+
+    # height of the block in the active chain
+    height: int
+
+    # position of the txn within the block
+    txn_idx: int
+
+
+class TxStatus(NamedTuple):
+    """
+    Answer to GetTxStatusMsg
+    """
+
+    txid: str
+    in_mempool: bool
+
+    # None unless the txn is in the active chain
+    location: TxLocation
+
+
+txindex: Dict[str, TxLocation] = {}
+
+# txids added or removed since the chainstate was last flushed
+dirty_txids: Set[str] = set()
+
+
+def index_block_txns(block: Block, height: int):
+    if not TXINDEX_ENABLED:
+        return
+
+    for txn_idx, txn in enumerate(block.txns):
+        txindex[txn.id] = TxLocation(block.id, height, txn_idx)
+        dirty_txids.add(txn.id)
+
+
+def unindex_block_txns(block: Block):
+    if not TXINDEX_ENABLED:
+        return
+
+    for txn in block.txns:
+        txindex.pop(txn.id, None)
+        dirty_txids.add(txn.id)
+
+
+def find_txn_location(txid: str) -> TxLocation:
+    if TXINDEX_ENABLED:
+        return txindex.get(txid)
+
+    from mini_core.chain import get_active_chain, txn_iterator
+    logger.debug(f'txindex disabled, scanning the chain for {txid}')
+
+    for txn, block, height in txn_iterator(get_active_chain()):
+        if txn.id == txid:
+            return TxLocation(block.id, height, block.txns.index(txn))
+
+    return None
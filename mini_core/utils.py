@@ -2,6 +2,7 @@ import hashlib
 import json
 import binascii
 
+from functools import lru_cache
 from typing import get_type_hints, Iterable, Mapping, Union
 
 
@@ -16,10 +17,30 @@ def sha256d(s: Union[str, bytes]) -> str:
     return hashlib.sha256(hashlib.sha256(s).digest()).hexdigest()
 
 
-def get_median_time_past(num_last_blocks: int) -> int:
+class memoized_property:
+    """
+    A property computed on first access and then stored in the instance's
+    __dict__, which shadows the descriptor from then on.
+    """
+
+    def __init__(self, fget):
+        self.fget = fget
+        self.name = fget.__name__
+        self.__doc__ = fget.__doc__
+
+    def __get__(self, obj, cls):
+        if obj is None:
+            return self
+
+        value = obj.__dict__[self.name] = self.fget(obj)
+        return value
+
+
+def get_median_time_past(num_last_blocks: int, chain=None) -> int:
     from mini_core.chain import get_active_chain
 
-    last_n_blocks = get_active_chain()[::-1][:num_last_blocks]
+    chain = get_active_chain().headers() if chain is None else chain
+    last_n_blocks = chain[-num_last_blocks:][::-1]
 
     if not last_n_blocks:
         return 0
@@ -53,6 +74,11 @@ def serialize(obj) -> str:
         contents_to_primitive(obj), sort_keys=True, separators=(',', ':'))
 
 
+@lru_cache(maxsize=None)
+def _bytes_fields(_type) -> frozenset:
+    return frozenset(k for k, v in get_type_hints(_type).items() if v == bytes)
+
+
 def deserialize(serialized: str) -> object:
     """NamedTuple-flavored serialization from JSON."""
     import mini_core
@@ -65,8 +91,7 @@ def deserialize(serialized: str) -> object:
             return o
 
         _type = gs[o.pop('_type', None)]
-        bytes_keys = {
-            k for k, v in get_type_hints(_type).items() if v == bytes}
+        bytes_keys = _bytes_fields(_type)
 
         for k, v in o.items():
             o[k] = contents_to_objs(v)
@@ -1,23 +1,78 @@
 import logging
 
-from typing import Mapping
-from mini_core.transaction import OutPoint, UnspentTxOut
+from typing import Dict, List, Mapping, Optional, Set
+from mini_core.exceptions import TxnValidationError
+from mini_core.transaction import OutPoint, Transaction, UnspentTxOut
 
 
 logger = logging.getLogger(__name__)
 
 utxo_set: Mapping[OutPoint, UnspentTxOut] = {}
 
+# Outpoints added or removed since the chainstate was last flushed
+dirty_outpoints: Set[OutPoint] = set()
+
+# address -> outpoints in utxo_set paying to it
+address_index: Dict[str, Set[OutPoint]] = {}
+
+# address -> its outpoints in address_index, sorted for paging; dropped
+# whenever the address gains or loses one
+_sorted_outpoints: Dict[str, List[OutPoint]] = {}
+
 
 def add_to_utxo(txout, tx, idx, is_coinbase, height):
   utxo = UnspentTxOut(*txout, txid=tx.id, txout_idx=idx, is_coinbase=is_coinbase, height=height)
 
   logger.info(f'adding tx outpoint {utxo.outpoint} to utxo_set')
+  restore_utxo(utxo)
+
+
+def restore_utxo(utxo: UnspentTxOut):
   utxo_set[utxo.outpoint] = utxo
+  dirty_outpoints.add(utxo.outpoint)
+  address_index.setdefault(utxo.pubkey, set()).add(utxo.outpoint)
+  _sorted_outpoints.pop(utxo.pubkey, None)
 
 
 def rm_from_utxo(txid, txout_idx):
-  del utxo_set[OutPoint(txid, txout_idx)]
+  outpoint = OutPoint(txid, txout_idx)
+  utxo = utxo_set.pop(outpoint)
+  dirty_outpoints.add(outpoint)
+
+  _sorted_outpoints.pop(utxo.pubkey, None)
+  outpoints = address_index.get(utxo.pubkey)
+  if outpoints is not None:
+    outpoints.discard(outpoint)
+    if not outpoints:
+      del address_index[utxo.pubkey]
+
+
+def rebuild_address_index():
+  address_index.clear()
+  _sorted_outpoints.clear()
+  for outpoint, utxo in utxo_set.items():
+    address_index.setdefault(utxo.pubkey, set()).add(outpoint)
+
+
+def utxos_for_address(address: str) -> List[UnspentTxOut]:
+  """
+  UTXOs paying to an address, in a stable (outpoint) order. The order is
+  worked out once and reused for every page until the address changes.
+  """
+  outpoints = _sorted_outpoints.get(address)
+  if outpoints is None:
+    outpoints = sorted(address_index.get(address, ()))
+    if outpoints:
+      _sorted_outpoints[address] = outpoints
+
+  return [utxo_set[o] for o in outpoints if o in utxo_set]
+
+
+def balance_for_address(address: str) -> int:
+  """
+  Sum of the UTXOs paying to an address; order doesn't matter, so no sorting.
+  """
+  return sum(utxo_set[o].value for o in address_index.get(address, ()) if o in utxo_set)
 
 
 def find_utxo_in_list(txin, txns) -> UnspentTxOut:
@@ -30,3 +85,104 @@ def find_utxo_in_list(txin, txns) -> UnspentTxOut:
   return UnspentTxOut(*txout, txid=txid, is_coinbase=False, height=-1, txout_idx=txout_idx)
 
 
+class UTXOOverlay:
+  """
+  Changes to utxo_set made in a layer of their own, so a whole reorg can be
+  worked out and validated before any of it is visible. `commit` applies the
+  layer to utxo_set in one go; a layer that isn't wanted is just dropped.
+  """
+
+  def __init__(self):
+    # outpoint -> its UTXO, or None if removed
+    self.changes: Dict[OutPoint, Optional[UnspentTxOut]] = {}
+
+  def get(self, outpoint: OutPoint, default: UnspentTxOut = None) -> UnspentTxOut:
+    if outpoint in self.changes:
+      utxo = self.changes[outpoint]
+      return default if utxo is None else utxo
+    return utxo_set.get(outpoint, default)
+
+  def __getitem__(self, outpoint: OutPoint) -> UnspentTxOut:
+    utxo = self.get(outpoint)
+    if utxo is None:
+      raise KeyError(outpoint)
+    return utxo
+
+  def __contains__(self, outpoint: OutPoint) -> bool:
+    return self.get(outpoint) is not None
+
+  def add(self, utxo: UnspentTxOut):
+    self.changes[utxo.outpoint] = utxo
+
+  def remove(self, outpoint: OutPoint) -> UnspentTxOut:
+    utxo = self[outpoint]
+    self.changes[outpoint] = None
+    return utxo
+
+  def commit(self):
+    for outpoint, utxo in self.changes.items():
+      if utxo is not None:
+        restore_utxo(utxo)
+      elif outpoint in utxo_set:
+        rm_from_utxo(*outpoint)
+
+    self.changes.clear()
+
+
+class BlockUTXOView:
+  """
+  The UTXO set as a block sees it partway through: `base` plus the outputs of
+  the block's txns applied so far, minus the outputs they've spent. Built once
+  per block, so resolving an in-block parent is a dict lookup rather than a
+  scan of the block, and fees are totted up as txns are applied.
+
+  Nothing is written to `base`.
+  """
+
+  def __init__(self, base: Mapping[OutPoint, UnspentTxOut] = None, height: int = -1):
+    self.base = utxo_set if base is None else base
+
+    # height of the block, given to the UTXOs it creates
+    self.height = height
+
+    self.created: Dict[OutPoint, UnspentTxOut] = {}
+    self.spent: Set[OutPoint] = set()
+    self.fees = 0
+
+  def get(self, outpoint: OutPoint, default: UnspentTxOut = None) -> UnspentTxOut:
+    if outpoint in self.spent:
+      return default
+    return self.created.get(outpoint) or self.base.get(outpoint, default)
+
+  def __contains__(self, outpoint: OutPoint) -> bool:
+    return self.get(outpoint) is not None
+
+  def apply(self, txn: Transaction) -> int:
+    """
+    Spend `txn`'s inputs and add its outputs, returning its fee. Raises
+    TxnValidationError if an input is missing or already spent in the block.
+    """
+    spent_value = 0
+
+    if not txn.is_coinbase:
+      for txin in txn.txins:
+        utxo = self.get(txin.outpoint)
+        if utxo is None:
+          if txin.outpoint in self.spent:
+            raise TxnValidationError(f'{txin.outpoint} spent twice in block')
+          raise TxnValidationError(f'Could not find UTXO for {txin.outpoint}')
+
+        self.spent.add(txin.outpoint)
+        spent_value += utxo.value
+
+    for i, txout in enumerate(txn.txouts):
+      outpoint = OutPoint(txn.id, i)
+      self.created[outpoint] = UnspentTxOut(
+        *txout, txid=txn.id, txout_idx=i, is_coinbase=txn.is_coinbase, height=self.height)
+
+    if txn.is_coinbase:
+      return 0
+
+    fee = spent_value - sum(o.value for o in txn.txouts)
+    self.fees += fee
+    return fee
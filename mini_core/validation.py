@@ -1,6 +1,13 @@
 import binascii
+import logging
+import multiprocessing
+import os
+import sys
 import time
-import ecdsa
+
+from concurrent.futures import ProcessPoolExecutor
+
+from mini_core import sigcache
 
 from mini_core.block import Block
 
@@ -14,26 +21,79 @@ from mini_core.params import Params
 
 from mini_core.proof_of_work import get_next_work_required
 
-from mini_core.transaction import Transaction, UnspentTxOut
+from mini_core.transaction import OutPoint, Transaction, UnspentTxOut
 
 from mini_core.utils import sha256d, serialize, get_median_time_past
 
-from mini_core.utxo_set import utxo_set, find_utxo_in_list
+from mini_core.utxo_set import BlockUTXOView, utxo_set, find_utxo_in_list
+
+from mini_core.wallet import get_verifying_key, pubkey_to_address
+
+from typing import Iterable, List, Mapping, NamedTuple
 
-from mini_core.wallet import pubkey_to_address
 
-from typing import Iterable
+logger = logging.getLogger(__name__)
 
+# Processes verifying signatures in parallel; 0 means one per core
+SIG_VERIFY_PROCESSES = int(os.environ.get('TC_SIG_VERIFY_PROCESSES', 0)) or os.cpu_count()
 
-def validate_txn(txn: Transaction, as_coinbase: bool = False, siblings_in_block: Iterable[Transaction] = None, allow_utxo_from_mempool: bool = True):
+# Fewer signatures than this are verified in-process, where handing them to
+# the pool would cost more than it saves
+SIG_VERIFY_PARALLEL_MIN = 16
+
+_sig_verify_pool = None
+
+
+def start_sig_verify_pool():
+    """
+    Start the signature verification pool, if it's used and not running yet.
+
+    Workers are started by a forkserver rather than forked from the node, so
+    none of them inherits a lock some other thread happened to hold.
+    """
+    global _sig_verify_pool
+
+    if SIG_VERIFY_PROCESSES <= 1 or _sig_verify_pool is not None:
+        return
+
+    if sys.version_info >= (3, 7):
+        kwargs = {'mp_context': multiprocessing.get_context('forkserver')}
+    else:
+        # ProcessPoolExecutor only takes a context from 3.7 on; before that
+        # it uses the default start method
+        if multiprocessing.get_start_method(allow_none=True) is None:
+            multiprocessing.set_start_method('forkserver')
+        kwargs = {}
+
+    _sig_verify_pool = ProcessPoolExecutor(max_workers=SIG_VERIFY_PROCESSES, **kwargs)
+
+
+class SigCheck(NamedTuple):
+    """
+    A signature to verify: everything needed is in the spending txn itself,
+    none of it depends on the UTXO set.
+    """
+    spend_msg: bytes
+    pubkey: bytes
+    signature: bytes
+
+
+def validate_txn(txn: Transaction, as_coinbase: bool = False, siblings_in_block: Iterable[Transaction] = None, allow_utxo_from_mempool: bool = True, check_signatures: bool = True, utxo_view: Mapping[OutPoint, UnspentTxOut] = None, height: int = None):
     """
     Validate a single transaction. Used in various contexts, so the parameters facilitate difficult users
+
+    With check_signatures=False only the checks that need the UTXO set are
+    done; the caller verifies `signature_checks(txn)` itself. UTXOs are
+    looked up in `utxo_view` when given, otherwise in utxo_set. `height` is
+    that of the block the txn is to go in, the next one by default.
     """
     txn.validate_basics(as_coinbase=as_coinbase)
     available_to_spend = 0
+    utxos = utxo_set if utxo_view is None else utxo_view
+    height = get_current_height() if height is None else height
 
     for i, txin in enumerate(txn.txins):
-        utxo = utxo_set.get(txin.outpoint)
+        utxo = utxos.get(txin.outpoint)
 
         if siblings_in_block:
             utxo = utxo or find_utxo_in_list(txin, siblings_in_block)
@@ -44,11 +104,11 @@ def validate_txn(txn: Transaction, as_coinbase: bool = False, siblings_in_block:
         if not utxo:
             raise TxnValidationError(f'Could not find UTXO for TxIn[{i}] -- orphaning txn', to_orphan=txn)
 
-        if utxo.is_coinbase and (get_current_height() - utxo.height) < Params.COINBASE_MATURITY:
+        if utxo.is_coinbase and (height - utxo.height) < Params.COINBASE_MATURITY:
             raise TxnValidationError(f'Coinbase UTXO not ready for spend')
 
         try:
-            validate_signature_for_spend(txin, utxo, txn)
+            validate_signature_for_spend(txin, utxo, txn, check_signature=check_signatures)
         except TxUnlockError:
             raise TxnValidationError(f'{txin} is not valid spend of {utxo}')
 
@@ -60,25 +120,76 @@ def validate_txn(txn: Transaction, as_coinbase: bool = False, siblings_in_block:
     return txn
 
 
-def validate_signature_for_spend(txin, utxo: UnspentTxOut, txn):
+def validate_signature_for_spend(txin, utxo: UnspentTxOut, txn, check_signature: bool = True):
     pubkey_as_addr = pubkey_to_address(txin.signature.unlock_pk)
-    verifying_key = ecdsa.VerifyingKey.from_string(
-        txin.signature.unlock_pk, curve=ecdsa.SECP256k1)
 
     if pubkey_as_addr != utxo.pubkey:
-        raise TxnUnlockError('Pubkey does not match')
+        raise TxUnlockError('Pubkey does not match')
 
-    try:
-        spend_msg = build_spend_message(
-            txin.outpoint, txin.signature.unlock_pk, txin.sequence, txn.txouts)
-        verifying_key.verify(txin.signature.unlock_sig, spend_msg)
-    except Exception as e:
-        logger.exception('Key verification failed')
-        raise TxnUnlockError('Signature does not match')
+    if not check_signature:
+        return True
 
+    check = SigCheck(
+        build_spend_message(txin.outpoint, txin.signature.unlock_pk, txin.sequence, txn.txouts),
+        txin.signature.unlock_pk, txin.signature.unlock_sig)
+
+    # verified already, most likely when the txn entered the mempool
+    if sigcache.is_verified(*check):
+        return True
+
+    if not _verify(check):
+        logger.info(f'signature verification failed for {txin}')
+        raise TxUnlockError('Signature does not match')
+
+    sigcache.add_verified(*check)
     return True
 
 
+def signature_checks(txn: Transaction) -> List[SigCheck]:
+    return [
+        SigCheck(
+            build_spend_message(txin.outpoint, txin.signature.unlock_pk, txin.sequence, txn.txouts),
+            txin.signature.unlock_pk, txin.signature.unlock_sig)
+        for txin in txn.txins if txin.outpoint
+    ]
+
+
+def _verify(check: SigCheck) -> bool:
+    try:
+        verifying_key = get_verifying_key(check.pubkey)
+        return verifying_key.verify(check.signature, check.spend_msg)
+    except Exception:
+        return False
+
+
+def verify_signatures(checks: Iterable[SigCheck]) -> List[bool]:
+    """
+    Verify a batch of signatures, returning whether each one is valid.
+
+    Signatures missing from the signature cache are spread over a pool of
+    SIG_VERIFY_PROCESSES processes, so a signature-heavy block or mempool
+    batch uses every core rather than one under the GIL.
+    """
+    checks = list(checks)
+    results = [sigcache.is_verified(*c) for c in checks]
+    pending = [i for i, ok in enumerate(results) if not ok]
+
+    if SIG_VERIFY_PROCESSES > 1 and len(pending) >= SIG_VERIFY_PARALLEL_MIN:
+        start_sig_verify_pool()
+
+        chunksize = len(pending) // (SIG_VERIFY_PROCESSES * 4) + 1
+        verified = _sig_verify_pool.map(_verify, [checks[i] for i in pending], chunksize=chunksize)
+    else:
+        verified = map(_verify, [checks[i] for i in pending])
+
+    for i, ok in zip(pending, verified):
+        results[i] = ok
+        if ok:
+            sigcache.add_verified(*checks[i])
+
+    return results
+
+
 def build_spend_message(outpoint, pk, sequence, txouts) -> bytes:
     """
     similar to: SIGHASH_ALL
@@ -89,7 +200,7 @@ def build_spend_message(outpoint, pk, sequence, txouts) -> bytes:
     ).encode()
 
 
-@with_lock(chain_lock)
+@with_lock(chain_lock.upgradable)
 def validate_block(block: Block) -> Block:
     # we can't have a block without transactions
     if not block.txns:
@@ -124,6 +235,7 @@ def validate_block(block: Block) -> Block:
     if not block.prev_block_hash and not get_active_chain():
         # genesis block
         prev_block_chain_idx = ACTIVE_CHAIN_IDX
+        prev_block_height = -1
     else:
         prev_block, prev_block_height, prev_block_chain_idx = locate_block(
             block.prev_block_hash)
@@ -136,19 +248,55 @@ def validate_block(block: Block) -> Block:
             return block, prev_block_chain_idx
 
         # Previous block found in the active chain, but isn't tip => new fork.
-        elif prev_block != get_active_chain()[-1]:
+        elif prev_block.id != get_active_chain().headers()[-1].id:
             return block, prev_block_chain_idx + 1
 
     if get_next_work_required(block.prev_block_hash) != block.bits:
         raise BlockValidationError('bits is incorrect')
 
+    validate_block_txns(block, prev_block_height + 1)
+
+    return block, prev_block_chain_idx
+
+
+def validate_block_txns(block: Block, height: int, utxo_view: Mapping[OutPoint, UnspentTxOut] = None) -> BlockUTXOView:
+    """
+    The checks on a block at `height` that need the UTXO set, looked up in
+    `utxo_view` (utxo_set by default). Returns the view of the UTXO set the
+    block leaves behind, without touching `utxo_view`.
+    """
+    # Everything that needs the UTXO set first, then every signature in the
+    # block in one parallel batch. Txns may spend the outputs of txns before
+    # them in the block, but no outpoint twice.
+    view = BlockUTXOView(utxo_view, height=height)
     for txn in block.txns[1:]:
         try:
-            validate_txn(txn, siblings_in_block=block.txns[
-                         1:], allow_utxo_from_mempool=False)
+            validate_txn(txn, utxo_view=view, allow_utxo_from_mempool=False, check_signatures=False, height=height)
+            view.apply(txn)
         except TxnValidationError:
             msg = f'{txn} failed to validate'
             logger.exception(msg)
             raise BlockValidationError(msg)
 
-    return block, prev_block_chain_idx
+    checks = [(txn, c) for txn in block.txns[1:] for c in signature_checks(txn)]
+    for (txn, _), ok in zip(checks, verify_signatures(c for _, c in checks)):
+        if not ok:
+            raise BlockValidationError(f'{txn.id} has an invalid signature')
+
+    return view
+
+
+def validate_branch_block(block: Block, height: int, recent_blocks: List[Block], utxo_view: Mapping[OutPoint, UnspentTxOut]) -> BlockUTXOView:
+    """
+    Revalidate a side-branch block as if the branch were active, for a reorg.
+    `recent_blocks` are the blocks leading up to it and `utxo_view` the UTXO
+    set as of its parent. The context-free checks were done when the block
+    was first accepted.
+    """
+    if block.timestamp <= get_median_time_past(11, recent_blocks):
+        raise BlockValidationError('timestamp too old')
+
+    if get_next_work_required(block.prev_block_hash) != block.bits:
+        raise BlockValidationError('bits is incorrect')
+
+    return validate_block_txns(block, height, utxo_view)
@@ -2,8 +2,10 @@ import ecdsa
 import hashlib
 import logging
 import os
+import threading
 
 from base58 import b58encode_check
+from collections import OrderedDict
 from functools import lru_cache
 
 
@@ -11,7 +13,15 @@ logger = logging.getLogger(__name__)
 
 WALLET_PATH = os.environ.get('TC_WALLET_PATH', 'wallet.dat')
 
+# Addresses are reused heavily, so remember what each pubkey hashes to
+ADDRESS_CACHE_SIZE = int(os.environ.get('TC_ADDRESS_CACHE_SIZE', 10000))
 
+# Parsed verifying keys, each holding ~50KB of precomputed tables once the key
+# has been seen twice
+VERIFYING_KEY_CACHE_SIZE = int(os.environ.get('TC_VERIFYING_KEY_CACHE_SIZE', 1000))
+
+
+@lru_cache(maxsize=ADDRESS_CACHE_SIZE)
 def pubkey_to_address(pubkey: bytes) -> str:
     if 'ripemd160' not in hashlib.algorithms_available:
         raise RuntimeError('missing ripemd160 hash algorithm')
@@ -20,6 +30,58 @@ def pubkey_to_address(pubkey: bytes) -> str:
     return b58encode_check(b'\x00'+ripe)
 
 
+# pubkey -> (verifying key, whether its tables have been precomputed)
+_verifying_keys: 'OrderedDict[bytes, tuple]' = OrderedDict()
+_verifying_keys_lock = threading.Lock()
+
+
+def _parse_verifying_key(pubkey: bytes, precompute: bool) -> ecdsa.VerifyingKey:
+    curve = ecdsa.SECP256k1
+
+    # older ecdsa releases can't precompute
+    if not precompute or not hasattr(ecdsa.VerifyingKey, 'precompute'):
+        return ecdsa.VerifyingKey.from_string(pubkey, curve=curve)
+
+    # `from_string` leaves the point without its order, which precompute needs
+    point = ecdsa.ellipticcurve.PointJacobi.from_bytes(curve.curve, pubkey, order=curve.order)
+    verifying_key = ecdsa.VerifyingKey.from_public_point(point, curve=curve)
+    verifying_key.precompute()
+    return verifying_key
+
+
+def get_verifying_key(pubkey: bytes) -> ecdsa.VerifyingKey:
+    """
+    The parsed verifying key for `pubkey`, from cache where we can.
+
+    Precomputing a key's tables costs about three verifications and halves
+    the cost of each one after, so it's only done the second time a key
+    turns up; one-off keys are just parsed.
+    """
+    with _verifying_keys_lock:
+        cached = _verifying_keys.get(pubkey)
+        if cached:
+            _verifying_keys.move_to_end(pubkey)
+
+    if cached and cached[1]:
+        return cached[0]
+
+    verifying_key = _parse_verifying_key(pubkey, precompute=bool(cached))
+
+    if VERIFYING_KEY_CACHE_SIZE > 0:
+        with _verifying_keys_lock:
+            _verifying_keys[pubkey] = (verifying_key, bool(cached))
+            while len(_verifying_keys) > VERIFYING_KEY_CACHE_SIZE:
+                _verifying_keys.popitem(last=False)
+
+    return verifying_key
+
+
+def clear_key_caches():
+    pubkey_to_address.cache_clear()
+    with _verifying_keys_lock:
+        _verifying_keys.clear()
+
+
 @lru_cache()
 def init_wallet(path=None):
     path = path or WALLET_PATH
@@ -2,6 +2,7 @@ from mini_core.block import Block
 from mini_core.transaction import SignatureScript, Transaction, TxIn, TxOut, OutPoint
 from mini_core.validation import build_spend_message
 import ecdsa
+import io
 
 
 chain1 = [
@@ -68,3 +69,51 @@ signing_key = ecdsa.SigningKey.from_string(
     b'\xf1\xad2y\xbf\xa2x\xabn\xfbO\x98\xf7\xa7\xb4\xc0\xf4fOzX\xbf\xf6\\\xd2\xcb-\x1d:0 \xa7',
     curve=ecdsa.SECP256k1)
 
+
+
+# blocks from mine_on are mined in timestamp order, so none is older than the
+# median time past of the active chain
+_clock = iter(range(1500000001, 1600000000))
+
+
+def mine_on(prev, tag=0):
+    """
+    A coinbase-only block on `prev` at a trivial difficulty; `tag` tells apart
+    blocks at the same height on different forks.
+    """
+    from mini_core.chain import block_index
+    from mini_core.merkle_trees import get_merkle_root_of_txns
+
+    height = block_index[prev.id].height + 1 if prev.id in block_index else 1
+    txns = [Transaction.create_coinbase('1Piq91dFUqSb7tdddCWvuGX5UgdzXeoAwA', 50 + tag, height)]
+    block = Block(
+        version=0, prev_block_hash=prev.id, merkle_tree_hash=get_merkle_root_of_txns(txns).value,
+        timestamp=next(_clock), bits=1, nonce=0, txns=txns)
+
+    while int(block.id, 16) > (1 << 255):
+        block = block._replace(nonce=block.nonce + 1)
+    return block
+
+
+class FakeSock:
+    """
+    Stands in for a peer's socket: captures what a message handler sends so
+    it can be read back with read_all_from_socket.
+    """
+
+    def __init__(self):
+        self.sent = io.BytesIO()
+
+    def sendall(self, data):
+        self.sent.write(data)
+
+    def recv(self, n):
+        return self.sent.read(n)
+
+    @classmethod
+    def ask(cls, msg):
+        from mini_core.networking import read_all_from_socket
+        sock = cls()
+        msg.handle(sock, 'peer')
+        sock.sent.seek(0)
+        return read_all_from_socket(sock)
@@ -0,0 +1,81 @@
+import builtins
+
+import pytest
+
+import mini_core.utxo_set as utxo_set_module
+
+from mini_core.chain import connect_block, disconnect_block, set_active_chain, set_side_branches
+from mini_core.mempool import mempool
+from mini_core.networking import GetAddressUTXOsMsg, GetBalanceMsg
+from mini_core.utxo_set import address_index, balance_for_address, rebuild_address_index, utxo_set, utxos_for_address
+
+from tests import FakeSock, chain1
+
+ADDR = '1Piq91dFUqSb7tdddCWvuGX5UgdzXeoAwA'
+
+
+@pytest.fixture(autouse=True)
+def reset_chain():
+    def reset():
+        set_side_branches([])
+        set_active_chain([])
+        mempool.clear()
+        utxo_set.clear()
+        rebuild_address_index()
+
+    reset()
+    yield
+    reset()
+
+
+def test_address_index_follows_utxo_set():
+    for block in chain1:
+        connect_block(block)
+
+    assert {u.txid for u in utxos_for_address(ADDR)} == {b.txns[0].id for b in chain1[1:]}
+    assert len(utxos_for_address('143UVyz7ooiAv1pMqbwPPpnH4BV9ifJGFF')) == 1
+    assert utxos_for_address('nobody') == []
+
+    disconnect_block(chain1[2])
+    assert [u.txid for u in utxos_for_address(ADDR)] == [chain1[1].txns[0].id]
+
+    disconnect_block(chain1[1])
+    assert ADDR not in address_index
+
+    before = {a: set(ops) for a, ops in address_index.items()}
+    rebuild_address_index()
+    assert address_index == before
+
+
+def test_paginated_address_messages():
+    for block in chain1:
+        connect_block(block)
+
+    first = FakeSock.ask(GetAddressUTXOsMsg(ADDR, limit=1))
+    assert len(first.utxos) == 1
+    assert first.next_offset == 1
+
+    second = FakeSock.ask(GetAddressUTXOsMsg(ADDR, first.next_offset, limit=1))
+    assert second.next_offset is None
+    assert first.utxos + second.utxos == utxos_for_address(ADDR)
+
+    assert FakeSock.ask(GetBalanceMsg(ADDR)) == 2 * 5000000000
+    assert FakeSock.ask(GetBalanceMsg('nobody')) == 0
+
+
+def test_pages_reuse_the_sorted_order_until_the_address_changes(monkeypatch):
+    for block in chain1[:2]:
+        connect_block(block)
+
+    sorts = []
+    monkeypatch.setattr(utxo_set_module, 'sorted', lambda o: sorts.append(1) or builtins.sorted(o), raising=False)
+
+    first = utxos_for_address(ADDR)
+    assert utxos_for_address(ADDR) == first
+    assert balance_for_address(ADDR) == sum(u.value for u in first)
+    assert len(sorts) == 1
+
+    connect_block(chain1[2])
+    assert len(utxos_for_address(ADDR)) == 2
+    assert len(sorts) == 2
+
@@ -0,0 +1,66 @@
+import pytest
+
+from mini_core.chain import ACTIVE_CHAIN_IDX, block_index, block_work, connect_block, get_active_chain, locate_block, set_active_chain, set_side_branches
+from mini_core.mempool import mempool
+from mini_core.utxo_set import utxo_set
+
+from tests import chain1, chain2
+
+
+def _reset():
+    set_active_chain([])
+    set_side_branches([])
+    mempool.clear()
+    utxo_set.clear()
+
+
+@pytest.fixture(autouse=True)
+def reset_chain():
+    _reset()
+    yield
+    _reset()
+
+
+def test_block_index_tracks_connects():
+    for block in chain1:
+        assert connect_block(block) == ACTIVE_CHAIN_IDX
+
+    assert len(block_index) == 3
+
+    for height, block in enumerate(chain1):
+        entry = block_index[block.id]
+        assert entry.height == height
+        assert entry.chain_idx == ACTIVE_CHAIN_IDX
+        assert entry.prev_block_hash == block.prev_block_hash
+        assert entry.chainwork == (height + 1) * block_work(24)
+        assert locate_block(block.id) == (block, height, ACTIVE_CHAIN_IDX)
+
+    assert locate_block('deadbeef') == (None, None, None)
+
+
+def test_block_index_follows_reorg():
+    for block in chain1:
+        connect_block(block)
+
+    for block in chain2[1:3]:
+        assert connect_block(block) == 1
+
+    # side branch heights are relative to the fork point
+    assert locate_block(chain2[2].id) == (chain2[2], 1, 1)
+    assert block_index[chain2[2].id].height == 2
+    assert locate_block(chain2[2].id, get_active_chain()) == (None, None, None)
+
+    # one block more than chain1 is enough work to take over
+    assert connect_block(chain2[3]) == 1
+    assert connect_block(chain2[4]) == ACTIVE_CHAIN_IDX
+
+    assert get_active_chain() == chain2
+
+    for height, block in enumerate(chain2):
+        assert locate_block(block.id) == (block, height, ACTIVE_CHAIN_IDX)
+
+    for position, block in enumerate(chain1[1:]):
+        assert locate_block(block.id) == (block, position, 1)
+        assert block_index[block.id].height == position + 1
+
+    assert len(block_index) == len(chain2) + len(chain1[1:])
@@ -0,0 +1,117 @@
+import os
+
+import mini_core.block_store as bs
+import mini_core.chain as chain
+
+from mini_core.block_store import BlockStore, INDEX_RECORD
+from mini_core.mempool import mempool
+from mini_core.networking import encode_socket_data
+from mini_core.utxo_set import utxo_set
+
+from tests import chain1, chain2
+
+
+def test_write_and_read_back(tmp_path):
+    store = BlockStore(str(tmp_path))
+
+    for block in chain2:
+        store.write_block(block)
+
+    # writing a block twice is a no-op
+    loc = store.write_block(chain2[0])
+    assert len(store) == len(chain2)
+
+    store.close()
+    store = BlockStore(str(tmp_path))
+
+    assert len(store) == len(chain2)
+    assert chain2[3].id in store
+    assert store.read_block(chain2[3].id) == chain2[3]
+    assert store.read_block('00' * 32) is None
+    assert list(store.iter_blocks()) == chain2
+    assert list(store.iter_blocks(3)) == chain2[3:]
+    assert store.write_block(chain2[0]) == loc
+
+
+def test_rolls_over_segments(tmp_path, monkeypatch):
+    monkeypatch.setattr(bs, 'MAX_SEGMENT_SIZE', 300)
+    store = BlockStore(str(tmp_path))
+
+    for block in chain2:
+        store.write_block(block)
+
+    assert len({store.write_block(b).segment for b in chain2}) > 1
+    store.close()
+
+    assert list(BlockStore(str(tmp_path)).iter_blocks()) == chain2
+
+
+def test_recovers_from_torn_write(tmp_path):
+    store = BlockStore(str(tmp_path))
+    for block in chain2[:3]:
+        store.write_block(block)
+    store.close()
+
+    # half an index record, and a segment record with no index entry
+    with open(os.path.join(str(tmp_path), 'index.dat'), 'ab') as f:
+        f.write(b'\x00' * (INDEX_RECORD.size // 2))
+    with open(os.path.join(str(tmp_path), 'blk00000.dat'), 'ab') as f:
+        f.write(b'garbage')
+
+    store = BlockStore(str(tmp_path))
+    assert list(store.iter_blocks()) == chain2[:3]
+
+    store.write_block(chain2[3])
+    store.close()
+    assert list(BlockStore(str(tmp_path)).iter_blocks()) == chain2[:4]
+
+
+def test_migrates_chain_file(tmp_path, monkeypatch):
+    chain_path = os.path.join(str(tmp_path), 'chain.dat')
+    with open(chain_path, 'wb') as f:
+        f.write(encode_socket_data(chain1))
+
+    monkeypatch.setattr(chain, 'CHAIN_PATH', chain_path)
+    monkeypatch.setattr(chain, 'BLOCKS_PATH', os.path.join(str(tmp_path), 'blocks'))
+    monkeypatch.setattr(chain, 'CHAINSTATE_PATH', os.path.join(str(tmp_path), 'chainstate.sqlite'))
+
+    chain.set_side_branches([])
+    chain.set_active_chain([])
+    mempool.clear()
+    utxo_set.clear()
+
+    try:
+        chain.load_from_disk()
+
+        assert chain.get_active_chain() == chain1
+        assert not os.path.exists(chain_path)
+        assert os.path.exists(chain_path + '.migrated')
+        assert list(chain.block_store.iter_blocks()) == chain1
+    finally:
+        chain.block_store.close()
+        chain.block_store = None
+        chain.chainstate.close()
+        chain.chainstate = None
+        chain.set_active_chain([])
+        utxo_set.clear()
+
+
+def test_connect_block_writes_to_a_fresh_store(tmp_path, monkeypatch):
+    # an empty store is falsy, it must still be written to
+    monkeypatch.setattr(chain, 'block_store', BlockStore(str(tmp_path)))
+
+    chain.set_side_branches([])
+    chain.set_active_chain([])
+    mempool.clear()
+    utxo_set.clear()
+
+    try:
+        assert not chain.block_store
+        for block in chain1:
+            chain.connect_block(block)
+
+        assert list(chain.block_store.iter_blocks()) == chain1
+    finally:
+        chain.block_store.close()
+        chain.set_active_chain([])
+        utxo_set.clear()
@@ -0,0 +1,179 @@
+import pytest
+
+from mini_core.block import Block
+from mini_core.mempool import mempool, select_from_mempool
+from mini_core.params import Params
+from mini_core.transaction import OutPoint, Transaction, TxIn, TxOut, SignatureScript, UnspentTxOut
+from mini_core.utils import serialize, sha256d
+from mini_core.utxo_set import utxo_set
+
+ADDR = '1Piq91dFUqSb7tdddCWvuGX5UgdzXeoAwA'
+
+empty_block = Block(
+    version=0, prev_block_hash=sha256d('prev'), merkle_tree_hash='',
+    timestamp=1501827000, bits=24, nonce=0, txns=[])
+
+
+@pytest.fixture(autouse=True)
+def reset_mempool():
+    mempool.clear()
+    utxo_set.clear()
+    yield
+    mempool.clear()
+    utxo_set.clear()
+
+
+def _txn(outpoint, num_txouts=1):
+    txin = TxIn(
+        outpoint=outpoint,
+        signature=SignatureScript(unlock_sig=bytes(64), unlock_pk=bytes(64)),
+        sequence=0)
+    return Transaction(txins=[txin], txouts=[TxOut(value=100, pubkey=ADDR)] * num_txouts, locktime=0)
+
+
+def _confirmed_outpoint(name):
+    outpoint = OutPoint(sha256d(name), 0)
+    utxo_set[outpoint] = UnspentTxOut(
+        value=100, pubkey=ADDR, txid=outpoint.txid, txout_idx=0, is_coinbase=False, height=0)
+    return outpoint
+
+
+def test_parents_go_first():
+    parent = _txn(_confirmed_outpoint('a'))
+    child = _txn(OutPoint(parent.id, 0))
+    grandchild = _txn(OutPoint(child.id, 0))
+    other = _txn(_confirmed_outpoint('b'))
+
+    for tx in (grandchild, other, child, parent):
+        mempool[tx.id] = tx
+
+    block = select_from_mempool(empty_block)
+    assert block.txns == [parent, child, grandchild, other]
+
+
+def test_diamond_parents_go_first():
+    a = _txn(_confirmed_outpoint('a'), num_txouts=2)
+    b = _txn(OutPoint(a.id, 0))
+    c = Transaction(
+        txins=[b.txins[0]._replace(outpoint=OutPoint(a.id, 1)),
+               b.txins[0]._replace(outpoint=OutPoint(b.id, 0))],
+        txouts=[TxOut(value=100, pubkey=ADDR)], locktime=0)
+
+    for tx in (c, b, a):
+        mempool[tx.id] = tx
+
+    # c's package, ranked first, reaches a both directly and through b
+    assert select_from_mempool(empty_block).txns == [a, b, c]
+
+
+def test_skips_txns_with_missing_inputs():
+    orphan = _txn(OutPoint(sha256d('nowhere'), 0))
+    child = _txn(OutPoint(orphan.id, 0))
+    tx = _txn(_confirmed_outpoint('a'))
+
+    for t in (child, orphan, tx):
+        mempool[t.id] = t
+
+    assert select_from_mempool(empty_block).txns == [tx]
+
+
+def test_long_unconfirmed_chain():
+    tx = _txn(_confirmed_outpoint('a'))
+    txns = [tx]
+    # deeper than the default recursion limit
+    for _ in range(1200):
+        tx = _txn(OutPoint(tx.id, 0))
+        txns.append(tx)
+
+    for tx in reversed(txns):
+        mempool[tx.id] = tx
+
+    assert select_from_mempool(empty_block).txns == txns
+
+
+def test_tracks_size(monkeypatch):
+    txns = [_txn(_confirmed_outpoint(str(i)), num_txouts=1 + i % 3) for i in range(50)]
+    for tx in txns:
+        mempool[tx.id] = tx
+
+    block = select_from_mempool(empty_block)
+    assert block.txns == txns
+
+    limit = len(serialize(block._replace(txns=txns[:20]))) + 1
+    monkeypatch.setattr(Params, 'MAX_BLOCK_SERIALIZED_SIZE', limit)
+
+    block = select_from_mempool(empty_block)
+    assert block.txns[:20] == txns[:20]
+    assert len(serialize(block)) < limit
+
+
+def test_adds_packages_whole(monkeypatch):
+    parent = _txn(_confirmed_outpoint('a'), num_txouts=3)
+    child = _txn(OutPoint(parent.id, 0), num_txouts=3)
+    small = _txn(_confirmed_outpoint('b'))
+
+    for tx in (child, parent, small):
+        mempool[tx.id] = tx
+
+    # room for the parent and the small txn, but not the parent and child
+    limit = len(serialize(empty_block._replace(txns=[parent, small]))) + 1
+    monkeypatch.setattr(Params, 'MAX_BLOCK_SERIALIZED_SIZE', limit)
+
+    assert select_from_mempool(empty_block).txns == [parent, small]
+
+
+def test_template_from_a_full_mempool_leaves_room_for_the_coinbase(monkeypatch):
+    import mini_core.proof_of_work as pow
+
+    from mini_core.chain import set_active_chain, set_side_branches
+
+    set_side_branches([])
+    set_active_chain([])
+    monkeypatch.setattr(pow, 'mine', lambda block: block)
+    monkeypatch.setattr(Params, 'MAX_BLOCK_SERIALIZED_SIZE', 5000)
+
+    txns = [_txn(_confirmed_outpoint(str(i)), num_txouts=1 + i % 3) for i in range(100)]
+    for tx in txns:
+        mempool[tx.id] = tx
+
+    block = pow.assemble_and_solve_block(ADDR)
+
+    assert block.txns[0].is_coinbase
+    assert 1 < len(block.txns) < len(txns)
+    assert len(serialize(block)) <= Params.MAX_BLOCK_SERIALIZED_SIZE
+
+
+def test_template_is_built_with_writers_kept_out(monkeypatch):
+    import threading
+
+    import mini_core.proof_of_work as pow
+
+    from mini_core.chain import chain_lock, set_active_chain, set_side_branches
+
+    set_side_branches([])
+    set_active_chain([])
+    monkeypatch.setattr(pow, 'mine', lambda block: block)
+
+    tx = _txn(_confirmed_outpoint('a'))
+    mempool[tx.id] = tx
+
+    writer_got_in = []
+
+    def write():
+        if chain_lock.acquire(timeout=0.1):
+            writer_got_in.append(True)
+            chain_lock.release()
+        else:
+            writer_got_in.append(False)
+
+    def calculate_fees(block):
+        writer = threading.Thread(target=write)
+        writer.start()
+        writer.join()
+        return real_calculate_fees(block)
+
+    real_calculate_fees = pow.calculate_fees
+    monkeypatch.setattr(pow, 'calculate_fees', calculate_fees)
+
+    assert pow.assemble_and_solve_block(ADDR).txns[1:] == [tx]
+    assert writer_got_in == [False]
@@ -0,0 +1,74 @@
+import pytest
+
+from mini_core.block import Block
+from mini_core.chain import (
+    ACTIVE_CHAIN_IDX, block_index, best_side_tips, connect_block, get_active_chain, get_side_branches,
+    locate_block, set_active_chain, set_side_branches)
+from mini_core.mempool import mempool
+from mini_core.transaction import Transaction
+from mini_core.utxo_set import utxo_set
+
+from tests import mine_on
+
+
+ADDR = '1Piq91dFUqSb7tdddCWvuGX5UgdzXeoAwA'
+
+
+def _reset():
+    set_active_chain([])
+    set_side_branches([])
+    mempool.clear()
+    utxo_set.clear()
+
+
+@pytest.fixture(autouse=True)
+def reset_chain():
+    _reset()
+    yield
+    _reset()
+
+
+@pytest.fixture
+def active():
+    genesis = Block(0, None, '', 1500000000, 1, 0, [Transaction.create_coinbase(ADDR, 50, 0)])
+    set_active_chain([genesis])
+
+    chain = [genesis]
+    for _ in range(3):
+        chain.append(mine_on(chain[-1]))
+        assert connect_block(chain[-1]) == ACTIVE_CHAIN_IDX
+    return chain
+
+
+def test_forking_off_a_side_branch_starts_a_new_one(active):
+    a2 = mine_on(active[1], tag=1)
+    a3 = mine_on(a2, tag=1)
+    b3 = mine_on(a2, tag=2)
+
+    assert connect_block(a2) == 1
+    assert connect_block(a3) == 1
+    assert connect_block(b3) == 2
+
+    assert get_side_branches() == [[a2, a3], [b3]]
+    assert locate_block(b3.id) == (b3, 0, 2)
+    assert block_index[b3.id].chainwork == block_index[active[-1].id].chainwork
+
+    # b4 gives the b branch the most work; the fork point is found through a2
+    b4 = mine_on(b3, tag=2)
+    assert connect_block(b4) == 2
+
+    assert get_active_chain() == [*active[:2], a2, b3, b4]
+    assert get_side_branches() == [[a3], active[2:]]
+    assert locate_block(a3.id) == (a3, 0, 1)
+    assert locate_block(active[3].id) == (active[3], 1, 2)
+
+
+def test_stale_forks_stay_out_of_the_way(active):
+    for tag in range(50):
+        assert connect_block(mine_on(active[-2], tag=tag + 1)) == tag + 1
+
+    assert len(get_side_branches()) == 50
+    assert get_active_chain() == active
+
+    # every stale tip has less work than the active one
+    assert -best_side_tips[0][0] == block_index[active[-1].id].chainwork
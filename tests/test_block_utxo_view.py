@@ -0,0 +1,70 @@
+import pytest
+
+from mini_core.block import Block
+from mini_core.exceptions import TxnValidationError
+from mini_core.proof_of_work import calculate_fees
+from mini_core.transaction import OutPoint, SignatureScript, Transaction, TxIn, TxOut, UnspentTxOut
+from mini_core.utils import sha256d
+from mini_core.utxo_set import BlockUTXOView
+
+
+ADDR = '1Piq91dFUqSb7tdddCWvuGX5UgdzXeoAwA'
+
+FUNDING = OutPoint(sha256d('funding'), 0)
+
+
+@pytest.fixture
+def base():
+    return {FUNDING: UnspentTxOut(1000, ADDR, FUNDING.txid, 0, False, 1)}
+
+
+def _spend(outpoint, *values):
+    txin = TxIn(outpoint=outpoint, signature=SignatureScript(b'', b''), sequence=0)
+    return Transaction(txins=[txin], txouts=[TxOut(v, ADDR) for v in values])
+
+
+def test_in_block_outputs_resolve(base):
+    view = BlockUTXOView(base, height=5)
+    parent = _spend(FUNDING, 600, 300)
+    child = _spend(OutPoint(parent.id, 1), 250)
+
+    assert view.get(OutPoint(parent.id, 1)) is None
+
+    assert view.apply(parent) == 100
+    assert view.get(OutPoint(parent.id, 1)) == UnspentTxOut(300, ADDR, parent.id, 1, False, 5)
+    assert FUNDING not in view
+
+    assert view.apply(child) == 50
+    assert OutPoint(parent.id, 1) not in view
+    assert OutPoint(parent.id, 0) in view
+    assert view.fees == 150
+
+    # the base set is left alone
+    assert list(base) == [FUNDING]
+
+
+def test_double_spend_within_block(base):
+    view = BlockUTXOView(base)
+    view.apply(_spend(FUNDING, 900))
+
+    with pytest.raises(TxnValidationError, match='spent twice'):
+        view.apply(_spend(FUNDING, 800))
+
+
+def test_spending_a_later_sibling_fails(base):
+    view = BlockUTXOView(base)
+    parent = _spend(FUNDING, 900)
+
+    with pytest.raises(TxnValidationError, match='Could not find UTXO'):
+        view.apply(_spend(OutPoint(parent.id, 0), 800))
+
+
+def test_calculate_fees_with_dependent_txns(monkeypatch, base):
+    import mini_core.utxo_set
+    monkeypatch.setattr(mini_core.utxo_set, 'utxo_set', base)
+
+    parent = _spend(FUNDING, 900)
+    child = _spend(OutPoint(parent.id, 0), 850)
+    block = Block(0, None, '', 0, 0, 0, [parent, child])
+
+    assert calculate_fees(block) == 150
@@ -0,0 +1,135 @@
+import os
+
+import pytest
+
+import mini_core.chain as chain
+
+from mini_core.mempool import mempool
+from mini_core.utxo_set import dirty_outpoints, utxo_set
+
+from tests import chain1, chain2
+
+
+@pytest.fixture
+def node_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(chain, 'CHAIN_PATH', os.path.join(str(tmp_path), 'chain.dat'))
+    monkeypatch.setattr(chain, 'BLOCKS_PATH', os.path.join(str(tmp_path), 'blocks'))
+    monkeypatch.setattr(chain, 'CHAINSTATE_PATH', os.path.join(str(tmp_path), 'chainstate.sqlite'))
+
+    def reset():
+        for db in (chain.block_store, chain.chainstate):
+            if db is not None:
+                db.close()
+        chain.block_store = chain.chainstate = None
+        chain.set_side_branches([])
+        chain.set_active_chain([])
+        mempool.clear()
+        utxo_set.clear()
+        dirty_outpoints.clear()
+
+    reset()
+    yield reset
+    reset()
+
+
+def test_restart_loads_chainstate_without_replay(node_dir, monkeypatch):
+    chain.load_from_disk()
+    chain.set_active_chain([])
+    for block in chain1:
+        assert chain.connect_block(block) == chain.ACTIVE_CHAIN_IDX
+    chain.save_to_disk()
+
+    expected_utxos = dict(utxo_set)
+    node_dir()
+
+    replayed = []
+    monkeypatch.setattr(chain, 'connect_block', replayed.append)
+    chain.load_from_disk()
+
+    assert replayed == []
+    assert chain.get_active_chain() == chain1
+    assert utxo_set == expected_utxos
+
+
+def test_restart_walks_headers_not_block_bodies(node_dir, monkeypatch):
+    chain.load_from_disk()
+    chain.set_active_chain([])
+    for block in chain1:
+        chain.connect_block(block)
+    chain.save_to_disk()
+    node_dir()
+
+    read = []
+    real_read_block = chain.BlockStore.read_block
+    monkeypatch.setattr(
+        chain.BlockStore, 'read_block', lambda store, h: read.append(h) or real_read_block(store, h))
+    chain.load_from_disk()
+
+    assert read == []
+    assert [h.id for h in chain.get_active_chain().headers()] == [b.id for b in chain1]
+    assert chain.get_active_chain() == chain1
+
+
+def test_restart_replays_blocks_after_last_flush(node_dir):
+    chain.load_from_disk()
+    chain.set_active_chain([])
+    for block in chain1:
+        chain.connect_block(block)
+    chain.save_to_disk()
+
+    # a fork that overtakes chain1 after the flush
+    for block in chain2[1:]:
+        chain.connect_block(block)
+    chain.block_store.flush()
+
+    expected_utxos = dict(utxo_set)
+    node_dir()
+    chain.load_from_disk()
+
+    assert chain.get_active_chain() == chain2
+    assert chain.get_side_branches() == [chain1[1:]]
+    assert utxo_set == expected_utxos
+
+
+def test_missing_best_block_falls_back_to_full_replay(node_dir):
+    chain.load_from_disk()
+    chain.set_active_chain([])
+    for block in chain1:
+        chain.connect_block(block)
+    chain.chainstate.flush('ff' * 32)
+
+    expected_utxos = dict(utxo_set)
+    node_dir()
+    chain.load_from_disk()
+
+    assert chain.get_active_chain() == chain1
+    assert utxo_set == expected_utxos
+
+
+def test_shutdown_flush_gives_up_on_a_held_lock(monkeypatch):
+    import threading
+    import mini_core
+
+    monkeypatch.setattr(mini_core, 'SHUTDOWN_TIMEOUT', 0.05)
+    flushed = []
+    monkeypatch.setattr(mini_core, 'save_to_disk', lambda: flushed.append('chainstate'))
+    monkeypatch.setattr(mini_core, 'save_mempool', lambda: flushed.append('mempool'))
+
+    held = threading.Event()
+    release = threading.Event()
+
+    def stuck_worker():
+        with chain.chain_lock:
+            held.set()
+            release.wait()
+
+    threading.Thread(target=stuck_worker, daemon=True).start()
+    held.wait()
+
+    mini_core.flush_on_exit()
+    assert flushed == []
+
+    release.set()
+    monkeypatch.setattr(mini_core, 'SHUTDOWN_TIMEOUT', 5)
+    mini_core.flush_on_exit()
+    assert flushed == ['chainstate', 'mempool']
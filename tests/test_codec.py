@@ -0,0 +1,106 @@
+import socket
+import socketserver
+import threading
+
+import pytest
+
+import mini_core.networking as networking
+
+from mini_core import codec
+from mini_core.networking import GetAddressUTXOsMsg, GetBalanceMsg, TCPHandler, ThreadedTCPServer, encode_socket_data, negotiate_protocol, read_frame
+from mini_core.transaction import OutPoint, Transaction, TxIn, TxOut, UnspentTxOut, SignatureScript
+from mini_core.txindex import TxLocation, TxStatus
+from mini_core.utils import serialize
+
+from tests import chain2
+
+
+def test_round_trip():
+    txin = TxIn(outpoint=OutPoint('c0ffee', 3), signature=SignatureScript(
+        unlock_sig=b'sign', unlock_pk=b'bar'), sequence=1)
+    txout = TxOut(value=5000000000, pubkey='1Piq91dFUqSb7tdddCWvuGX5UgdzXeoAwA')
+    txn = Transaction(txins=[txin], txouts=[txout], locktime=0)
+    utxo = UnspentTxOut(*txout, txid=txn.id, txout_idx=0, is_coinbase=True, height=-1)
+
+    for obj in (
+            txin, txout, txn, utxo, chain2, [utxo.outpoint, utxo],
+            TxStatus('abc', False, TxLocation(chain2[0].id, 0, 0)),
+            GetAddressUTXOsMsg('1zz', 10), 0, -300, 2 ** 70, '', 'ab', 'ABCD', 'abc', b''):
+        assert codec.loads(codec.dumps(obj)) == obj
+
+
+def test_smaller_than_json():
+    assert len(codec.dumps(chain2)) * 2 < len(serialize(chain2))
+
+
+def test_loads_json():
+    assert codec.loads(serialize(chain2).encode()) == chain2
+    assert codec.loads(serialize(chain2)) == chain2
+
+
+def test_bad_payloads():
+    data = codec.dumps(chain2)
+
+    with pytest.raises(codec.CodecError):
+        codec.loads(data[:len(data) // 2])
+
+    with pytest.raises(codec.CodecError):
+        codec.loads(codec.MAGIC + bytes([codec.VERSION + 1]) + data[2:])
+
+
+def _encode_fields(type_name, *fields):
+    out = bytearray(codec.MAGIC)
+    out += bytes([codec.VERSION, codec.T_TYPE, codec.TYPE_IDS[type_name], len(fields)])
+    for field in fields:
+        codec._encode(field, out)
+    return bytes(out)
+
+
+def test_field_count_mismatch():
+    # an older peer that doesn't send `limit`, and a newer one with an extra field
+    older = _encode_fields('GetAddressUTXOsMsg', '1zz', 10)
+    assert codec.loads(older) == GetAddressUTXOsMsg('1zz', 10)
+
+    newer = _encode_fields('GetAddressUTXOsMsg', '1zz', 10, 20, 'extra')
+    assert codec.loads(newer) == GetAddressUTXOsMsg('1zz', 10, 20)
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(handler):
+        server = ThreadedTCPServer(('127.0.0.1', 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server.server_address[1]
+
+    yield start
+
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+    # the handler remembers whoever talked to it as a peer
+    networking.peer_hostnames.discard('127.0.0.1')
+    networking.peer_protocols.clear()
+
+
+def test_negotiates_binary_with_new_peers(serve):
+    port = serve(TCPHandler)
+    assert negotiate_protocol('127.0.0.1', port) == codec.VERSION
+
+    with socket.create_connection(('127.0.0.1', port)) as s:
+        s.sendall(encode_socket_data(GetBalanceMsg('nobody'), binary=True))
+        frame = read_frame(s)
+
+    assert codec.is_binary(frame)
+    assert codec.loads(frame) == 0
+
+
+def test_old_peers_stay_on_json(serve):
+    class OldHandler(socketserver.BaseRequestHandler):
+        def handle(self):
+            read_frame(self.request)
+
+    assert negotiate_protocol('127.0.0.1', serve(OldHandler)) == 0
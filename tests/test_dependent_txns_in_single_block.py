@@ -126,9 +126,9 @@ def test_reorg():
 	assert get_side_branches() == [chain2[1:3]]
 	assert_no_change()
 
-	# Reorg necessary when a side branch is longer than the main chain
+	# Reorg necessary when a side branch has more work than the main chain
 	assert connect_block(chain2[3]) == 1
-	assert connect_block(chain2[4]) == 1
+	assert connect_block(chain2[4]) == ACTIVE_CHAIN_IDX
 
 	# Chain1 was reorged into get_side_branches().
 	assert [len(c) for c in get_side_branches()] == [2]
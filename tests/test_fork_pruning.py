@@ -0,0 +1,147 @@
+import pytest
+
+import mini_core.chain as chain
+import mini_core.validation as validation
+
+from mini_core.block import Block
+from mini_core.block_store import BlockStore
+from mini_core.chain import block_index, connect_block, get_active_chain, get_side_branches, set_active_chain, set_side_branches
+from mini_core.exceptions import BlockValidationError
+from mini_core.mempool import mempool
+from mini_core.transaction import Transaction
+from mini_core.utxo_set import utxo_set
+
+from tests import mine_on
+
+
+def _reset():
+    set_active_chain([])
+    set_side_branches([])
+    mempool.clear()
+    utxo_set.clear()
+
+
+@pytest.fixture(autouse=True)
+def node(tmp_path, monkeypatch):
+    monkeypatch.setattr(chain, 'PRUNE_FORK_DEPTH', 2)
+    monkeypatch.setattr(chain, 'DROP_FORK_DEPTH', 5)
+    monkeypatch.setattr(chain, 'block_store', BlockStore(str(tmp_path)))
+    _reset()
+
+    genesis = Block(0, None, '', 1500000000, 1, 0, [Transaction.create_coinbase('1Piq91dFUqSb7tdddCWvuGX5UgdzXeoAwA', 50, 0)])
+    set_active_chain([genesis])
+
+    yield
+
+    chain.block_store.close()
+    _reset()
+
+
+def _extend_active(num_blocks):
+    for _ in range(num_blocks):
+        assert connect_block(mine_on(get_active_chain()[-1])) == 0
+
+
+def test_stale_forks_are_pruned_to_headers_then_dropped():
+    _extend_active(2)
+    fork = mine_on(get_active_chain()[1], tag=1)
+    assert connect_block(fork) == 1
+
+    # forks off height 1, which is within PRUNE_FORK_DEPTH of a tip at 3
+    _extend_active(1)
+    assert get_side_branches()[0][0].txns
+
+    _extend_active(1)
+    pruned = get_side_branches()[0][0]
+    assert pruned.id == fork.id
+    assert pruned.txns == []
+    assert chain.block_store.read_block(fork.id) == fork
+
+    _extend_active(2)
+    assert get_side_branches()[0][0].id == fork.id
+
+    _extend_active(1)
+    assert get_side_branches() == []
+    assert fork.id not in block_index
+
+
+def test_reorg_onto_a_pruned_fork_reloads_its_bodies():
+    _extend_active(2)
+    fork = [mine_on(get_active_chain()[1], tag=1)]
+    connect_block(fork[0])
+
+    _extend_active(2)
+    assert get_side_branches()[0][0].txns == []
+
+    # the fork catches up and overtakes
+    while get_active_chain()[-1] != fork[-1]:
+        fork.append(mine_on(fork[-1], tag=1))
+        connect_block(fork[-1])
+
+    assert get_active_chain()[2:] == fork
+    assert all(block.txns for block in get_active_chain())
+
+
+def test_dropped_forks_are_not_replayed_on_restart(tmp_path, monkeypatch):
+    monkeypatch.setattr(chain, 'BLOCKS_PATH', str(tmp_path / 'blocks'))
+    monkeypatch.setattr(chain, 'CHAINSTATE_PATH', str(tmp_path / 'chainstate.sqlite'))
+    monkeypatch.setattr(chain, 'chainstate', None)
+
+    genesis = get_active_chain()[0]
+    chain.block_store.close()
+    chain.load_from_disk()
+    chain.block_store.write_block(genesis)
+
+    _extend_active(2)
+    fork = mine_on(get_active_chain()[1], tag=1)
+    assert connect_block(fork) == 1
+
+    _extend_active(chain.DROP_FORK_DEPTH + 1)
+    assert fork.id not in block_index
+    chain.save_to_disk()
+    active = [b.id for b in get_active_chain().headers()]
+
+    chain.chainstate.close()
+    chain.block_store.close()
+    _reset()
+
+    replayed = []
+    monkeypatch.setattr(chain, 'connect_block', replayed.append)
+    chain.load_from_disk()
+    chain.chainstate.close()
+
+    assert replayed == []
+    assert [b.id for b in get_active_chain().headers()] == active
+
+
+def test_a_failed_reorg_marks_the_branch_invalid(monkeypatch):
+    _extend_active(2)
+    active = get_active_chain()[:]
+
+    fork = [mine_on(active[0], tag=1)]
+    for _ in range(2):
+        fork.append(mine_on(fork[-1], tag=1))
+
+    validated = []
+
+    def fail_second_block(block, *args):
+        validated.append(block)
+        if block == fork[1]:
+            raise BlockValidationError('bad block')
+
+    monkeypatch.setattr(validation, 'validate_branch_block', fail_second_block)
+
+    for block in fork:
+        assert connect_block(block) == 1
+
+    # the reorg to fork[2] got as far as fork[1]
+    assert validated == fork[:2]
+    assert get_active_chain() == active
+    assert [block_index[b.id].invalid for b in fork] == [False, True, True]
+
+    # building on the bad branch isn't worth another try
+    more = mine_on(fork[-1], tag=1)
+    assert connect_block(more) is None
+    assert block_index[more.id].invalid
+    assert not chain.reorg_if_necessary()
+    assert validated == fork[:2]
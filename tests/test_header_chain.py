@@ -0,0 +1,82 @@
+import pytest
+
+import mini_core.chain as chain
+
+from mini_core.block import Block
+from mini_core.block_store import BlockStore
+from mini_core.chain import block_cache, block_index, connect_block, disconnect_block, get_active_chain, locate_block, set_active_chain, set_side_branches
+from mini_core.mempool import mempool
+from mini_core.transaction import Transaction
+from mini_core.utils import get_median_time_past
+from mini_core.utxo_set import utxo_set
+
+from tests import mine_on
+
+
+genesis = Block(0, None, '', 1500000000, 1, 0, [Transaction.create_coinbase('1Piq91dFUqSb7tdddCWvuGX5UgdzXeoAwA', 50, 0)])
+
+
+def _reset():
+    set_active_chain([])
+    set_side_branches([])
+    mempool.clear()
+    utxo_set.clear()
+    block_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def reset_chain():
+    _reset()
+    set_active_chain([genesis])
+    yield
+    _reset()
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(chain, 'block_store', BlockStore(str(tmp_path)))
+    yield chain.block_store
+    chain.block_store.close()
+
+
+def _extend(num_blocks):
+    blocks = []
+    for _ in range(num_blocks):
+        blocks.append(mine_on(get_active_chain().headers()[-1]))
+        assert connect_block(blocks[-1]) == 0
+    return blocks
+
+
+def test_only_headers_held_once_stored(store, monkeypatch):
+    monkeypatch.setattr(chain, 'BLOCK_CACHE_SIZE', 2)
+    blocks = _extend(4)
+
+    headers = get_active_chain().headers()[1:]
+    assert [h.id for h in headers] == [b.id for b in blocks]
+    assert all(h.txns == [] for h in headers)
+    assert all(block_index[b.id].block is h for b, h in zip(blocks, headers))
+    assert locate_block(blocks[0].id) == (headers[0], 1, 0)
+
+    # bodies come back from the store, the most recently used stay cached
+    assert list(block_cache) == [b.id for b in blocks[2:]]
+    assert get_active_chain()[1] == blocks[0]
+    assert list(block_cache) == [blocks[3].id, blocks[0].id]
+
+    assert get_active_chain() == [genesis, *blocks]
+    assert get_active_chain()[1:3] == blocks[:2]
+    assert get_median_time_past(11) == blocks[1].timestamp
+
+
+def test_disconnect_returns_the_full_block(store):
+    blocks = _extend(2)
+    block_cache.clear()
+
+    assert disconnect_block(get_active_chain()[-1]) == blocks[-1]
+    assert get_active_chain() == [genesis, blocks[0]]
+
+
+def test_bodies_held_without_a_store():
+    blocks = _extend(2)
+
+    assert get_active_chain().headers()[1:] == blocks
+    assert not block_cache
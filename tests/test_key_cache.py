@@ -0,0 +1,61 @@
+import ecdsa
+import pytest
+
+import mini_core.wallet as wallet
+
+from mini_core.wallet import clear_key_caches, get_verifying_key, pubkey_to_address
+
+from tests import signing_key
+
+
+@pytest.fixture(autouse=True)
+def reset_caches():
+    clear_key_caches()
+    yield
+    clear_key_caches()
+
+
+def test_addresses_are_cached():
+    pubkey = signing_key.verifying_key.to_string()
+
+    assert pubkey_to_address(pubkey) == pubkey_to_address.__wrapped__(pubkey)
+    assert pubkey_to_address(pubkey) == pubkey_to_address.__wrapped__(pubkey)
+
+    info = pubkey_to_address.cache_info()
+    assert (info.hits, info.misses) == (1, 1)
+
+
+def test_verifying_keys_are_cached_and_precomputed_on_reuse():
+    pubkey = signing_key.verifying_key.to_string()
+    msg = b'spend message'
+    sig = signing_key.sign(msg)
+
+    first = get_verifying_key(pubkey)
+    assert wallet._verifying_keys[pubkey] == (first, False)
+
+    second = get_verifying_key(pubkey)
+    assert wallet._verifying_keys[pubkey][1] == hasattr(ecdsa.VerifyingKey, 'precompute')
+    assert get_verifying_key(pubkey) is second
+
+    for key in (first, second):
+        assert key.to_string() == pubkey
+        assert key.verify(sig, msg)
+
+
+def test_verifying_key_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(wallet, 'VERIFYING_KEY_CACHE_SIZE', 2)
+    pubkeys = [
+        ecdsa.SigningKey.generate(curve=ecdsa.SECP256k1).verifying_key.to_string()
+        for _ in range(3)]
+
+    for pubkey in pubkeys:
+        get_verifying_key(pubkey)
+
+    assert list(wallet._verifying_keys) == pubkeys[1:]
+
+
+def test_bad_pubkeys_are_not_cached():
+    with pytest.raises(Exception):
+        get_verifying_key(b'\x01' * 64)
+
+    assert not wallet._verifying_keys
@@ -0,0 +1,239 @@
+import pytest
+
+import mini_core.mempool as mp
+
+from mini_core.block import Block
+from mini_core.mempool import mempool, select_from_mempool
+from mini_core.transaction import OutPoint, Transaction, TxIn, TxOut, SignatureScript, UnspentTxOut
+from mini_core.utils import sha256d
+from mini_core.utxo_set import utxo_set
+
+ADDR = '1Piq91dFUqSb7tdddCWvuGX5UgdzXeoAwA'
+
+empty_block = Block(
+    version=0, prev_block_hash=sha256d('prev'), merkle_tree_hash='',
+    timestamp=1501827000, bits=24, nonce=0, txns=[])
+
+
+@pytest.fixture(autouse=True)
+def reset_mempool():
+    mempool.clear()
+    utxo_set.clear()
+    yield
+    mempool.clear()
+    utxo_set.clear()
+
+
+def _confirmed(name, value=10000):
+    outpoint = OutPoint(sha256d(name), 0)
+    utxo_set[outpoint] = UnspentTxOut(
+        value=value, pubkey=ADDR, txid=outpoint.txid, txout_idx=0, is_coinbase=False, height=0)
+    return outpoint, value
+
+
+def _spend(spent, fee):
+    outpoint, value = spent
+    txin = TxIn(
+        outpoint=outpoint,
+        signature=SignatureScript(unlock_sig=bytes(64), unlock_pk=bytes(64)),
+        sequence=0)
+    return Transaction(txins=[txin], txouts=[TxOut(value=value - fee, pubkey=ADDR)], locktime=0)
+
+
+def _output(txn):
+    return OutPoint(txn.id, 0), txn.txouts[0].value
+
+
+def _add(*txns, added_at=None):
+    for txn in txns:
+        mempool.add(txn, added_at=added_at)
+
+
+def test_works_out_fees():
+    parent = _spend(_confirmed('a'), fee=100)
+    child = _spend(_output(parent), fee=50)
+    _add(parent, child)
+
+    assert mempool.entry(parent.id).fee == 100
+    assert mempool.entry(child.id).fee == 50
+    assert mempool.ancestors(child.id) == {parent.id}
+    assert mempool.descendants(parent.id) == {child.id}
+    assert mempool.total_size == parent.serialized_size + child.serialized_size
+
+    # still a mapping of txid -> txn
+    assert dict(mempool) == {parent.id: parent, child.id: child}
+    assert mempool.pop(parent.id) == parent
+    assert mempool.total_size == child.serialized_size
+    assert mempool.ancestors(child.id) == set()
+
+
+def test_selects_by_fee_rate():
+    low = _spend(_confirmed('a'), fee=10)
+    high = _spend(_confirmed('b'), fee=1000)
+    mid = _spend(_confirmed('c'), fee=500)
+    _add(low, high, mid)
+
+    assert select_from_mempool(empty_block).txns == [high, mid, low]
+
+
+def test_child_pays_for_parent():
+    parent = _spend(_confirmed('a'), fee=0)
+    child = _spend(_output(parent), fee=2000)
+    mid = _spend(_confirmed('b'), fee=500)
+    _add(parent, mid, child)
+
+    assert select_from_mempool(empty_block).txns == [parent, child, mid]
+
+
+def test_trim_evicts_lowest_fee_rate_packages():
+    cheap_parent = _spend(_confirmed('a'), fee=1)
+    cheap_child = _spend(_output(cheap_parent), fee=1)
+    cpfp_parent = _spend(_confirmed('b'), fee=1)
+    cpfp_child = _spend(_output(cpfp_parent), fee=5000)
+    mid = _spend(_confirmed('c'), fee=500)
+    _add(cheap_parent, cheap_child, cpfp_parent, cpfp_child, mid)
+
+    size = mempool.total_size
+    assert mempool.trim(size) == []
+
+    # the child goes first, it's newer than its parent
+    assert mempool.trim(size - 1) == [cheap_child.id]
+
+    assert mempool.trim(size - cheap_child.serialized_size - 1) == [cheap_parent.id]
+    assert set(mempool) == {cpfp_parent.id, cpfp_child.id, mid.id}
+
+
+def test_expiry(monkeypatch):
+    monkeypatch.setattr(mp, 'MEMPOOL_EXPIRY_SECS', 100)
+
+    old = _spend(_confirmed('a'), fee=10)
+    old_child = _spend(_output(old), fee=10)
+    new = _spend(_confirmed('b'), fee=10)
+    _add(old, added_at=1000)
+    _add(old_child, new, added_at=1050)
+
+    assert mempool.expire(now=1120) == [old.id, old_child.id]
+    assert list(mempool) == [new.id]
+
+
+def test_spent_outpoint_index():
+    spent = _confirmed('a')
+    txn = _spend(spent, fee=10)
+    double_spend = _spend(spent, fee=20)
+    child = _spend(_output(txn), fee=10)
+    grandchild = _spend(_output(child), fee=10)
+    _add(txn, child, grandchild)
+
+    assert mempool.spender(spent[0]) == txn.id
+    assert mempool.spender(_output(txn)[0]) == child.id
+    assert mempool.conflicts(txn) == set()
+    assert mempool.conflicts(double_spend) == {txn.id}
+
+    assert set(mempool.remove_conflicts(double_spend)) == {txn.id, child.id, grandchild.id}
+    assert not mempool
+    assert mempool.spender(spent[0]) is None
+
+
+def test_rejects_double_spends(monkeypatch):
+    import mini_core.validation as validation
+    monkeypatch.setattr(validation, 'validate_txn', lambda txn: txn)
+
+    spent = _confirmed('a')
+    txn = _spend(spent, fee=10)
+    double_spend = _spend(spent, fee=20)
+
+    mp.add_txn_to_mempool(txn)
+    mp.add_txn_to_mempool(double_spend)
+
+    assert list(mempool) == [txn.id]
+
+
+def test_save_and_load(tmp_path, monkeypatch):
+    import mini_core.validation as validation
+    validated = []
+
+    def validate_txn(txn):
+        if txn.txouts[0].value < 0:
+            raise mp.TxnValidationError('bad txn')
+        if txn.txins[0].outpoint not in utxo_set and not mp.find_utxo_in_mempool(txn.txins[0]):
+            raise mp.TxnValidationError('orphan', to_orphan=txn)
+        validated.append(txn)
+        return txn
+
+    monkeypatch.setattr(validation, 'validate_txn', validate_txn)
+    monkeypatch.setattr(mp, 'MEMPOOL_LOAD_BATCH_SIZE', 2)
+    path = str(tmp_path / 'mempool.dat')
+
+    parent = _spend(_confirmed('a'), fee=100)
+    child = _spend(_output(parent), fee=50)
+    other = _spend(_confirmed('b'), fee=10)
+    invalid = _spend(_confirmed('c', value=0), fee=10)
+    _add(parent, child, other, invalid)
+    mp.orphan_pool.add(_spend((OutPoint(sha256d('d'), 0), 1000), fee=1))
+
+    assert mp.save_mempool(path) == 4
+    times = {txid: mempool.entry(txid).time for txid in mempool}
+    orphans = list(mp.orphan_pool)
+
+    mempool.clear()
+    mp.orphan_pool.clear()
+    try:
+        assert mp.load_mempool(path) == 3
+        assert list(mempool) == [parent.id, child.id, other.id]
+        assert validated == [parent, child, other]
+        assert mempool.entry(child.id).fee == 50
+        assert all(mempool.entry(t).time == int(times[t]) for t in mempool)
+        assert list(mp.orphan_pool) == orphans
+    finally:
+        mp.orphan_pool.clear()
+
+    assert mp.load_mempool(str(tmp_path / 'missing.dat')) == 0
+
+
+def _check_packages():
+    entries = mempool._entries
+    for txid in mempool:
+        ancestors = [txid, *mempool.ancestors(txid)]
+        descendants = [txid, *mempool.descendants(txid)]
+        assert mempool._packages[txid] == [
+            sum(entries[a].fee for a in ancestors), sum(entries[a].size for a in ancestors),
+            len(ancestors),
+            sum(entries[d].fee for d in descendants), sum(entries[d].size for d in descendants)]
+
+    assert mempool._by_ancestor_score == sorted(k[0] for k in mempool._score_keys.values())
+    assert mempool._by_descendant_score == sorted(k[1] for k in mempool._score_keys.values())
+    assert len(mempool._by_ancestor_score) == len(mempool)
+
+
+def test_package_totals_follow_adds_and_removes_in_any_order():
+    import random
+    rng = random.Random(1)
+
+    # a dag with diamonds: txns spending one or two outputs of earlier ones
+    txns = []
+    for i in range(40):
+        outpoints = [OutPoint(sha256d(f'confirmed {i}'), 0)]
+        if txns:
+            outpoints = rng.sample(
+                [OutPoint(t.id, j) for t in txns[-8:] for j in range(2)], rng.choice((1, 2)))
+        txins = [TxIn(outpoint=o, signature=SignatureScript(unlock_sig=bytes(64), unlock_pk=None), sequence=0)
+                 for o in outpoints]
+        txns.append(Transaction(txins=txins, txouts=[TxOut(value=i, pubkey=ADDR)] * 2, locktime=0))
+
+    fees = {t.id: rng.randrange(1, 1000) for t in txns}
+
+    # children before their parents, as when a disconnected block comes back
+    for txn in rng.sample(txns, len(txns)):
+        mempool.add(txn, fee=fees[txn.id])
+        _check_packages()
+
+    for txn in rng.sample(txns, 15):
+        if txn.id in mempool:
+            del mempool[txn.id]
+            _check_packages()
+
+    mempool.remove_with_descendants(next(t.id for t in txns if t.id in mempool))
+    _check_packages()
+
+    mempool.trim(mempool.total_size // 2)
+    _check_packages()
@@ -19,3 +19,23 @@ def test_merkle_trees():
     assert len(root.children) == 2
     assert root.children[0].value == sha256d(foo_hash + bar_hash)
     assert root.children[1].value == sha256d(baz_hash + baz_hash)
+
+
+def _pair(a, b):
+    return sha256d(a + b)
+
+
+def test_odd_inner_levels_pair_the_last_node_with_itself():
+    a, b, c, d, e, f = (sha256d(l) for l in 'abcdef')
+
+    # 6 leaves: an even leaf level, but 3 nodes on the level above
+    ab, cd, ef = _pair(a, b), _pair(c, d), _pair(e, f)
+    assert get_merkle_root(*'abcdef').value == _pair(_pair(ab, cd), _pair(ef, ef))
+
+    # 5 leaves: odd at the leaves and on the level above
+    ee = _pair(e, e)
+    assert get_merkle_root(*'abcde').value == _pair(_pair(ab, cd), _pair(ee, ee))
+
+    # 7 leaves needs no inner padding
+    g = sha256d('g')
+    assert get_merkle_root(*'abcdefg').value == _pair(_pair(ab, cd), _pair(ef, _pair(g, g)))
@@ -0,0 +1,69 @@
+import pytest
+
+import mini_core.orphans as orphans
+
+from mini_core.chain import ACTIVE_CHAIN_IDX, connect_block, get_active_chain, set_active_chain, set_side_branches
+from mini_core.mempool import mempool
+from mini_core.orphans import orphan_blocks
+from mini_core.utxo_set import utxo_set
+
+from tests import chain1, chain2
+
+
+@pytest.fixture(autouse=True)
+def reset_chain():
+    set_side_branches([])
+    set_active_chain([])
+    mempool.clear()
+    utxo_set.clear()
+    orphan_blocks.clear()
+    yield
+    set_side_branches([])
+    set_active_chain([])
+    mempool.clear()
+    utxo_set.clear()
+    orphan_blocks.clear()
+
+
+def test_orphans_connect_when_their_parent_arrives():
+    assert connect_block(chain1[0]) == ACTIVE_CHAIN_IDX
+
+    assert connect_block(chain1[2]) is None
+    assert chain1[2].id in orphan_blocks
+    assert get_active_chain() == chain1[:1]
+
+    assert connect_block(chain1[1]) == ACTIVE_CHAIN_IDX
+    assert get_active_chain() == chain1
+    assert not orphan_blocks
+
+    stats = orphan_blocks.stats()
+    assert (stats.added, stats.connected, stats.evicted) == (1, 1, 0)
+    assert stats.hit_rate == 1.
+
+
+def test_long_run_of_orphans():
+    assert connect_block(chain2[0]) == ACTIVE_CHAIN_IDX
+
+    for block in chain2[:1:-1]:
+        assert connect_block(block) is None
+    assert len(orphan_blocks) == len(chain2) - 2
+
+    assert connect_block(chain2[1]) == ACTIVE_CHAIN_IDX
+    assert get_active_chain() == chain2
+    assert not orphan_blocks
+
+
+def test_pool_is_capped(monkeypatch):
+    monkeypatch.setattr(orphans, 'MAX_ORPHAN_BLOCKS', 2)
+
+    for block in chain2[1:]:
+        orphan_blocks.add(block)
+
+    stats = orphan_blocks.stats()
+    assert stats.count == 2
+    assert stats.evicted == len(chain2) - 3
+    assert stats.size == sum(b.serialized_size for b in chain2 if b.id in orphan_blocks)
+
+    monkeypatch.setattr(orphans, 'MAX_ORPHAN_BLOCK_BYTES', 0)
+    assert not orphan_blocks.add(chain1[1])
+    assert not orphan_blocks
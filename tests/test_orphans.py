@@ -0,0 +1,183 @@
+import threading
+import time
+
+import pytest
+
+import mini_core.chain as chain
+import mini_core.orphans as orphans
+import mini_core.validation as validation
+
+from mini_core.block import Block
+from mini_core.exceptions import TxnValidationError
+from mini_core.mempool import mempool, add_txn_to_mempool, find_utxo_in_mempool, reprocess_orphans
+from mini_core.orphans import orphan_pool
+from mini_core.transaction import OutPoint, Transaction, TxIn, TxOut, SignatureScript, UnspentTxOut
+from mini_core.utils import sha256d
+from mini_core.utxo_set import utxo_set
+
+from tests import mine_on
+
+ADDR = '1Piq91dFUqSb7tdddCWvuGX5UgdzXeoAwA'
+
+
+def _validate_inputs_exist(txn):
+    for txin in txn.txins:
+        if txin.outpoint not in utxo_set and not find_utxo_in_mempool(txin):
+            raise TxnValidationError('missing input', to_orphan=txn)
+    return txn
+
+
+@pytest.fixture(autouse=True)
+def reset(monkeypatch):
+    monkeypatch.setattr(validation, 'validate_txn', _validate_inputs_exist)
+    mempool.clear()
+    utxo_set.clear()
+    orphan_pool.clear()
+    yield
+    mempool.clear()
+    utxo_set.clear()
+    orphan_pool.clear()
+
+
+def _txn(outpoint, num_txouts=1):
+    txin = TxIn(
+        outpoint=outpoint,
+        signature=SignatureScript(unlock_sig=bytes(64), unlock_pk=bytes(64)),
+        sequence=0)
+    return Transaction(txins=[txin], txouts=[TxOut(value=100, pubkey=ADDR)] * num_txouts, locktime=0)
+
+
+def _confirm(outpoint):
+    utxo_set[outpoint] = UnspentTxOut(
+        value=100, pubkey=ADDR, txid=outpoint.txid, txout_idx=0, is_coinbase=False, height=0)
+
+
+def test_orphans_follow_their_parent_in():
+    parent = _txn(OutPoint(sha256d('a'), 0), num_txouts=2)
+    child = _txn(OutPoint(parent.id, 1))
+    grandchild = _txn(OutPoint(child.id, 0))
+    unrelated = _txn(OutPoint(sha256d('b'), 0))
+
+    for txn in (grandchild, child, unrelated):
+        add_txn_to_mempool(txn)
+
+    assert len(orphan_pool) == 3
+    assert not mempool
+    assert orphan_pool.spending(parent) == [child]
+
+    _confirm(parent.txins[0].outpoint)
+    add_txn_to_mempool(parent)
+
+    assert list(mempool) == [parent.id, child.id, grandchild.id]
+    assert list(orphan_pool) == [unrelated]
+
+
+def test_orphans_follow_a_block_in():
+    parent = _txn(OutPoint(sha256d('a'), 0))
+    child = _txn(OutPoint(parent.id, 0))
+    add_txn_to_mempool(child)
+    assert child.id in orphan_pool
+
+    # as if connect_block had just confirmed the parent
+    _confirm(OutPoint(parent.id, 0))
+    reprocess_orphans(Block(
+        version=0, prev_block_hash=None, merkle_tree_hash='', timestamp=0, bits=1,
+        nonce=0, txns=[parent]))
+
+    assert list(mempool) == [child.id]
+    assert not orphan_pool
+
+
+def test_count_and_size_limits(monkeypatch):
+    monkeypatch.setattr(orphans, 'MAX_ORPHAN_TXNS', 5)
+    txns = [_txn(OutPoint(sha256d(str(i)), 0)) for i in range(20)]
+
+    for txn in txns:
+        orphan_pool.add(txn)
+
+    assert len(orphan_pool) == 5
+    assert orphan_pool.total_size == sum(t.serialized_size for t in orphan_pool)
+
+    # random eviction leaves the index pointing at survivors only
+    for txn in txns:
+        assert bool(orphan_pool._by_outpoint.get(txn.txins[0].outpoint)) == (txn.id in orphan_pool)
+
+    monkeypatch.setattr(orphans, 'MAX_ORPHAN_BYTES', txns[0].serialized_size * 2)
+    orphan_pool.add(_txn(OutPoint(sha256d('more'), 0)))
+    assert len(orphan_pool) == 2
+
+    monkeypatch.setattr(orphans, 'MAX_ORPHAN_TXN_SIZE', 10)
+    assert not orphan_pool.add(_txn(OutPoint(sha256d('big'), 0)))
+
+
+def test_expiry(monkeypatch):
+    monkeypatch.setattr(orphans, 'ORPHAN_EXPIRY_SECS', 100)
+    old = _txn(OutPoint(sha256d('a'), 0))
+    new = _txn(OutPoint(sha256d('b'), 0))
+
+    now = time.time()
+    orphan_pool.add(old, added_at=now - 50)
+    orphan_pool.add(new, added_at=now)
+
+    assert orphan_pool.expire(now=now + 70) == [old.id]
+    assert list(orphan_pool) == [new]
+    assert orphan_pool.spending(_txn(None)) == []
+
+
+def test_an_orphan_keeps_its_time_when_one_parent_arrives(monkeypatch):
+    monkeypatch.setattr(orphans, 'ORPHAN_EXPIRY_SECS', 100)
+    parent = _txn(OutPoint(sha256d('a'), 0))
+    other_parent = _txn(OutPoint(sha256d('b'), 0))
+    child = Transaction(
+        txins=[_txn(OutPoint(parent.id, 0)).txins[0], _txn(OutPoint(other_parent.id, 0)).txins[0]],
+        txouts=[TxOut(value=100, pubkey=ADDR)], locktime=0)
+
+    now = time.time()
+    orphan_pool.add(child, added_at=now - 90)
+
+    _confirm(parent.txins[0].outpoint)
+    add_txn_to_mempool(parent)
+
+    # still waiting on the other parent, and no younger for the wait
+    assert child.id in orphan_pool
+    assert orphan_pool.entry(child.id).time == now - 90
+    assert orphan_pool.expire(now=now + 20) == [child.id]
+
+
+def test_readers_carry_on_while_orphans_are_validated(monkeypatch):
+    genesis = Block(0, None, '', 1500000000, 1, 0, [Transaction.create_coinbase(ADDR, 50, 0)])
+    chain.set_side_branches([])
+    chain.set_active_chain([genesis])
+    block = mine_on(genesis)
+    coinbase = block.txns[0]
+
+    child = _txn(OutPoint(coinbase.id, 0))
+    grandchild = _txn(OutPoint(child.id, 0))
+    readers_let_in = []
+
+    def validate(txn, **kwargs):
+        if txn in (child, grandchild):
+            def read():
+                with chain.chain_lock.shared:
+                    pass
+
+            reader = threading.Thread(target=read, daemon=True)
+            reader.start()
+            reader.join(timeout=0.5)
+            readers_let_in.append(not reader.is_alive())
+
+        return _validate_inputs_exist(txn)
+
+    monkeypatch.setattr(validation, 'validate_txn', validate)
+
+    add_txn_to_mempool(child)
+    add_txn_to_mempool(grandchild)
+    assert len(orphan_pool) == 2
+
+    # connecting the block lets the child in, which lets the grandchild in
+    try:
+        assert chain.connect_block(block) == chain.ACTIVE_CHAIN_IDX
+        assert list(mempool) == [child.id, grandchild.id]
+        assert readers_let_in == [True] * 4
+    finally:
+        chain.set_active_chain([])
@@ -0,0 +1,64 @@
+import threading
+import time
+
+from mini_core.block import Block
+from mini_core.proof_of_work import mine, mine_interrupt, search_nonce, target_digest
+from mini_core.utils import sha256d
+
+
+def _block(bits):
+    return Block(
+        version=0, prev_block_hash=sha256d('prev'), merkle_tree_hash=sha256d('merkle'),
+        timestamp=1501827000, bits=bits, nonce=0, txns=[])
+
+
+def _naive_search(block, start, count):
+    target = 1 << (256 - block.bits)
+    for nonce in range(start, start + count):
+        if int(sha256d(block.header(nonce)), 16) < target:
+            return nonce
+    return None
+
+
+def test_search_nonce_matches_naive_loop():
+    block = _block(bits=8)
+
+    for start in (0, 1, 12345, 99999999999):
+        assert search_nonce(block, start, 2000) == _naive_search(block, start, 2000)
+
+
+def test_search_nonce_gives_up():
+    assert search_nonce(_block(bits=64), 0, 100) is None
+
+
+def test_target_digest():
+    assert target_digest(8) == (1 << 248).to_bytes(32, 'big')
+    assert target_digest(0) > b'\xff' * 32
+
+
+def test_mine():
+    block = mine(_block(bits=10))
+
+    assert block.id == sha256d(block.header())
+    assert int(block.id, 16) < (1 << (256 - 10))
+
+
+def test_mine_in_processes():
+    block = mine(_block(bits=12), processes=2)
+
+    assert block.id == sha256d(block.header())
+    assert int(block.id, 16) < (1 << (256 - 12))
+
+
+def test_interrupt_stops_miner_processes():
+    result = []
+    t = threading.Thread(target=lambda: result.append(mine(_block(bits=200), processes=2)))
+    t.start()
+    time.sleep(0.5)
+
+    mine_interrupt.set()
+    t.join(timeout=5)
+
+    assert not t.is_alive()
+    assert result == [None]
+    assert not mine_interrupt.is_set()
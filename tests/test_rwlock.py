@@ -0,0 +1,176 @@
+import threading
+
+import pytest
+
+from mini_core.rwlock import RWLock
+
+
+def in_thread(func):
+    """
+    Run `func` in another thread, returning whether it finished in time.
+    """
+    t = threading.Thread(target=func, daemon=True)
+    t.start()
+    t.join(timeout=0.5)
+    return not t.is_alive()
+
+
+def test_readers_share():
+    lock = RWLock()
+    reader_in = threading.Event()
+    release = threading.Event()
+
+    def reader():
+        with lock.shared:
+            reader_in.set()
+            release.wait()
+
+    with lock.shared:
+        threading.Thread(target=reader, daemon=True).start()
+        assert reader_in.wait(timeout=0.5)
+
+    # the other reader still holds it
+    assert not in_thread(lock.acquire)
+    release.set()
+
+
+def test_writer_excludes():
+    lock = RWLock()
+    held = threading.Event()
+    release = threading.Event()
+
+    def writer():
+        with lock:
+            held.set()
+            release.wait()
+
+    threading.Thread(target=writer, daemon=True).start()
+    held.wait()
+
+    def read():
+        with lock.shared:
+            pass
+
+    assert not in_thread(read)
+    release.set()
+    assert in_thread(read)
+
+
+def test_upgradable_alongside_readers_then_upgrades():
+    lock = RWLock()
+    reader_in = threading.Event()
+    reader_out = threading.Event()
+
+    def reader():
+        with lock.shared:
+            reader_in.set()
+            reader_out.wait()
+
+    with lock.upgradable:
+        threading.Thread(target=reader, daemon=True).start()
+        assert reader_in.wait(timeout=0.5)
+
+        # another updater has to wait its turn
+        assert not in_thread(lock.acquire_upgradable)
+
+        upgraded = threading.Event()
+        reader_out.set()
+        with lock:
+            upgraded.set()
+
+            # nested shared is fine while holding it
+            with lock.shared:
+                pass
+
+        assert upgraded.is_set()
+
+
+def test_cant_upgrade_shared():
+    lock = RWLock()
+
+    with lock.shared:
+        with pytest.raises(RuntimeError):
+            lock.acquire()
+        with pytest.raises(RuntimeError):
+            lock.acquire_upgradable()
+
+    with lock:
+        pass
+
+
+def test_reentrant():
+    lock = RWLock()
+
+    with lock:
+        with lock:
+            with lock.upgradable:
+                with lock.shared:
+                    pass
+
+    assert in_thread(lock.acquire)
+
+
+def test_stats():
+    lock = RWLock()
+
+    with lock.shared:
+        pass
+    with lock.upgradable:
+        with lock:
+            pass
+
+    stats = lock.stats()
+    assert stats['shared'].acquires == 1
+    assert stats['upgradable'].acquires == 1
+    assert stats['exclusive'].acquires == 1
+    assert stats['exclusive'].contended == 0
+
+    held = threading.Event()
+    release = threading.Event()
+
+    def writer():
+        with lock:
+            held.set()
+            release.wait()
+
+    threading.Thread(target=writer, daemon=True).start()
+    held.wait()
+    threading.Timer(0.05, release.set).start()
+
+    with lock.shared:
+        pass
+
+    stats = lock.stats()
+    assert stats['shared'].contended == 1
+    assert stats['shared'].max_wait >= 0.04
+    assert stats['shared'].mean_wait > 0
+
+    lock.reset_stats()
+    assert lock.stats()['shared'].acquires == 0
+
+
+def test_acquire_times_out():
+    lock = RWLock()
+    held = threading.Event()
+    release = threading.Event()
+
+    def reader():
+        with lock.shared:
+            held.set()
+            release.wait()
+
+    threading.Thread(target=reader, daemon=True).start()
+    held.wait()
+
+    assert lock.acquire(timeout=0.05) is False
+
+    def read():
+        with lock.shared:
+            pass
+
+    # giving up let new readers back in
+    assert in_thread(read)
+
+    release.set()
+    assert lock.acquire(timeout=0.5) is True
+    lock.release()
@@ -0,0 +1,70 @@
+import pytest
+
+import mini_core.sigcache as sigcache
+
+from mini_core import make_txin
+from mini_core.exceptions import TxUnlockError
+from mini_core.transaction import OutPoint, Transaction, TxOut, UnspentTxOut
+from mini_core.utils import sha256d
+from mini_core.validation import validate_signature_for_spend
+from mini_core.wallet import pubkey_to_address
+
+from tests import signing_key
+
+
+@pytest.fixture(autouse=True)
+def reset_cache():
+    sigcache.clear()
+    yield
+    sigcache.clear()
+
+
+def _signed_spend():
+    addr = pubkey_to_address(signing_key.verifying_key.to_string())
+    utxo = UnspentTxOut(
+        value=100, pubkey=addr, txid=sha256d('a'), txout_idx=0, is_coinbase=False, height=0)
+    txout = TxOut(value=90, pubkey=addr)
+    txin = make_txin(signing_key, OutPoint(utxo.txid, 0), txout)
+    return utxo, txin, Transaction(txins=[txin], txouts=[txout])
+
+
+def test_verified_signatures_are_cached():
+    utxo, txin, txn = _signed_spend()
+
+    assert validate_signature_for_spend(txin, utxo, txn)
+    assert sigcache.stats() == (1, 0, 1)
+
+    assert validate_signature_for_spend(txin, utxo, txn)
+    assert sigcache.stats() == (1, 1, 1)
+    assert sigcache.stats().hit_rate == .5
+
+    # the cache doesn't excuse a pubkey that doesn't match the output
+    with pytest.raises(TxUnlockError):
+        validate_signature_for_spend(txin, utxo._replace(pubkey='1' * 34), txn)
+
+
+def test_bad_signatures_are_not_cached():
+    utxo, txin, txn = _signed_spend()
+    forged = txin._replace(signature=txin.signature._replace(unlock_sig=bytes(64)))
+
+    for _ in range(2):
+        with pytest.raises(TxUnlockError):
+            validate_signature_for_spend(forged, utxo, txn)
+
+    assert sigcache.stats() == (0, 0, 2)
+
+
+def test_bounded(monkeypatch):
+    monkeypatch.setattr(sigcache, 'SIGCACHE_SIZE', 3)
+
+    for i in range(5):
+        sigcache.add_verified(bytes([i]), b'pk', b'sig')
+
+    assert len(sigcache.sigcache) == 3
+    assert not sigcache.is_verified(bytes([0]), b'pk', b'sig')
+    assert sigcache.is_verified(bytes([2]), b'pk', b'sig')
+
+    # 2 was just used, so 3 goes next
+    sigcache.add_verified(bytes([5]), b'pk', b'sig')
+    assert sigcache.is_verified(bytes([2]), b'pk', b'sig')
+    assert not sigcache.is_verified(bytes([3]), b'pk', b'sig')
@@ -0,0 +1,56 @@
+import pytest
+
+from mini_core.chain import connect_block, set_active_chain, set_side_branches
+from mini_core.mempool import mempool
+from mini_core.networking import GetTxStatusMsg
+from mini_core.txindex import TxLocation, TxStatus, txindex
+from mini_core.utxo_set import utxo_set
+
+from tests import FakeSock, chain1, chain2
+
+
+def _ask(txid):
+    return FakeSock.ask(GetTxStatusMsg(txid))
+
+
+@pytest.fixture(autouse=True)
+def reset_chain():
+    def reset():
+        set_side_branches([])
+        set_active_chain([])
+        mempool.clear()
+        utxo_set.clear()
+        txindex.clear()
+
+    reset()
+    yield
+    reset()
+
+
+def test_txindex_follows_active_chain():
+    for block in chain1:
+        connect_block(block)
+
+    for height, block in enumerate(chain1):
+        txid = block.txns[0].id
+        assert txindex[txid] == TxLocation(block.id, height, 0)
+
+    # identical coinbases at the same heights share txids across the forks
+    for block in chain2[1:]:
+        connect_block(block)
+
+    assert txindex[chain1[2].txns[0].id] == TxLocation(chain2[2].id, 2, 0)
+    assert txindex[chain2[4].txns[0].id] == TxLocation(chain2[4].id, 4, 0)
+    assert len(txindex) == len(chain2)
+
+
+def test_get_tx_status_msg():
+    for block in chain1:
+        connect_block(block)
+
+    txid = chain1[1].txns[0].id
+    assert _ask(txid) == TxStatus(txid, False, TxLocation(chain1[1].id, 1, 0))
+    assert _ask('c0ffee') == TxStatus('c0ffee', False, None)
+
+    mempool['c0ffee'] = chain1[0].txns[0]
+    assert _ask('c0ffee') == TxStatus('c0ffee', True, None)
@@ -0,0 +1,69 @@
+import pytest
+
+import mini_core.chain as chain
+
+from mini_core.chain import block_undo, connect_block, disconnect_block, get_active_chain, set_active_chain, set_side_branches
+from mini_core.mempool import mempool
+from mini_core.transaction import OutPoint, Transaction, TxOut
+from mini_core.utxo_set import utxo_set
+from mini_core import make_txin
+
+from tests import chain1, signing_key
+
+
+@pytest.fixture(autouse=True)
+def reset_chain():
+    set_side_branches([])
+    set_active_chain([])
+    mempool.clear()
+    utxo_set.clear()
+    block_undo.clear()
+    yield
+    set_active_chain([])
+    mempool.clear()
+    utxo_set.clear()
+    block_undo.clear()
+
+
+def test_disconnect_restores_from_undo(monkeypatch):
+    for block in chain1:
+        connect_block(block)
+
+    coinbase_utxo = utxo_set[OutPoint(chain1[0].txns[0].id, 0)]
+    assert coinbase_utxo.is_coinbase
+
+    # fake a spend of the first coinbase by the tip
+    txout = TxOut(value=901, pubkey=coinbase_utxo.pubkey)
+    spend = Transaction(
+        txins=[make_txin(signing_key, coinbase_utxo.outpoint, txout)], txouts=[txout])
+    tip = chain1[2]._replace(txns=[*chain1[2].txns, spend])
+    set_active_chain([*chain1[:2], tip])
+
+    utxo_set.pop(coinbase_utxo.outpoint)
+    utxo_set[OutPoint(spend.id, 0)] = coinbase_utxo._replace(txid=spend.id, is_coinbase=False)
+    block_undo[tip.id] = [coinbase_utxo]
+
+    def no_chain_scan(*args):
+        raise AssertionError('disconnect should use undo data')
+    monkeypatch.setattr(chain, 'find_txout_for_txin', no_chain_scan)
+
+    assert disconnect_block(tip) == tip
+    assert utxo_set[coinbase_utxo.outpoint] == coinbase_utxo
+    assert OutPoint(spend.id, 0) not in utxo_set
+    assert tip.id not in block_undo
+    assert get_active_chain() == chain1[:2]
+
+
+def test_undo_written_on_connect():
+    for block in chain1:
+        connect_block(block)
+
+    # coinbase-only blocks spend nothing
+    assert [block_undo[b.id] for b in chain1] == [[], [], []]
+
+    before = dict(utxo_set)
+    tip_outpoint = OutPoint(chain1[2].txns[0].id, 0)
+    disconnect_block(chain1[2])
+
+    assert tip_outpoint not in utxo_set
+    assert len(utxo_set) == len(before) - 1
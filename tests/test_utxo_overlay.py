@@ -0,0 +1,92 @@
+import pytest
+
+import mini_core.validation as validation
+
+from mini_core.chain import connect_block, get_active_chain, get_side_branches, set_active_chain, set_side_branches
+from mini_core.exceptions import BlockValidationError
+from mini_core.mempool import mempool
+from mini_core.transaction import UnspentTxOut
+from mini_core.utils import sha256d
+from mini_core.utxo_set import UTXOOverlay, address_index, utxo_set
+
+from tests import chain1, chain2, _add_to_utxo_for_chain
+
+
+ADDR = '1Piq91dFUqSb7tdddCWvuGX5UgdzXeoAwA'
+
+
+def _utxo(name, value=100):
+    return UnspentTxOut(value, ADDR, sha256d(name), 0, False, 1)
+
+
+@pytest.fixture(autouse=True)
+def reset_state():
+    utxo_set.clear()
+    address_index.clear()
+    mempool.clear()
+    yield
+    utxo_set.clear()
+    address_index.clear()
+    mempool.clear()
+
+
+def test_overlay_leaves_utxo_set_alone_until_committed():
+    kept, spent, created = _utxo('kept'), _utxo('spent'), _utxo('created')
+    for utxo in (kept, spent):
+        utxo_set[utxo.outpoint] = utxo
+        address_index.setdefault(ADDR, set()).add(utxo.outpoint)
+
+    overlay = UTXOOverlay()
+    assert overlay.remove(spent.outpoint) == spent
+    overlay.add(created)
+
+    with pytest.raises(KeyError):
+        overlay.remove(spent.outpoint)
+
+    assert spent.outpoint not in overlay
+    assert overlay[created.outpoint] == created
+    assert overlay.get(kept.outpoint) == kept
+    assert set(utxo_set) == {kept.outpoint, spent.outpoint}
+
+    overlay.commit()
+    assert set(utxo_set) == {kept.outpoint, created.outpoint}
+    assert address_index[ADDR] == {kept.outpoint, created.outpoint}
+    assert not overlay.changes
+
+
+def test_removing_what_the_overlay_added_never_reaches_utxo_set():
+    overlay = UTXOOverlay()
+    utxo = _utxo('transient')
+    overlay.add(utxo)
+    overlay.remove(utxo.outpoint)
+    overlay.commit()
+
+    assert utxo.outpoint not in utxo_set
+
+
+def test_failed_reorg_changes_nothing(monkeypatch):
+    set_active_chain(list(chain1))
+    set_side_branches([])
+    _add_to_utxo_for_chain(get_active_chain())
+    utxos_before = dict(utxo_set)
+
+    validate_branch_block = validation.validate_branch_block
+    validated = []
+
+    def fail_last_block(block, *args):
+        validated.append(block)
+        if block == chain2[3]:
+            raise BlockValidationError('bad block')
+        return validate_branch_block(block, *args)
+
+    monkeypatch.setattr(validation, 'validate_branch_block', fail_last_block)
+
+    for block in chain2[1:4]:
+        assert connect_block(block) == 1
+
+    # the whole branch was tried, then dropped without touching the chain
+    assert validated == chain2[1:4]
+    assert get_active_chain() == chain1
+    assert get_side_branches() == [chain2[1:4]]
+    assert utxo_set == utxos_before
+    assert mempool == {}
@@ -0,0 +1,68 @@
+import multiprocessing
+
+import pytest
+
+import mini_core.sigcache as sigcache
+import mini_core.validation as validation
+
+from mini_core import make_txin
+from mini_core.transaction import OutPoint, Transaction, TxOut
+from mini_core.utils import sha256d
+from mini_core.validation import signature_checks, verify_signatures
+
+from tests import signing_key
+
+
+@pytest.fixture(autouse=True)
+def reset_cache():
+    sigcache.clear()
+    yield
+    sigcache.clear()
+
+
+def _signed_txns(num):
+    txout = TxOut(value=90, pubkey='1Piq91dFUqSb7tdddCWvuGX5UgdzXeoAwA')
+    return [
+        Transaction(txins=[make_txin(signing_key, OutPoint(sha256d(str(i)), 0), txout)], txouts=[txout])
+        for i in range(num)]
+
+
+def _forge(check):
+    return check._replace(signature=bytes(len(check.signature)))
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_verify_signatures(monkeypatch, processes):
+    monkeypatch.setattr(validation, 'SIG_VERIFY_PROCESSES', processes)
+    monkeypatch.setattr(validation, 'SIG_VERIFY_PARALLEL_MIN', 2)
+
+    checks = [c for txn in _signed_txns(6) for c in signature_checks(txn)]
+    checks[1] = _forge(checks[1])
+    checks[4] = _forge(checks[4])
+
+    assert verify_signatures(checks) == [True, False, True, True, False, True]
+    assert sigcache.stats().size == 4
+
+    # the second time round the valid ones come from the cache
+    assert verify_signatures(checks) == [True, False, True, True, False, True]
+    assert sigcache.stats().hits == 4
+
+
+def test_signature_checks_skip_coinbase_inputs():
+    from tests import chain1
+    assert signature_checks(chain1[0].txns[0]) == []
+
+
+def test_pool_workers_come_from_a_forkserver(monkeypatch):
+    monkeypatch.setattr(validation, 'SIG_VERIFY_PROCESSES', 2)
+    monkeypatch.setattr(validation, '_sig_verify_pool', None)
+
+    validation.start_sig_verify_pool()
+    pool = validation._sig_verify_pool
+    try:
+        # before 3.7 the pool uses the default start method
+        context = getattr(pool, '_mp_context', multiprocessing)
+        assert context.get_start_method() == 'forkserver'
+        assert list(pool.map(abs, [-1, -2])) == [1, 2]
+    finally:
+        pool.shutdown()